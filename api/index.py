@@ -1,7 +1,21 @@
+"""
+Serverless entry point.
+
+`application` is a plain WSGI callable (for runtimes that speak WSGI);
+`handler(event)` adapts an API-gateway style event dict to WSGI and returns a
+proxy response dict; `stream(event)` does the same but hands the body back
+as an iterator instead of buffering it.
+
+Django is only imported on the first invocation and the WSGI application is
+built once per container, so cold starts pay for nothing the request path
+doesn't need and warm invocations reuse everything.
+"""
+
+import base64
 import os
 import sys
-from django.core.wsgi import get_wsgi_application
-from django.conf import settings
+from io import BytesIO
+from urllib.parse import unquote_to_bytes, urlencode
 
 # Add the project directory to the Python path
 project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -10,45 +24,147 @@ if project_path not in sys.path:
 
 # Set the Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# The container is frozen as soon as a response is returned, so log lines
+# are written before that rather than by a background thread
+os.environ.setdefault('LOG_QUEUE', 'False')
+
+# X-Forwarded-For is set by whoever sends the request, so the client address
+# comes from the gateway's requestContext. Behind a proxy of your own in
+# front of the gateway, TRUST_X_FORWARDED_FOR=True takes the last hop of
+# the header instead: the address that proxy saw.
+TRUST_X_FORWARDED_FOR = os.environ.get('TRUST_X_FORWARDED_FOR', 'False') == 'True'
+
+# Bodies with these content types go back as text, everything else base64
+TEXT_CONTENT_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+_application = None
+
+
+def get_application():
+    """The Django WSGI application, created on first use"""
+    global _application
+    if _application is None:
+        from django.core.wsgi import get_wsgi_application
+
+        _application = get_wsgi_application()
+    return _application
+
+
+def application(environ, start_response):
+    return get_application()(environ, start_response)
+
+
+def _query_string(event):
+    if event.get('rawQueryString') is not None:
+        return event['rawQueryString']
+    query = event.get('multiValueQueryStringParameters') or event.get('queryStringParameters') or event.get('query')
+    if not query:
+        return ''
+    if isinstance(query, str):
+        return query.lstrip('?')
+    return urlencode(query, doseq=True)
+
+
+def _body(event):
+    body = event.get('body') or b''
+    if isinstance(body, str):
+        body = base64.b64decode(body) if event.get('isBase64Encoded') else body.encode('utf-8')
+    return body
+
+
+def build_environ(event):
+    """WSGI environ for an API-gateway style event (REST v1, HTTP v2 or the older {method, path, query} shape)"""
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    context = event.get('requestContext') or {}
+    method = event.get('httpMethod') or event.get('method') or context.get('http', {}).get('method') or 'GET'
+    path = event.get('rawPath') or event.get('path') or '/'
+    body = _body(event)
+    host, _, port = headers.get('host', 'localhost').partition(':')
+    scheme = headers.get('x-forwarded-proto', 'https')
+    forwarded_for = [hop.strip() for hop in headers.get('x-forwarded-for', '').split(',') if hop.strip()]
+    if TRUST_X_FORWARDED_FOR and forwarded_for:
+        remote_addr = forwarded_for[-1]
+    else:
+        remote_addr = context.get('identity', {}).get('sourceIp') or context.get('http', {}).get('sourceIp', '')
 
-# Get the WSGI application
-application = get_wsgi_application()
-
-# Vercel serverless function handler
-def handler(request):
-    from io import BytesIO
-    from django.http import HttpRequest, HttpResponse
-    from django.core.handlers.wsgi import WSGIHandler
-    
-    # Convert Vercel request to Django request
-    body = request.get('body', '')
-    headers = request.get('headers', {})
-    method = request.get('method', 'GET')
-    path = request.get('path', '/')
-    
-    # Create a WSGI environment
     environ = {
-        'REQUEST_METHOD': method,
-        'PATH_INFO': path,
-        'QUERY_STRING': request.get('query', {}),
-        'wsgi.input': BytesIO(body.encode() if body else b''),
+        'REQUEST_METHOD': method.upper(),
+        'SCRIPT_NAME': '',
+        # PEP 3333: PATH_INFO is percent-decoded bytes carried in a latin-1 str
+        'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+        'QUERY_STRING': _query_string(event),
+        'SERVER_NAME': host,
+        'SERVER_PORT': headers.get('x-forwarded-port') or port or ('443' if scheme == 'https' else '80'),
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': remote_addr,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scheme,
+        'wsgi.input': BytesIO(body),
         'wsgi.errors': sys.stderr,
-        'wsgi.url_scheme': headers.get('x-forwarded-proto', 'http'),
-        'SERVER_NAME': headers.get('host', 'localhost'),
-        'SERVER_PORT': headers.get('x-forwarded-port', '80'),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
     }
-    
-    # Add headers to environ
     for key, value in headers.items():
-        key = 'HTTP_' + key.upper().replace('-', '_')
-        environ[key] = value
-    
-    # Process the request
-    response = WSGIHandler()(environ, lambda status, headers: None)
-    
-    # Convert Django response to Vercel response
+        if key == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif key != 'content-length':
+            environ['HTTP_' + key.upper().replace('-', '_')] = value
+    if event.get('cookies'):
+        # HTTP API v2 moves cookies out of the headers
+        environ['HTTP_COOKIE'] = '; '.join(event['cookies'])
+    return environ
+
+
+def stream(event):
+    """Run an event through Django; returns (status code, header list, body chunk iterator)"""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    result = get_application()(build_environ(event), start_response)
+
+    def chunks():
+        try:
+            for chunk in result:
+                if chunk:
+                    yield chunk
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    # start_response() has been called once the application returns
+    return started['status'], started['headers'], chunks()
+
+
+def handler(event, context=None):
+    """Serverless function handler: API-gateway style event in, proxy response dict out"""
+    status, header_list, chunks = stream(event)
+    body = b''.join(chunks)
+
+    headers, multi_value_headers = {}, {}
+    for name, value in header_list:
+        value = value.strip()
+        multi_value_headers.setdefault(name, []).append(value)
+        if name.lower() != 'set-cookie':
+            headers[name] = f'{headers[name]}, {value}' if name in headers else value
+    content_type = next((value for name, value in header_list if name.lower() == 'content-type'), '')
+    encoded = any(name.lower() == 'content-encoding' for name, value in header_list)
+    text = None
+    if not encoded and content_type.startswith(TEXT_CONTENT_TYPES):
+        try:
+            text = body.decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+
     return {
-        'statusCode': response.status_code,
-        'body': response.content.decode('utf-8'),
-        'headers': dict(response.items())
+        'statusCode': status,
+        'headers': headers,
+        'multiValueHeaders': multi_value_headers,
+        'cookies': multi_value_headers.get('Set-Cookie', []),
+        'isBase64Encoded': text is None,
+        'body': text if text is not None else base64.b64encode(body).decode('ascii'),
     }
@@ -6,5 +6,8 @@ pip install -r requirements.txt
 
 python manage.py collectstatic --noinput
 
+# Site search index (only pages whose template changed are re-extracted)
+python manage.py build_search_index
+
 # Run migrations to ensure internal Django tables (auth, sessions) exist in the ephemeral SQLite DB
 python manage.py migrate
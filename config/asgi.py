@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Read by settings: no persistent database connections under ASGI
+os.environ['ASGI_SERVER'] = 'True'
+# Route pages to the async views, so requests never leave the event loop
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -41,6 +41,8 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 # Application definition
 
 INSTALLED_APPS = [
+    # Listed first so core's collectstatic (which builds assets) takes precedence
+    'core',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -52,13 +54,15 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'corsheaders',
     # Local apps
-    'core',
     'api',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',  # First, so its timings cover the whole stack
+    'core.middleware.AccessLogMiddleware',  # Structured access log, 2xx sampled
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Whitenoise for static files
+    'core.middleware.StaticFilesMiddleware',  # Whitenoise for static files (sync and async)
+    'core.middleware.HtmlCompressionMiddleware',  # Minified, compressed HTML
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
     'django.middleware.common.CommonMiddleware',
@@ -103,6 +107,45 @@ database_config = dj_database_url.config(default=None)
 if database_config:
     DATABASES['default'] = database_config
 
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds and reused by
+# the next requests (0 opens one per request), after a health check when
+# DATABASE_CONN_HEALTH_CHECKS is on. DATABASE_POOL=True uses Django's
+# PostgreSQL connection pool instead, DATABASE_POOL_MIN_SIZE to
+# DATABASE_POOL_MAX_SIZE connections per process (requires psycopg[pool],
+# i.e. psycopg 3, in place of psycopg2). Unless SQLITE_TUNED=False, SQLite
+# runs in WAL mode with synchronous=NORMAL, SQLITE_MMAP_SIZE bytes memory
+# mapped, and write transactions that take the lock up front.
+# Under ASGI (config.asgi sets ASGI_SERVER) connections are never kept: sync
+# code runs on ever-changing worker threads, each of which would hold its own
+# connection open until CONN_MAX_AGE; use DATABASE_POOL to reuse them there.
+ASGI_SERVER = os.environ.get('ASGI_SERVER', 'False') == 'True'
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', '600'))
+DATABASE_CONN_HEALTH_CHECKS = os.environ.get('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True'
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'False') == 'True'
+DATABASE_POOL_MIN_SIZE = int(os.environ.get('DATABASE_POOL_MIN_SIZE', '2'))
+DATABASE_POOL_MAX_SIZE = int(os.environ.get('DATABASE_POOL_MAX_SIZE', '10'))
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED', 'True') == 'True'
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+DATABASES['default']['CONN_MAX_AGE'] = 0 if ASGI_SERVER else DATABASE_CONN_MAX_AGE
+DATABASES['default']['CONN_HEALTH_CHECKS'] = DATABASE_CONN_HEALTH_CHECKS
+if DATABASE_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Pooled connections go back to the pool after each request
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': DATABASE_POOL_MIN_SIZE,
+        'max_size': DATABASE_POOL_MAX_SIZE,
+    }
+if SQLITE_TUNED and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'init_command': (
+            'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; '
+            f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}; PRAGMA temp_store=MEMORY'
+        ),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/dev/ref/settings/#auth-password-validators
@@ -140,7 +183,19 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_DIRS = [BASE_DIR / 'static']
+# Generated by `manage.py build_assets` (and collectstatic); see core/assets
+ASSET_BUILD_ROOT = BASE_DIR / 'build' / 'static'
+STATICFILES_DIRS = [BASE_DIR / 'static', ASSET_BUILD_ROOT]
+
+# Responsive image variants (core.assets.images); formats Pillow can't encode are skipped
+RESPONSIVE_IMAGE_WIDTHS = [480, 960, 1440, 1920]
+RESPONSIVE_IMAGE_FORMATS = ['avif', 'webp']
+
+# Site stylesheet (core.assets.css), compiled with the standalone Tailwind CLI.
+# The binary is downloaded on first use unless TAILWINDCSS_BIN points at one.
+TAILWINDCSS_VERSION = os.environ.get('TAILWINDCSS_VERSION', 'v3.4.17')
+TAILWINDCSS_BIN = os.environ.get('TAILWINDCSS_BIN') or None
+TAILWINDCSS_CONFIG = BASE_DIR / 'tailwind.config.js'
 
 # Configuration for static files storage using Whitenoise
 # Use simpler storage for development, manifest storage for production
@@ -163,6 +218,93 @@ else:
         },
     }
 
+# The page cache and route index re-check the template tree for edits every
+# TEMPLATE_CHECK_INTERVAL seconds (0 = never). Off by default unless DEBUG:
+# deploys ship fixed templates, and each check stats every template file.
+TEMPLATE_CHECK_INTERVAL = float(os.environ.get('TEMPLATE_CHECK_INTERVAL', '1.0' if DEBUG else '0'))
+
+# Rendered page cache (core.page_cache); set PAGE_CACHE_MAX_ENTRIES=0 to disable
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', '256'))
+
+# Shared includes rendered once per variant ({% cached_include %}, core.fragments);
+# variants past this many per fragment are rendered uncached
+FRAGMENT_CACHE_MAX_VARIANTS = int(os.environ.get('FRAGMENT_CACHE_MAX_VARIANTS', '64'))
+
+# Serve pages from native async views (config.asgi turns this on); under WSGI
+# the sync views avoid an event loop per request
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+
+# HTML responses are minified and brotli/gzip compressed per Accept-Encoding
+# (core.middleware.HtmlCompressionMiddleware). Page cache bodies are cached per
+# worker by content hash, up to HTML_COMPRESSION_CACHE_ENTRIES bodies.
+HTML_MINIFY = os.environ.get('HTML_MINIFY', 'True') == 'True'
+HTML_COMPRESSION_CACHE_ENTRIES = int(os.environ.get('HTML_COMPRESSION_CACHE_ENTRIES', '256'))
+
+# Request instrumentation (core.metrics): Server-Timing headers and latency
+# histograms per route/template, served at /metrics for Prometheus. Each worker
+# writes its totals to METRICS_DIR every METRICS_FLUSH_INTERVAL seconds
+# and the endpoint merges them; gunicorn.conf.py gives every server a fresh one.
+# Set METRICS_TOKEN to require a bearer token; with DEBUG off the endpoint
+# refuses every request until one is set. Server-Timing headers are only sent
+# with DEBUG on or to clients in SERVER_TIMING_ALLOWED_IPS (comma-separated).
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1.0'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+SERVER_TIMING_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('SERVER_TIMING_ALLOWED_IPS', '').split(',') if ip.strip()]
+
+# Glossary search (core.glossary): how long browsers and CDNs may reuse a
+# /glossary/search response. The index is built from core/data/glossary.json
+# once per worker, so results only change with a deploy.
+GLOSSARY_CACHE_SECONDS = int(os.environ.get('GLOSSARY_CACHE_SECONDS', '300'))
+
+# Site search (core.search): the index written by `manage.py build_search_index`
+# and memory-mapped by every worker to answer /search.
+SEARCH_INDEX_PATH = Path(os.environ.get('SEARCH_INDEX_PATH', BASE_DIR / 'build' / 'search' / 'site.idx'))
+# How often workers look for a rebuilt index (one stat of the file; 0 = never)
+SEARCH_INDEX_CHECK_INTERVAL = float(os.environ.get('SEARCH_INDEX_CHECK_INTERVAL', '1.0'))
+
+# Wizard drafts (core.api): largest stored document, in bytes of compact JSON,
+# and most operations accepted in one autosave patch
+DRAFT_MAX_BYTES = int(os.environ.get('DRAFT_MAX_BYTES', str(256 * 1024)))
+DRAFT_MAX_OPERATIONS = int(os.environ.get('DRAFT_MAX_OPERATIONS', '200'))
+
+# Chapter text (core.chapters) is saved as block deltas. Every
+# CHAPTER_SNAPSHOT_INTERVAL versions the revision log gets a full snapshot;
+# the last CHAPTER_SNAPSHOTS_KEPT snapshots and the deltas since are kept.
+CHAPTER_SNAPSHOT_INTERVAL = int(os.environ.get('CHAPTER_SNAPSHOT_INTERVAL', '100'))
+CHAPTER_SNAPSHOTS_KEPT = int(os.environ.get('CHAPTER_SNAPSHOTS_KEPT', '3'))
+CHAPTER_MAX_OPERATIONS = int(os.environ.get('CHAPTER_MAX_OPERATIONS', '500'))
+CHAPTER_BLOCK_MAX_CHARS = int(os.environ.get('CHAPTER_BLOCK_MAX_CHARS', '20000'))
+
+# Book export (core.exports). Books up to EXPORT_STREAM_MAX_WORDS can be
+# streamed straight from a request; longer ones go through export jobs, run
+# by a pool of EXPORT_WORKERS processes (per server worker, started on first
+# use), whose files are kept EXPORT_RETENTION_SECONDS.
+# Rendered chapters are cached under EXPORT_ROOT/cache, up to EXPORT_CACHE_MAX_BYTES.
+EXPORT_ROOT = Path(os.environ.get('EXPORT_ROOT', BASE_DIR / 'build' / 'exports'))
+EXPORT_STREAM_MAX_WORDS = int(os.environ.get('EXPORT_STREAM_MAX_WORDS', '100000'))
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', '2'))
+EXPORT_RETENTION_SECONDS = int(os.environ.get('EXPORT_RETENTION_SECONDS', str(24 * 3600)))
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# API authentication (core.authentication). Verified JWTs are cached per
+# worker, up to JWT_CACHE_MAX_ENTRIES, until they expire. With JWT_STATELESS
+# (opt-in) request.user is built from the token's claims rather than loaded
+# from the database, so deactivating a user only takes effect through the
+# revocation list. Revoked tokens are reloaded every
+# JWT_REVOCATION_CHECK_INTERVAL seconds (0 turns revocation off).
+JWT_STATELESS = os.environ.get('JWT_STATELESS', 'False') == 'True'
+JWT_CACHE_MAX_ENTRIES = int(os.environ.get('JWT_CACHE_MAX_ENTRIES', '10000'))
+JWT_REVOCATION_CHECK_INTERVAL = float(os.environ.get('JWT_REVOCATION_CHECK_INTERVAL', '5.0'))
+
+# Prerendered pages (manage.py prerender)
+# With SERVE_PRERENDERED=True, Whitenoise answers page URLs straight from the
+# prerendered HTML (and its .gz/.br siblings) before Django is involved.
+PRERENDER_ROOT = Path(os.environ.get('PRERENDER_ROOT', BASE_DIR / 'prerendered'))
+if os.environ.get('SERVE_PRERENDERED', 'False') == 'True':
+    WHITENOISE_ROOT = PRERENDER_ROOT
+    WHITENOISE_INDEX_FILE = True
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -175,21 +317,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Config
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.StatelessJWTAuthentication' if JWT_STATELESS
+        else 'core.authentication.CachedJWTAuthentication',
     )
 }
 
+SIMPLE_JWT = {
+    'TOKEN_REFRESH_SERIALIZER': 'core.authentication.TokenRefreshSerializer',
+}
+
 # CORS Settings
 CORS_ALLOW_ALL_ORIGINS = True
 
 # LOGGING
+# The console handler formats and writes on a background thread
+# (core.log.BackgroundHandler) unless LOG_QUEUE is off; records below ERROR
+# are dropped once LOG_QUEUE_SIZE are waiting. LOG_FORMAT is 'json' (one
+# object per line) or 'text'. The access log (penwise.access, see
+# core.middleware.AccessLogMiddleware) keeps ACCESS_LOG_SAMPLE_RATE of the
+# 2xx responses and all others.
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_QUEUE = os.environ.get('LOG_QUEUE', 'True') == 'True'
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+ACCESS_LOG = os.environ.get('ACCESS_LOG', 'True') == 'True'
+ACCESS_LOG_SAMPLE_RATE = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', '0.1'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'core.log.JsonFormatter',
+        },
+        'text': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+    },
     'handlers': {
         'console': {
+            'class': 'core.log.BackgroundHandler',
+            'stream': sys.stdout,
+            'max_size': LOG_QUEUE_SIZE,
+            'formatter': LOG_FORMAT,
+        } if LOG_QUEUE else {
             'class': 'logging.StreamHandler',
             'stream': sys.stdout,
+            'formatter': LOG_FORMAT,
         },
     },
     'root': {
@@ -207,5 +380,10 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': False,
         },
+        'penwise.access': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+Settings for workers that only serve the public site.
+
+The marketing pages, wizard steps, search and glossary (config.urls_public)
+need neither the admin, the API (DRF, simplejwt), CORS, sessions nor
+messages, so those apps and their middleware are left out: workers start
+faster, use less memory and run a shorter middleware chain per request.
+auth and contenttypes stay installed because core's models refer to them.
+
+Run the public site with DJANGO_SETTINGS_MODULE=config.settings_public and
+route /api/ and /admin/ to workers on the full config.settings.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+# Apps and middleware the public pages do without
+DASHBOARD_APPS = {
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'rest_framework',
+    'rest_framework_simplejwt',
+    'corsheaders',
+    'api',
+}
+DASHBOARD_MIDDLEWARE = {
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+}
+DASHBOARD_CONTEXT_PROCESSORS = {
+    'django.contrib.auth.context_processors.auth',
+    'django.contrib.messages.context_processors.messages',
+}
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DASHBOARD_APPS]
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in DASHBOARD_MIDDLEWARE]
+TEMPLATES = [
+    {
+        **engine,
+        'OPTIONS': {
+            **engine['OPTIONS'],
+            'context_processors': [
+                processor for processor in engine['OPTIONS']['context_processors']
+                if processor not in DASHBOARD_CONTEXT_PROCESSORS
+            ],
+        },
+    }
+    for engine in TEMPLATES
+]
+
+ROOT_URLCONF = 'config.urls_public'
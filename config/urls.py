@@ -1,15 +1,24 @@
 from django.contrib import admin
 from django.urls import path
-from core.views import render_page, new_project_step
-from django.conf import settings
-from django.conf.urls.static import static
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from core.api import (
+    ChapterDetailView, ChapterListView, ChapterRevisionView, DraftDetailView, DraftExportView, DraftListView,
+    ExportJobDetailView, ExportJobDownloadView, ExportJobListView, TokenRevokeView,
+)
+from config.urls_public import urlpatterns as public_urlpatterns
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', render_page, {'page_name': 'index'}, name='index'),
-    path('new-projects/<int:step>/', new_project_step, name='new_project_step'),
-    path('<str:page_name>/', render_page, name='page'),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.BASE_DIR / 'static')
+    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/revoke/', TokenRevokeView.as_view(), name='token_revoke'),
+    path('api/drafts/', DraftListView.as_view(), name='draft_list'),
+    path('api/drafts/<int:pk>/', DraftDetailView.as_view(), name='draft_detail'),
+    path('api/drafts/<int:pk>/chapters/', ChapterListView.as_view(), name='chapter_list'),
+    path('api/drafts/<int:pk>/export/<str:book_format>/', DraftExportView.as_view(), name='draft_export'),
+    path('api/drafts/<int:pk>/exports/', ExportJobListView.as_view(), name='export_job_list'),
+    path('api/exports/<int:pk>/', ExportJobDetailView.as_view(), name='export_job_detail'),
+    path('api/exports/<int:pk>/download/', ExportJobDownloadView.as_view(), name='export_job_download'),
+    path('api/chapters/<int:pk>/', ChapterDetailView.as_view(), name='chapter_detail'),
+    path('api/chapters/<int:pk>/revisions/<int:version>/', ChapterRevisionView.as_view(), name='chapter_revision'),
+] + public_urlpatterns
@@ -0,0 +1,31 @@
+"""
+URLs of the public site: pages, wizard steps, search, glossary and metrics.
+
+The whole URLconf of config.settings_public; config.urls adds the admin and
+the API in front of these.
+"""
+
+from django.conf import settings
+from django.conf.urls.static import static
+from django.urls import path
+
+from core.views import (
+    render_page, new_project_step, metrics, render_page_async, new_project_step_async,
+    glossary_search, glossary_letter, site_search,
+)
+
+if settings.ASYNC_VIEWS:
+    render_page, new_project_step = render_page_async, new_project_step_async
+
+urlpatterns = [
+    path('', render_page, {'page_name': 'index'}, name='index'),
+    path('metrics', metrics, name='metrics'),
+    path('search', site_search, name='search'),
+    path('glossary/search', glossary_search, name='glossary_search'),
+    path('glossary/<str:letter>/', glossary_letter, name='glossary_letter'),
+    path('new-projects/<int:step>/', new_project_step, name='new_project_step'),
+    path('<str:page_name>/', render_page, name='page'),
+]
+
+if settings.DEBUG:
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.BASE_DIR / 'static')
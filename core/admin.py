@@ -1,3 +1,33 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Chapter, ExportJob, ProjectDraft, TokenRevocation
+
+
+@admin.register(ProjectDraft)
+class ProjectDraftAdmin(admin.ModelAdmin):
+    list_display = ('id', 'owner', 'version', 'updated_at')
+    list_select_related = ('owner',)
+    raw_id_fields = ('owner',)
+    readonly_fields = ('version', 'created_at', 'updated_at')
+
+
+@admin.register(Chapter)
+class ChapterAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'draft', 'version', 'words', 'updated_at')
+    raw_id_fields = ('draft',)
+    readonly_fields = ('version', 'words', 'created_at', 'updated_at')
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'draft', 'format', 'status', 'chapters_done', 'chapters_total', 'size', 'created_at')
+    list_filter = ('status', 'format')
+    raw_id_fields = ('owner', 'draft')
+
+
+@admin.register(TokenRevocation)
+class TokenRevocationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'jti', 'created_at', 'expires_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('jti', 'user__username')
@@ -0,0 +1,412 @@
+"""
+Draft API for the new-project wizard (JWT authenticated, see REST_FRAMEWORK).
+
+    GET    /api/drafts/        the user's drafts, newest first (without their data)
+    POST   /api/drafts/        create a draft, optionally with an initial document
+    GET    /api/drafts/<id>/   the draft document; ETag, If-None-Match -> 304
+    PATCH  /api/drafts/<id>/   apply a JSON Patch; If-Match required
+    DELETE /api/drafts/<id>/   delete the draft
+
+    GET    /api/drafts/<id>/chapters/          the draft's chapters (without their text)
+    POST   /api/drafts/<id>/chapters/          add a chapter
+    GET    /api/chapters/<id>/                 the chapter's blocks; ?manifest for keys and hashes only
+    PATCH  /api/chapters/<id>/                 apply a block delta (core.chapters); If-Match required
+    DELETE /api/chapters/<id>/                 delete the chapter
+    GET    /api/chapters/<id>/revisions/<n>/   the chapter as of version n
+
+    GET    /api/drafts/<id>/export/<format>/   the book as epub, docx or md, streamed
+    POST   /api/drafts/<id>/exports/           start a background export ({"format": ...})
+    GET    /api/exports/<id>/                  export job status and progress
+    GET    /api/exports/<id>/download/         the exported file, once the job is done
+
+    POST   /api/token/revoke/   revoke this access token and the `refresh` token sent,
+                                or with {"all": true} every token of the user
+
+Saves use optimistic concurrency: a PATCH must carry the ETag of the version
+it was computed against in If-Match. If another save got there first the
+answer is 412 with the current ETag, and the client re-reads and rebases.
+A successful PATCH answers with the new ETag: 204 with no body for drafts,
+the new block hashes for chapters.
+"""
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F, Sum
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import revocations
+from .chapters import DeltaError, VersionConflict, apply_delta, chapter_at, create_chapter, validate_delta
+from .drafts import PatchConflict, PatchError, apply_patch, json_equal, validate_document
+from .exports import FORMATS, Book, aiter_chunks, export_book, job_path, start_job
+from .metrics import phase
+from .models import Chapter, ExportJob, ProjectDraft
+
+
+class JSONPatchParser(JSONParser):
+    media_type = 'application/json-patch+json'
+
+
+def _draft_response(draft, status_code=status.HTTP_200_OK):
+    response = Response({'id': draft.pk, 'version': draft.version, 'data': draft.data}, status=status_code)
+    response['ETag'] = draft.etag
+    # Always revalidate; an unchanged draft costs a 304
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _matches(if_match, instance):
+    etags = parse_etags(if_match)
+    return '*' in etags or instance.etag in etags
+
+
+def _precondition_failed(instance):
+    """412 for a draft or chapter saved by someone else since the client read it"""
+    response = Response(
+        {'detail': f'The {instance._meta.verbose_name} has changed since it was read', 'version': instance.version},
+        status=status.HTTP_412_PRECONDITION_FAILED,
+    )
+    response['ETag'] = instance.etag
+    return response
+
+
+class DraftListView(APIView):
+    """List the user's drafts or create one"""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        drafts = ProjectDraft.objects.filter(owner_id=request.user.pk).values('id', 'version', 'created_at', 'updated_at')
+        return Response({'results': list(drafts)})
+
+    def post(self, request):
+        document = request.data.get('data', {}) if isinstance(request.data, dict) else None
+        try:
+            validate_document(document)
+        except PatchError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        draft = ProjectDraft.objects.create(owner_id=request.user.pk, data=document)
+        response = _draft_response(draft, status.HTTP_201_CREATED)
+        response['Location'] = f'{request.path}{draft.pk}/'
+        return response
+
+
+class DraftDetailView(APIView):
+    """Read, patch or delete one of the user's drafts"""
+
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONPatchParser, JSONParser]
+
+    def get_draft(self, request, pk):
+        return get_object_or_404(ProjectDraft.objects.only('id', 'version', 'data'), pk=pk, owner_id=request.user.pk)
+
+    def get(self, request, pk):
+        draft = self.get_draft(request, pk)
+        if draft.etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = draft.etag
+            return response
+        return _draft_response(draft)
+
+    def patch(self, request, pk):
+        if_match = request.headers.get('If-Match')
+        if not if_match:
+            return Response(
+                {'detail': 'Send the ETag of the version the patch applies to in If-Match'},
+                status=status.HTTP_428_PRECONDITION_REQUIRED,
+            )
+        operations = request.data
+        if not isinstance(operations, list) or not operations:
+            return Response({'detail': 'A patch is a non-empty list of operations'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > settings.DRAFT_MAX_OPERATIONS:
+            return Response(
+                {'detail': f'At most {settings.DRAFT_MAX_OPERATIONS} operations per patch'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        draft = self.get_draft(request, pk)
+        if not _matches(if_match, draft):
+            return _precondition_failed(draft)
+
+        with phase(request, 'patch'):
+            try:
+                document = apply_patch(draft.data, operations)
+                validate_document(document)
+            except PatchConflict as exc:
+                return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+            except PatchError as exc:
+                return Response({'detail': str(exc)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        if not json_equal(document, draft.data):
+            # Only written if nobody saved in between; one UPDATE, no read-modify-write race
+            saved = ProjectDraft.objects.filter(pk=draft.pk, version=draft.version).update(
+                data=document, version=F('version') + 1, updated_at=timezone.now(),
+            )
+            if not saved:
+                return _precondition_failed(self.get_draft(request, pk))
+            draft.version += 1
+
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        response['ETag'] = draft.etag
+        return response
+
+    def delete(self, request, pk):
+        draft = self.get_draft(request, pk)
+        if_match = request.headers.get('If-Match')
+        if if_match and not _matches(if_match, draft):
+            return _precondition_failed(draft)
+        draft.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ChapterListView(APIView):
+    """List a draft's chapters or add one"""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        draft = get_object_or_404(ProjectDraft.objects.only('id'), pk=pk, owner_id=request.user.pk)
+        chapters = draft.chapters.values('id', 'position', 'title', 'version', 'words', 'updated_at')
+        return Response({'results': list(chapters)})
+
+    def post(self, request, pk):
+        draft = get_object_or_404(ProjectDraft.objects.only('id'), pk=pk, owner_id=request.user.pk)
+        title = request.data.get('title', '') if isinstance(request.data, dict) else None
+        if not isinstance(title, str) or len(title) > Chapter._meta.get_field('title').max_length:
+            return Response(
+                {'detail': 'title must be a string of at most 200 characters'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        chapter = create_chapter(draft, title)
+        response = Response(
+            {'id': chapter.pk, 'position': chapter.position, 'title': chapter.title, 'version': chapter.version},
+            status=status.HTTP_201_CREATED,
+        )
+        response['ETag'] = chapter.etag
+        response['Location'] = f'/api/chapters/{chapter.pk}/'
+        return response
+
+
+class ChapterDetailView(APIView):
+    """Read, delta-save or delete one of the user's chapters"""
+
+    permission_classes = [IsAuthenticated]
+
+    def get_chapter(self, request, pk):
+        return get_object_or_404(
+            Chapter.objects.only('id', 'title', 'version', 'words'), pk=pk, draft__owner_id=request.user.pk,
+        )
+
+    def get(self, request, pk):
+        chapter = self.get_chapter(request, pk)
+        if chapter.etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = chapter.etag
+            return response
+        blocks = chapter.blocks.order_by('position')
+        if 'manifest' in request.GET:
+            # What a client compares its own block hashes against; no text
+            data = {'blocks': list(blocks.values_list('key', 'hash'))}
+        else:
+            data = {'blocks': [
+                {'id': key, 'hash': text_hash, 'text': text}
+                for key, text_hash, text in blocks.values_list('key', 'hash', 'text')
+            ]}
+        response = Response({
+            'id': chapter.pk, 'title': chapter.title, 'version': chapter.version, 'words': chapter.words, **data,
+        })
+        response['ETag'] = chapter.etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def patch(self, request, pk):
+        if_match = request.headers.get('If-Match')
+        if not if_match:
+            return Response(
+                {'detail': 'Send the ETag of the version the delta applies to in If-Match'},
+                status=status.HTTP_428_PRECONDITION_REQUIRED,
+            )
+        try:
+            validate_delta(request.data)
+        except DeltaError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        chapter = self.get_chapter(request, pk)
+        if not _matches(if_match, chapter):
+            return _precondition_failed(chapter)
+        with phase(request, 'delta'):
+            try:
+                hashes = apply_delta(chapter, chapter.version, request.data)
+            except VersionConflict as exc:
+                return _precondition_failed(exc.chapter)
+            except DeltaError as exc:
+                return Response({'detail': str(exc)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        response = Response({'version': chapter.version, 'words': chapter.words, 'hashes': hashes})
+        response['ETag'] = chapter.etag
+        return response
+
+    def delete(self, request, pk):
+        chapter = self.get_chapter(request, pk)
+        if_match = request.headers.get('If-Match')
+        if if_match and not _matches(if_match, chapter):
+            return _precondition_failed(chapter)
+        chapter.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ChapterRevisionView(APIView):
+    """A chapter as of an earlier version, rebuilt from the revision log"""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, version):
+        chapter = get_object_or_404(Chapter.objects.only('id', 'version'), pk=pk, draft__owner_id=request.user.pk)
+        blocks = chapter_at(chapter, version)
+        if blocks is None:
+            return Response(
+                {'detail': f'Version {version} is not in the revision log'}, status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response({
+            'id': chapter.pk,
+            'version': version,
+            'blocks': [{'id': key, 'text': text} for key, text in blocks],
+        })
+
+
+class DownloadContentNegotiation(BaseContentNegotiation):
+    """Downloads aren't rendered by DRF, so any Accept header will do; errors still go out as JSON"""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def _attachment(book_format, filename):
+    return f'attachment; filename="{filename}.{FORMATS[book_format].extension}"'
+
+
+class DraftExportView(APIView):
+    """Stream a draft exported as EPUB, DOCX or Markdown while it is built"""
+
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = DownloadContentNegotiation
+
+    def get(self, request, pk, book_format):
+        if book_format not in FORMATS:
+            return Response({'detail': f"Formats: {', '.join(FORMATS)}"}, status=status.HTTP_404_NOT_FOUND)
+        draft = get_object_or_404(ProjectDraft.objects.select_related('owner'), pk=pk, owner_id=request.user.pk)
+        words = draft.chapters.aggregate(words=Sum('words'))['words'] or 0
+        if words > settings.EXPORT_STREAM_MAX_WORDS:
+            return Response(
+                {'detail': f'This book has {words} words; export it in the background with POST /api/drafts/{pk}/exports/'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        book = Book(draft)
+        chunks = export_book(book, book_format)
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=FORMATS[book_format].content_type)
+        response['Content-Disposition'] = _attachment(book_format, book.filename)
+        return response
+
+
+def _job_data(job):
+    data = {
+        'id': job.pk,
+        'draft': job.draft_id,
+        'format': job.format,
+        'status': job.status,
+        'chapters_done': job.chapters_done,
+        'chapters_total': job.chapters_total,
+        'size': job.size,
+        'error': job.error,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
+    if job.status == ExportJob.DONE:
+        data['download'] = f'/api/exports/{job.pk}/download/'
+    return data
+
+
+class ExportJobListView(APIView):
+    """Start a background export of a draft"""
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        draft = get_object_or_404(ProjectDraft.objects.select_related('owner'), pk=pk, owner_id=request.user.pk)
+        book_format = request.data.get('format') if isinstance(request.data, dict) else None
+        if book_format not in FORMATS:
+            return Response({'detail': f"format must be one of {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        job = start_job(draft, book_format)
+        response = Response(_job_data(job), status=status.HTTP_202_ACCEPTED)
+        response['Location'] = f'/api/exports/{job.pk}/'
+        return response
+
+
+class ExportJobDetailView(APIView):
+    """Status and progress of an export job"""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, owner_id=request.user.pk)
+        response = Response(_job_data(job))
+        if job.status in (ExportJob.QUEUED, ExportJob.RUNNING):
+            response['Retry-After'] = '1'
+        return response
+
+
+class ExportJobDownloadView(APIView):
+    """The file written by a finished export job"""
+
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = DownloadContentNegotiation
+
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob.objects.select_related('draft__owner'), pk=pk, owner_id=request.user.pk)
+        if job.status != ExportJob.DONE:
+            return Response({'detail': f'The export is {job.status}'}, status=status.HTTP_409_CONFLICT)
+        try:
+            output = open(job_path(job), 'rb')
+        except FileNotFoundError:
+            return Response({'detail': 'The exported file has expired; export again'}, status=status.HTTP_410_GONE)
+        return FileResponse(
+            output, as_attachment=True, filename=f'{Book(job.draft).filename}.{FORMATS[job.format].extension}',
+            content_type=FORMATS[job.format].content_type,
+        )
+
+
+class TokenRevokeView(APIView):
+    """Log out: revoke the access token of the request, a refresh token or all of the user's tokens"""
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        if data.get('all'):
+            revocations.revoke(user_id=request.user.pk)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if data.get('refresh'):
+            try:
+                refresh = RefreshToken(data['refresh'])
+            except TokenError as exc:
+                return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            if str(refresh.get(jwt_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                return Response({'detail': 'Not your refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+            revocations.revoke(refresh)
+        revocations.revoke(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
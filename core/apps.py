@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_save, pre_save
+
+        from .authentication import revoke_on_credentials_change, track_credentials
+
+        user_model = get_user_model()
+        pre_save.connect(track_credentials, sender=user_model, dispatch_uid='core.track_credentials')
+        post_save.connect(revoke_on_credentials_change, sender=user_model, dispatch_uid='core.revoke_on_credentials_change')
@@ -0,0 +1,24 @@
+"""
+Build-time asset pipeline.
+
+Each step writes generated files under settings.ASSET_BUILD_ROOT, which is
+one of the STATICFILES_DIRS, so collectstatic (which runs the steps first)
+picks them up like any other static file.
+"""
+
+from . import critical, css, dimensions, images, js
+
+# Run in this order by `manage.py build_assets` and `manage.py collectstatic`
+STEPS = {
+    'images': images.build,
+    'dimensions': dimensions.build,
+    'css': css.build,
+    'critical': critical.build,
+    'js': js.build,
+}
+
+
+def build(stdout, steps=None, jobs=None, force=False):
+    for name, step in STEPS.items():
+        if steps is None or name in steps:
+            step(stdout, jobs=jobs, force=force)
@@ -0,0 +1,308 @@
+import hashlib
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.template.loader import render_to_string
+from django.test.utils import override_settings
+
+from core.routes import public_routes
+
+from . import css, manifests
+
+OUTPUT_DIR = 'css/critical'
+MANIFEST_NAME = 'manifest.json'
+
+# How much of <body> counts as "above the fold": everything up to the end of
+# the first <section> (the hero on marketing pages), but never more than this
+# many elements (dashboard pages have no sections)
+FOLD_MAX_ELEMENTS = 600
+
+
+def manifest_path():
+    return Path(settings.ASSET_BUILD_ROOT) / OUTPUT_DIR / MANIFEST_NAME
+
+
+def load_manifest():
+    return manifests.load(manifest_path())
+
+
+_css_cache = {}
+
+
+def load_critical_css(template_name):
+    """Critical CSS for a page template, or None if none has been extracted"""
+    entry = load_manifest().get(template_name)
+    if not entry:
+        return None
+    path = Path(settings.ASSET_BUILD_ROOT) / entry['path']
+    if path not in _css_cache:
+        try:
+            _css_cache[path] = path.read_text()
+        except FileNotFoundError:
+            return None
+    return _css_cache[path]
+
+
+class FoldParser(HTMLParser):
+    """Collects the tags, classes and ids used above the fold of a page"""
+
+    def __init__(self):
+        super().__init__()
+        self.tags = {'html', 'body'}
+        self.classes = set()
+        self.ids = set()
+        self.elements = 0
+        self.in_body = False
+        self.section_depth = 0
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'body':
+            self.in_body = True
+            return
+        if not self.in_body or self.done:
+            return
+        self.elements += 1
+        self.tags.add(tag)
+        for name, value in attrs:
+            if name == 'class' and value:
+                self.classes.update(value.split())
+            elif name == 'id' and value:
+                self.ids.add(value)
+        if tag == 'section':
+            self.section_depth += 1
+        if self.elements >= FOLD_MAX_ELEMENTS:
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == 'section' and self.in_body and not self.done:
+            self.section_depth -= 1
+            if self.section_depth == 0:
+                self.done = True
+
+    def signature(self):
+        return '\0'.join(sorted(self.tags) + ['.'] + sorted(self.classes) + ['#'] + sorted(self.ids))
+
+
+def split_blocks(text):
+    """
+    Split a stylesheet into top-level (prelude, body) pairs.
+
+    Statements without a block (@import ...;) come back with body None.
+    Strings and backslash escapes are respected, so `content:'{'` or an
+    escaped Tailwind class like `.w-\\[1px\\]` can't confuse the brace count.
+    """
+    blocks = []
+    depth = 0
+    start = 0
+    prelude_end = None
+    i = 0
+    quote = None
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                prelude_end = i
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                blocks.append((text[start:prelude_end].strip(), text[prelude_end + 1:i]))
+                start = i + 1
+        elif char == ';' and depth == 0:
+            blocks.append((text[start:i].strip(), None))
+            start = i + 1
+        i += 1
+    return blocks
+
+
+def split_selectors(prelude):
+    """Split a selector list on the commas that aren't nested inside (...) or [...]"""
+    selectors = []
+    depth = 0
+    current = ''
+    i = 0
+    while i < len(prelude):
+        char = prelude[i]
+        if char == '\\':
+            current += prelude[i:i + 2]
+            i += 2
+            continue
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(current.strip())
+            current = ''
+            i += 1
+            continue
+        current += char
+        i += 1
+    selectors.append(current.strip())
+    return selectors
+
+
+IDENT_RE = re.compile(r'(?:\\.|[\w-])+')
+
+
+def selector_requirements(selector):
+    """The (tags, classes, ids) an element tree needs for a selector to match anything"""
+    tags, classes, ids = set(), set(), set()
+    i = 0
+    at_compound_start = True
+    while i < len(selector):
+        char = selector[i]
+        if char in '.#':
+            match = IDENT_RE.match(selector, i + 1)
+            name = re.sub(r'\\(.)', r'\1', match.group(0)) if match else ''
+            (classes if char == '.' else ids).add(name)
+            i = match.end() if match else i + 1
+            at_compound_start = False
+        elif char == ':':
+            # Pseudo-classes/elements don't narrow the set of elements we care
+            # about; skip them, along with any (...) argument
+            match = IDENT_RE.match(selector, i + 1 + (selector[i + 1:i + 2] == ':'))
+            i = match.end() if match else i + 1
+            if selector[i:i + 1] == '(':
+                depth = 0
+                while i < len(selector):
+                    if selector[i] == '(':
+                        depth += 1
+                    elif selector[i] == ')':
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    i += 1
+                i += 1
+            at_compound_start = False
+        elif char == '[':
+            i = selector.find(']', i) + 1 or len(selector)
+            at_compound_start = False
+        elif char in ' >+~':
+            i += 1
+            at_compound_start = True
+        elif at_compound_start and (char.isalpha() or char == '*'):
+            match = IDENT_RE.match(selector, i) if char != '*' else None
+            if match:
+                tags.add(match.group(0).lower())
+                i = match.end()
+            else:
+                i += 1
+            at_compound_start = False
+        else:
+            i += 1
+    return tags, classes, ids
+
+
+def critical_rules(blocks, fold):
+    """Serialize the rules from `blocks` that can match something above the fold"""
+    out = []
+    for prelude, body in blocks:
+        if body is None:
+            continue
+        if prelude.startswith('@media') or prelude.startswith('@supports'):
+            inner = critical_rules(split_blocks(body), fold)
+            if inner:
+                out.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@'):
+            # @keyframes, @font-face, ... are left to the full stylesheet
+            continue
+        else:
+            for selector in split_selectors(prelude):
+                tags, classes, ids = selector_requirements(selector)
+                if tags <= fold.tags and classes <= fold.classes and ids <= fold.ids:
+                    out.append(f'{prelude}{{{body}}}')
+                    break
+    return ''.join(out)
+
+
+def page_templates():
+    """(template name, context) for every page and wizard step, each template once"""
+    seen = {}
+    for url, template_name, context in public_routes():
+        seen.setdefault(template_name, context)
+    return seen.items()
+
+
+def render_pages():
+    """
+    {template name: rendered HTML} of page_templates().
+
+    The build runs ahead of collectstatic, so with DEBUG off the manifest
+    storage has no staticfiles.json to resolve {% static %} against yet:
+    pages are rendered with the plain storage instead (the asset builds only
+    read the markup, not the URLs). Raises CommandError naming the pages that
+    fail to render, so a build never goes out with pages missing.
+    """
+    storages = {
+        **settings.STORAGES,
+        'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage'},
+    }
+    pages, failures = {}, []
+    with override_settings(STORAGES=storages):
+        for template_name, context in page_templates():
+            try:
+                pages[template_name] = render_to_string(template_name, {**context, 'csrf_token': 'NOTPROVIDED'})
+            except Exception as exc:
+                failures.append(f'{template_name} ({exc})')
+    if failures:
+        raise CommandError(f"{len(failures)} page(s) failed to render: {', '.join(failures)}")
+    return pages
+
+
+def build(stdout, jobs=None, force=False):
+    """
+    Extract the critical (above-the-fold) CSS of every page from the site stylesheet.
+
+    A page is only recomputed when the markup above its fold or the site
+    stylesheet changed. {% site_stylesheet %} inlines the result and loads
+    the full stylesheet without blocking render.
+    """
+    stylesheet = css.load_manifest().get('stylesheet')
+    output_root = Path(settings.ASSET_BUILD_ROOT)
+    if not stylesheet or not (output_root / stylesheet).exists():
+        stdout.write('Critical CSS: skipped, no compiled site stylesheet')
+        return {}
+
+    previous = load_manifest()
+    blocks = None
+    manifest = {}
+    computed = 0
+    for template_name, html in render_pages().items():
+        fold = FoldParser()
+        fold.feed(html)
+        key = hashlib.sha256(f'{stylesheet}\0{fold.signature()}'.encode()).hexdigest()[:12]
+        entry = previous.get(template_name)
+        if not force and entry and entry['key'] == key and (output_root / entry['path']).exists():
+            manifest[template_name] = entry
+            continue
+
+        if blocks is None:
+            blocks = split_blocks((output_root / stylesheet).read_text())
+        critical = critical_rules(blocks, fold)
+        relative = f"{OUTPUT_DIR}/{template_name.rsplit('.', 1)[0]}.{key}.css"
+        (output_root / relative).parent.mkdir(parents=True, exist_ok=True)
+        (output_root / relative).write_text(critical)
+        manifest[template_name] = {'key': key, 'path': relative, 'bytes': len(critical.encode())}
+        computed += 1
+        stdout.write(f'  {template_name}: {len(critical.encode()):,} B critical')
+
+    referenced = {entry['path'] for entry in manifest.values()}
+    for path in (output_root / OUTPUT_DIR).glob('*.css'):
+        if path.relative_to(output_root).as_posix() not in referenced:
+            path.unlink()
+    manifests.write(manifest_path(), dict(sorted(manifest.items())))
+    stdout.write(f'Critical CSS: {computed} pages extracted, {len(manifest) - computed} unchanged')
+    return manifest
@@ -0,0 +1,197 @@
+import gzip
+import hashlib
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+from core.template_files import iter_template_files
+
+from . import images, manifests
+
+OUTPUT_DIR = 'css'
+MANIFEST_NAME = 'manifest.json'
+
+# Hand-written stylesheets merged after the generated utilities, in this order
+# (the same order the CDN runtime and these files had in the page before).
+# tailwind-custom.css was never linked by a page: it stays out, along with its
+# Inter @import and global body font.
+CUSTOM_STYLESHEETS = ['style.css']
+
+CLASS_ATTR_RE = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+SCRIPT_RE = re.compile(r'<script\b[^>]*>(.*?)</script>|{%\s*script\s*%}(.*?){%\s*endscript\s*%}', re.S | re.I)
+STRING_RE = re.compile(r"""'([^'\\\n]*)'|"([^"\\\n]*)"|`([^`\\]*)`""")
+TEMPLATE_TAG_RE = re.compile(r'{%.*?%}|{{.*?}}|{#.*?#}', re.S)
+CLASS_TOKEN_RE = re.compile(r'^-?[a-z!@][\w:/.\[\]#%(),\'&=+*-]*$', re.I)
+SELECTOR_CLASS_RE = re.compile(r'\.((?:\\.|[\w-])+)')
+IMPORT_RE = re.compile(r"""@import\s+(?:url\([^)]*\)|"[^"]*"|'[^']*')[^;]*;""")
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+
+
+def manifest_path():
+    return Path(settings.ASSET_BUILD_ROOT) / OUTPUT_DIR / MANIFEST_NAME
+
+
+def load_manifest():
+    return manifests.load(manifest_path())
+
+
+def _static_files(suffix):
+    for static_dir in settings.STATICFILES_DIRS:
+        root = Path(static_dir)
+        if root == Path(settings.ASSET_BUILD_ROOT):
+            continue
+        yield from sorted(root.glob(f'*{suffix}'))
+
+
+def _tokens(text):
+    for token in TEMPLATE_TAG_RE.sub(' ', text).split():
+        if CLASS_TOKEN_RE.match(token):
+            yield token
+
+
+def scan_classes():
+    """
+    Every class name the templates and scripts can put in the DOM.
+
+    Templates contribute their class="" attributes and the string literals of
+    their inline scripts (<script> or {% script %}); static JS files
+    contribute all string literals (classList.add('hidden'), innerHTML
+    snippets, ...). Django tags inside attributes are blanked out first, so
+    `{% if %}a{% else %}b{% endif %}` yields both a and b.
+    """
+    classes = set()
+
+    def from_script(text):
+        for match in STRING_RE.finditer(text):
+            literal = next(group for group in match.groups() if group is not None)
+            classes.update(_tokens(literal))
+            for attr in CLASS_ATTR_RE.finditer(literal):
+                classes.update(_tokens(attr.group(1) or attr.group(2) or ''))
+
+    for name, path in iter_template_files():
+        text = path.read_text(encoding='utf-8')
+        for attr in CLASS_ATTR_RE.finditer(text):
+            classes.update(_tokens(attr.group(1) or attr.group(2) or ''))
+        for script in SCRIPT_RE.finditer(text):
+            from_script(script.group(1) or script.group(2) or '')
+    for path in _static_files('.js'):
+        from_script(path.read_text(encoding='utf-8'))
+    return classes
+
+
+def minify_css(css):
+    """Conservative CSS minifier: strips comments and insignificant whitespace only"""
+    css = COMMENT_RE.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r'\s*:\s*(?=[^{}]*;|[^{}]*})', ':', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+def compile_utilities(classes, config_path):
+    """Run the Tailwind CLI over the scanned class list and return the minified CSS"""
+    import pytailwindcss
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / 'classes.txt').write_text('\n'.join(sorted(classes)) + '\n')
+        (tmp / 'input.css').write_text('@tailwind base;\n@tailwind components;\n@tailwind utilities;\n')
+        pytailwindcss.run(
+            [
+                '--config', str(config_path),
+                '--content', str(tmp / 'classes.txt'),
+                '--input', str(tmp / 'input.css'),
+                '--output', str(tmp / 'output.css'),
+                '--minify',
+            ],
+            bin_path=settings.TAILWINDCSS_BIN,
+            version=settings.TAILWINDCSS_VERSION,
+            auto_install=True,
+        )
+        return (tmp / 'output.css').read_text()
+
+
+def selector_classes(css):
+    """Class names that appear in the selectors of a stylesheet"""
+    classes = set()
+    for block in re.findall(r'([^{}]+){', COMMENT_RE.sub('', css)):
+        for match in SELECTOR_CLASS_RE.finditer(block):
+            classes.add(re.sub(r'\\(.)', r'\1', match.group(1)))
+    return classes
+
+
+def build(stdout, jobs=None, force=False):
+    """
+    Compile the utility classes the site actually uses into one hashed stylesheet.
+
+    Replaces the Tailwind Play CDN: the class names found by scan_classes()
+    are fed to the Tailwind CLI (pinned to TAILWINDCSS_VERSION, the v3 line
+    the CDN serves), and the result is merged with the hand-written
+    stylesheets and the {% responsive_background %} breakpoints into
+    css/site.<hash>.css.
+    """
+    output_root = Path(settings.ASSET_BUILD_ROOT)
+    config_path = Path(settings.TAILWINDCSS_CONFIG)
+    classes = scan_classes()
+    custom_sources = [
+        path for path in _static_files('.css') if path.name in CUSTOM_STYLESHEETS
+    ]
+    custom_sources.sort(key=lambda path: CUSTOM_STYLESHEETS.index(path.name))
+    custom_css = '\n'.join(path.read_text(encoding='utf-8') for path in custom_sources)
+    background_css = images.background_rules(settings.RESPONSIVE_IMAGE_WIDTHS)
+
+    inputs = hashlib.sha256()
+    for part in (settings.TAILWINDCSS_VERSION, config_path.read_text(), custom_css, background_css, *sorted(classes)):
+        inputs.update(part.encode() + b'\0')
+    inputs = inputs.hexdigest()[:16]
+
+    previous = load_manifest()
+    if not force and previous.get('inputs') == inputs and (output_root / previous['stylesheet']).exists():
+        stdout.write(f"Stylesheet: unchanged ({previous['stylesheet']})")
+        return previous
+
+    try:
+        utilities = compile_utilities(classes, config_path)
+    except Exception as exc:
+        stdout.write(f'Stylesheet: Tailwind CLI failed, pages keep using the CDN fallback ({exc})')
+        return previous
+
+    # @import has to precede every other rule, so lift them out of the custom sheets
+    imports = IMPORT_RE.findall(COMMENT_RE.sub('', custom_css))
+    custom_minified = minify_css(IMPORT_RE.sub('', custom_css))
+    stylesheet = ''.join(imports) + utilities.strip() + custom_minified + background_css
+    content = stylesheet.encode()
+
+    relative = f'{OUTPUT_DIR}/site.{hashlib.sha256(content).hexdigest()[:12]}.css'
+    (output_root / OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
+    for stale in (output_root / OUTPUT_DIR).glob('site.*.css'):
+        if stale.name != Path(relative).name:
+            stale.unlink()
+    (output_root / relative).write_bytes(content)
+
+    used = selector_classes(stylesheet)
+    kept = sorted(classes & used)
+    dropped = sorted(classes - used)
+    custom_bytes = len(custom_css.encode())
+    manifest = {
+        'stylesheet': relative,
+        'inputs': inputs,
+        'bytes': len(content),
+        'gzip_bytes': len(gzip.compress(content)),
+        'utilities_bytes': len(utilities.encode()),
+        'custom_bytes': custom_bytes,
+        'custom_minified_bytes': len(custom_minified.encode()),
+        'classes_kept': len(kept),
+        'classes_dropped': dropped,
+    }
+    manifests.write(manifest_path(), manifest)
+    stdout.write(
+        f"Stylesheet: {relative}, {manifest['bytes']:,} B ({manifest['gzip_bytes']:,} B gzipped): "
+        f"{manifest['utilities_bytes']:,} B of utilities for {len(kept)} classes, custom CSS "
+        f"{custom_bytes:,} B -> {manifest['custom_minified_bytes']:,} B; "
+        f"{len(dropped)} scanned names matched no rule"
+    )
+    return manifest
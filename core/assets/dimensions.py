@@ -0,0 +1,152 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+from . import critical, images, manifests
+
+OUTPUT_DIR = 'dimensions'
+MANIFEST_NAME = 'manifest.json'
+
+# Tags, with <script> and <style> (whose content may look like tags) skipped whole
+TAG_RE = re.compile(
+    r"""<(script|style)\b.*?</\1\s*>|<(/?)([a-zA-Z][\w-]*)(?:"[^"]*"|'[^']*'|[^'">])*>""",
+    re.S | re.I,
+)
+ATTR_RE = re.compile(r"""\s([\w:-]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?""")
+# ManifestStaticFilesStorage puts a 12-digit hash in front of the extension
+STATIC_HASH_RE = re.compile(r'\.[0-9a-f]{12}(?=\.\w+$)')
+
+
+def manifest_path():
+    return Path(settings.ASSET_BUILD_ROOT) / OUTPUT_DIR / MANIFEST_NAME
+
+
+def load_manifest():
+    return manifests.load(manifest_path())
+
+
+def build(stdout, jobs=None, force=False):
+    """
+    Record the pixel size of every image under static/assets/image.
+
+    Only the image headers are read, so the whole directory is indexed on
+    every run. Files Pillow can't identify are left out.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    manifest = {}
+    skipped = 0
+    for static_dir in settings.STATICFILES_DIRS:
+        root = Path(static_dir)
+        if root == Path(settings.ASSET_BUILD_ROOT):
+            continue
+        for path in sorted((root / images.SOURCE_DIR).rglob('*')):
+            if not path.is_file():
+                continue
+            try:
+                with Image.open(path) as image:
+                    width, height = image.size
+            except (UnidentifiedImageError, OSError):
+                skipped += 1
+                continue
+            manifest.setdefault(path.relative_to(root).as_posix(), {'width': width, 'height': height})
+
+    manifests.write(manifest_path(), dict(sorted(manifest.items())))
+    stdout.write(f'Image dimensions: {len(manifest)} images indexed, {skipped} files skipped')
+    return manifest
+
+
+def lookup(url):
+    """{'width', 'height'} of the static image at `url` (a static path or URL), or None"""
+    manifest = load_manifest()
+    path = url.split('?', 1)[0].split('#', 1)[0]
+    if path.startswith(settings.STATIC_URL):
+        path = path[len(settings.STATIC_URL):]
+    return manifest.get(path) or manifest.get(STATIC_HASH_RE.sub('', path))
+
+
+def _attrs(tag):
+    return {
+        match.group(1).lower(): next((value for value in match.groups()[1:] if value is not None), '')
+        for match in ATTR_RE.finditer(tag)
+    }
+
+
+def _with_attrs(tag, attrs):
+    end = '/>' if tag.endswith('/>') else '>'
+    added = ''.join(f' {name}="{value}"' for name, value in attrs.items())
+    return f'{tag[:-len(end)].rstrip()}{added}{" " if end == "/>" else ""}{end}'
+
+
+def add_image_hints(html):
+    """
+    Give the <img> tags of a rendered page their loading hints.
+
+    Images found in the dimensions manifest get intrinsic width/height, so
+    the browser reserves their space before they load. Above the fold (the
+    same fold as the critical CSS: up to the end of the first <section>)
+    the largest image in that section is the likely LCP element and gets
+    fetchpriority="high"; images below the fold get loading="lazy" and
+    decoding="async". Attributes a template already sets are kept.
+    Pages are returned unchanged until `manage.py build_assets dimensions`
+    has run.
+    """
+    if '<img' not in html or not load_manifest():
+        return html
+
+    found = []
+    in_body = False
+    elements = 0
+    section_depth = 0
+    above_fold = True
+    for match in TAG_RE.finditer(html):
+        closing, name = match.group(2), match.group(3)
+        if name is None:
+            continue
+        name = name.lower()
+        if closing:
+            if name == 'section' and in_body and above_fold:
+                section_depth -= 1
+                if section_depth == 0:
+                    above_fold = False
+            continue
+        if name == 'body':
+            in_body = True
+            continue
+        if in_body and above_fold:
+            elements += 1
+            if name == 'section':
+                section_depth += 1
+            if elements >= critical.FOLD_MAX_ELEMENTS:
+                above_fold = False
+        if name == 'img':
+            attrs = _attrs(match.group(0))
+            # Fragments (no <body>) are fetched after the page: all below the fold
+            found.append((match, attrs, lookup(attrs.get('src', '')), in_body and above_fold, section_depth > 0))
+
+    candidates = [
+        (size['width'] * size['height'], index)
+        for index, (match, attrs, size, fold, in_section) in enumerate(found)
+        if fold and in_section and size and 'loading' not in attrs
+    ]
+    lcp = max(candidates)[1] if candidates else None
+    out = []
+    position = 0
+    for index, (match, attrs, size, fold, in_section) in enumerate(found):
+        hints = {}
+        if size and 'width' not in attrs and 'height' not in attrs:
+            hints.update(width=size['width'], height=size['height'])
+        if index == lcp:
+            if 'fetchpriority' not in attrs:
+                hints['fetchpriority'] = 'high'
+        elif not fold:
+            if 'loading' not in attrs:
+                hints['loading'] = 'lazy'
+            if 'decoding' not in attrs:
+                hints['decoding'] = 'async'
+        if hints:
+            out += [html[position:match.start()], _with_attrs(match.group(0), hints)]
+            position = match.end()
+    out.append(html[position:])
+    return ''.join(out)
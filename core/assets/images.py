@@ -0,0 +1,205 @@
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from . import manifests
+
+SOURCE_DIR = 'assets/image'
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+OUTPUT_DIR = 'responsive'
+MANIFEST_NAME = 'manifest.json'
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+}
+
+# Encoder options per output format
+ENCODE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 55, 'speed': 8},
+}
+
+
+# {% responsive_background %} sets one of these per configured width, e.g. --responsive-bg-960
+BACKGROUND_PROPERTY = '--responsive-bg'
+
+
+def manifest_path():
+    return Path(settings.ASSET_BUILD_ROOT) / OUTPUT_DIR / MANIFEST_NAME
+
+
+def iter_sources():
+    """Yield (static path, absolute path) for every raster image in the static dirs"""
+    for static_dir in settings.STATICFILES_DIRS:
+        root = Path(static_dir)
+        if root == Path(settings.ASSET_BUILD_ROOT):
+            continue
+        for path in sorted((root / SOURCE_DIR).rglob('*')):
+            if path.suffix.lower() in SOURCE_EXTENSIONS:
+                yield path.relative_to(root).as_posix(), path
+
+
+def available_formats():
+    from PIL import features
+
+    formats = []
+    for fmt in settings.RESPONSIVE_IMAGE_FORMATS:
+        if features.check(fmt):
+            formats.append(fmt)
+    return formats
+
+
+def background_rules(widths):
+    """
+    CSS that gives {% responsive_background %} elements the variant for the viewport width.
+
+    The tag declares a custom property per width inline; these rules pick the
+    one for the narrowest breakpoint the viewport fits. An inline
+    background-image beats any stylesheet rule, hence !important, and
+    browsers without image-set() type() keep the inline fallbacks.
+    """
+    widths = sorted(widths)
+    selector = f'[style*="{BACKGROUND_PROPERTY}-"]'
+    rules = [f'{selector}{{background-image:var({BACKGROUND_PROPERTY}-{widths[-1]})!important}}']
+    for width in reversed(widths[:-1]):
+        rules.append(
+            f'@media (max-width:{width}px){{{selector}{{background-image:var({BACKGROUND_PROPERTY}-{width})!important}}}}'
+        )
+    return f'@supports (background-image:image-set(url("x.png") type("image/png"))){{{"".join(rules)}}}'
+
+
+def target_widths(width, configured):
+    """Configured widths narrower than the source, plus the source width itself"""
+    widths = [w for w in configured if w < width]
+    if width <= max(configured):
+        widths.append(width)
+    return sorted(set(widths))
+
+
+def build_variants(static_path, source, source_hash, output_root, configured_widths, formats):
+    """Encode every width/format of one source image. Runs inside a pool worker."""
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image.load()
+        width, height = image.size
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+        stem = static_path.rsplit('.', 1)[0]
+        variants = {fmt: [] for fmt in formats}
+        for target in target_widths(width, configured_widths):
+            resized = image if target == width else image.resize(
+                (target, round(height * target / width)), Image.Resampling.LANCZOS
+            )
+            for fmt in formats:
+                buffer = io.BytesIO()
+                resized.save(buffer, **ENCODE_OPTIONS[fmt])
+                data = buffer.getvalue()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                relative = f'{OUTPUT_DIR}/{stem}.{target}w.{digest}.{fmt}'
+                path = Path(output_root) / relative
+                if not path.exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(data)
+                variants[fmt].append({'width': target, 'path': relative, 'bytes': len(data)})
+
+    return static_path, {
+        'source_hash': source_hash,
+        'width': width,
+        'height': height,
+        'bytes': source.stat().st_size,
+        'variants': variants,
+    }
+
+
+def _options_key(formats):
+    options = {'widths': settings.RESPONSIVE_IMAGE_WIDTHS, 'formats': formats, 'encode': ENCODE_OPTIONS}
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _is_fresh(entry, source_hash, options_key, output_root):
+    if not entry or entry.get('source_hash') != source_hash or entry.get('options') != options_key:
+        return False
+    return all(
+        (output_root / variant['path']).exists()
+        for variants in entry['variants'].values()
+        for variant in variants
+    )
+
+
+def build(stdout, jobs=None, force=False):
+    """
+    Generate WebP/AVIF variants for every image under static/assets/image.
+
+    Sources whose content hash and encoder settings match the previous
+    manifest are skipped. Variant files are named after their own content
+    hash, so they can be cached forever.
+    """
+    output_root = Path(settings.ASSET_BUILD_ROOT)
+    formats = available_formats()
+    options_key = _options_key(formats)
+    previous = load_manifest()
+
+    manifest = {}
+    pending = []
+    for static_path, source in iter_sources():
+        source_hash = hashlib.sha256(source.read_bytes()).hexdigest()
+        entry = previous.get(static_path)
+        if not force and _is_fresh(entry, source_hash, options_key, output_root):
+            manifest[static_path] = entry
+        else:
+            pending.append((static_path, source, source_hash))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+            futures = [
+                pool.submit(
+                    build_variants, static_path, source, source_hash, output_root,
+                    settings.RESPONSIVE_IMAGE_WIDTHS, formats,
+                )
+                for static_path, source, source_hash in pending
+            ]
+            for future in futures:
+                static_path, entry = future.result()
+                entry['options'] = options_key
+                manifest[static_path] = entry
+                largest = ', '.join(
+                    f'{fmt} {variants[-1]["bytes"]:,} B' for fmt, variants in entry['variants'].items()
+                )
+                stdout.write(f'  {static_path}: {entry["bytes"]:,} B -> {largest} at {entry["width"]}w')
+
+    # Drop variants that no manifest entry refers to any more
+    referenced = {
+        variant['path']
+        for entry in manifest.values()
+        for variants in entry['variants'].values()
+        for variant in variants
+    }
+    variants_root = output_root / OUTPUT_DIR
+    if variants_root.exists():
+        for path in variants_root.rglob('*'):
+            relative = path.relative_to(output_root).as_posix()
+            if path.is_file() and path.name != MANIFEST_NAME and relative not in referenced:
+                path.unlink()
+
+    manifest = dict(sorted(manifest.items()))
+    manifests.write(manifest_path(), manifest)
+    stdout.write(
+        f'Responsive images: {len(pending)} built, {len(manifest) - len(pending)} unchanged '
+        f'({", ".join(formats) or "no formats available"})'
+    )
+    return manifest
+
+
+def load_manifest():
+    return manifests.load(manifest_path())
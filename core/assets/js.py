@@ -0,0 +1,329 @@
+import gzip
+import hashlib
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+
+from django.conf import settings
+
+from core.template_files import iter_template_files
+
+from . import critical, css, manifests
+
+OUTPUT_DIR = 'js'
+MANIFEST_NAME = 'manifest.json'
+
+# The site script, split into feature chunks at its "@feature" lines
+SOURCE = 'script.js'
+
+# Features used by at least this share of the pages go into the common chunk
+COMMON_SHARE = 0.8
+
+FEATURE_RE = re.compile(r'^// @feature ([\w-]+)(?::(.*))?$', re.M)
+INLINE_SCRIPT_RE = re.compile(r'{%\s*script(?:\s+blocking)?\s*%}(.*?){%\s*endscript\s*%}', re.S)
+SELECTOR_RE = re.compile(
+    r"""^([a-z][\w-]*)?((?:[#.][\w-]+)*)(?:\[([\w-]+)(?:([\^*$]?=)["']?([^"'\]]*)["']?)?\])?$""", re.I,
+)
+
+# After these (or the keywords below), a "/" starts a regex literal, not a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = {
+    'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw', 'instanceof',
+    'yield', 'await',
+}
+
+
+def manifest_path():
+    return Path(settings.ASSET_BUILD_ROOT) / OUTPUT_DIR / MANIFEST_NAME
+
+
+def load_manifest():
+    return manifests.load(manifest_path())
+
+
+def source_key(source):
+    """Manifest key of an inline {% script %} block, from its unrendered source"""
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+
+def _is_word(char):
+    return char.isalnum() or char in '_$' or ord(char) > 127
+
+
+def _literal_end(source, start):
+    """
+    Index just past the string or template literal opening at `start`.
+
+    The ${...} substitutions of a template literal are skipped by matching
+    their braces, so a literal nested in one doesn't end the outer one.
+    """
+    quote, j, n = source[start], start + 1, len(source)
+    while j < n:
+        char = source[j]
+        if char == '\\':
+            j += 2
+        elif char == quote:
+            return j + 1
+        elif quote == '`' and source.startswith('${', j):
+            j, depth = j + 2, 1
+            while j < n and depth:
+                char = source[j]
+                if char in '\'"`':
+                    j = _literal_end(source, j)
+                    continue
+                depth += {'{': 1, '}': -1}.get(char, 0)
+                j += 1
+        else:
+            j += 1
+    return n
+
+
+def minify_js(source):
+    """
+    Conservative JS minifier: strips comments, indentation and blank lines only.
+
+    Line breaks between statements are kept, so automatic semicolon insertion
+    reads the output as it read the source. Strings, template literals and
+    regex literals are copied verbatim.
+    """
+    out = []
+    last = ''
+    word = ''
+    space = newline = False
+    i, n = 0, len(source)
+    while i < n:
+        char = source[i]
+        if char == '\n':
+            newline = True
+            i += 1
+            continue
+        if char.isspace():
+            space = True
+            i += 1
+            continue
+        if source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            space = True
+            continue
+
+        if newline and last and last not in '{([,;' and char not in ')]},':
+            out.append('\n')
+        elif (space or newline) and last and (
+            (_is_word(last) and _is_word(char))
+            or (last in '+-' and char in '+-')
+            or '/' in (last, char)
+            or (char == '.' and last.isdigit())
+        ):
+            out.append(' ')
+        space = newline = False
+
+        if char in '\'"`':
+            # A string or template literal, up to the unescaped closing quote
+            j = _literal_end(source, i)
+            out.append(source[i:j])
+            i, last, word = j, char, ''
+        elif char == '/' and (not last or last in REGEX_PRECEDERS or word in REGEX_KEYWORDS):
+            # A regex literal; a "/" inside [...] doesn't end it
+            j, in_class = i + 1, False
+            while j < n and (in_class or source[j] != '/') and source[j] != '\n':
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                j += 1
+            out.append(source[i:j + 1])
+            i, last, word = j + 1, '/', ''
+        else:
+            out.append(char)
+            word = word + char if _is_word(char) and _is_word(last) else (char if _is_word(char) else '')
+            last = char
+            i += 1
+    return ''.join(out)
+
+
+def split_features(source):
+    """[(name, selectors, code)] of the "@feature name: selectors" sections of a script, in order"""
+    markers = list(FEATURE_RE.finditer(source))
+    features = []
+    for index, marker in enumerate(markers):
+        end = markers[index + 1].start() if index + 1 < len(markers) else len(source)
+        selectors = [selector.strip() for selector in (marker.group(2) or '').split(',') if selector.strip()]
+        features.append((marker.group(1), selectors, source[marker.end():end]))
+    if markers and minify_js(source[:markers[0].start()]).strip():
+        # Code ahead of the first marker runs on every page
+        features.insert(0, ('preamble', [], source[:markers[0].start()]))
+    return features
+
+
+class ElementParser(HTMLParser):
+    """Collects (tag, attributes) of every element of a page"""
+
+    def __init__(self):
+        super().__init__()
+        self.elements = []
+
+    def handle_starttag(self, tag, attrs):
+        self.elements.append((tag, {name: value or '' for name, value in attrs}))
+
+
+def selector_matches(selector, elements):
+    """
+    Whether a simple selector matches any of `elements`.
+
+    Understands tag#id.class[attr^="value"] compounds and descendant
+    selectors (of which only the last compound is checked). Anything else
+    counts as a match, so a feature is never dropped from a page that needs it.
+    """
+    match = SELECTOR_RE.match(selector.split()[-1]) if selector.split() else None
+    if not match:
+        return True
+    tag, qualifiers, attr, operator, value = match.groups()
+    ids = re.findall(r'#([\w-]+)', qualifiers)
+    classes = re.findall(r'\.([\w-]+)', qualifiers)
+    for element_tag, attrs in elements:
+        if tag and element_tag != tag.lower():
+            continue
+        if any(attrs.get('id') != id_ for id_ in ids):
+            continue
+        if not set(classes) <= set(attrs.get('class', '').split()):
+            continue
+        if attr:
+            if attr not in attrs:
+                continue
+            actual = attrs[attr]
+            if operator and not {
+                '=': actual == value,
+                '^=': actual.startswith(value),
+                '$=': actual.endswith(value),
+                '*=': value in actual,
+            }[operator]:
+                continue
+        return True
+    return False
+
+
+def inline_scripts():
+    """{source key: source} of the {% script %} blocks in the templates that can be served as files"""
+    scripts = {}
+    for name, path in iter_template_files():
+        for match in INLINE_SCRIPT_RE.finditer(path.read_text(encoding='utf-8')):
+            # Blocks with template syntax depend on the context: they stay inline
+            if not css.TEMPLATE_TAG_RE.search(match.group(1)):
+                scripts[source_key(match.group(1))] = match.group(1)
+    return scripts
+
+
+def _write(output_root, directory, stem, code, force):
+    content = code.encode()
+    relative = f'{OUTPUT_DIR}/{directory}{stem}.{hashlib.sha256(content).hexdigest()[:12]}.js'
+    path = output_root / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if force or not path.exists():
+        path.write_bytes(content)
+    return relative, len(content)
+
+
+def build(stdout, jobs=None, force=False):
+    """
+    Split script.js into per-feature chunks and move inline scripts into files.
+
+    Every page is rendered and its markup checked against the selectors of
+    each "@feature" section of script.js. Features (nearly) every page uses
+    share a js/common.<hash>.js chunk; the others are bundled by the set of
+    pages that use them, so a page loads a few chunks at most. Inline
+    {% script %} blocks are written to js/inline/script.<hash>.js (pages
+    with the same script share the file). {% page_scripts %} and {% script %} turn
+    the manifest into <script defer> tags. Outputs are minified and named
+    by content hash, so they can be cached forever.
+    """
+    output_root = Path(settings.ASSET_BUILD_ROOT)
+    source_path = next(
+        (Path(static_dir) / SOURCE for static_dir in settings.STATICFILES_DIRS if (Path(static_dir) / SOURCE).exists()),
+        None,
+    )
+    if source_path is None:
+        stdout.write(f'Scripts: skipped, no {SOURCE}')
+        return {}
+    source = source_path.read_text(encoding='utf-8')
+    features = split_features(source)
+
+    pages = {}
+    for template_name, html in critical.render_pages().items():
+        parser = ElementParser()
+        parser.feed(html)
+        pages[template_name] = [
+            name for name, selectors, code in features
+            if not selectors or any(selector_matches(selector, parser.elements) for selector in selectors)
+        ]
+
+    # Features most pages use share one chunk; the rest are grouped by the
+    # exact set of pages that use them, one chunk per group
+    users = {
+        name: frozenset(page for page, used in pages.items() if name in used)
+        for name, selectors, code in features
+    }
+    groups = {'common': []}
+    for name, selectors, code in features:
+        if not users[name]:
+            continue
+        if not selectors or len(users[name]) >= COMMON_SHARE * len(pages):
+            groups['common'].append(name)
+        else:
+            groups.setdefault(users[name], []).append(name)
+    if not groups['common']:
+        del groups['common']
+    minified = {name: minify_js(code).strip() for name, selectors, code in features}
+    chunks, sizes, chunk_pages = {}, {}, {}
+    for group, names in groups.items():
+        chunk = 'common' if group == 'common' else '_'.join(names)
+        chunks[chunk], sizes[chunk] = _write(
+            output_root, '', chunk, ';\n'.join(minified[name] for name in names) + '\n', force,
+        )
+        chunk_pages[chunk] = pages.keys() if group == 'common' else group
+    # Served whole to pages the build didn't render (error pages, ...)
+    full, full_bytes = _write(output_root, '', 'script', ';\n'.join(minified.values()) + '\n', force)
+
+    inline = {}
+    inline_bytes = inline_source_bytes = 0
+    for key, script in sorted(inline_scripts().items()):
+        inline[key], size = _write(output_root, 'inline/', 'script', minify_js(script).strip() + '\n', force)
+        inline_bytes += size
+        inline_source_bytes += len(script.encode())
+
+    manifest = {
+        'script': full,
+        'chunks': chunks,
+        'features': {chunk: names for chunk, names in zip(chunks, groups.values())},
+        'pages': {
+            template_name: [chunk for chunk in chunks if template_name in chunk_pages[chunk]]
+            for template_name in sorted(pages)
+        },
+        'inline': inline,
+        'source_bytes': len(source.encode()),
+        'bytes': full_bytes,
+        'gzip_bytes': len(gzip.compress((output_root / full).read_bytes())),
+        'chunk_bytes': sizes,
+        'inline_source_bytes': inline_source_bytes,
+        'inline_bytes': inline_bytes,
+    }
+    referenced = {full, *chunks.values(), *inline.values()}
+    for path in (output_root / OUTPUT_DIR).rglob('*.js'):
+        if path.relative_to(output_root).as_posix() not in referenced:
+            path.unlink()
+    manifests.write(manifest_path(), manifest)
+
+    page_bytes = sorted(sum(sizes[chunk] for chunk in chunk_names) for chunk_names in manifest['pages'].values())
+    stdout.write(
+        f"Scripts: {SOURCE} {manifest['source_bytes']:,} B -> {full_bytes:,} B minified, split into "
+        f"{len(chunks)} chunks; pages load {page_bytes[0] if page_bytes else 0:,}-"
+        f"{page_bytes[-1] if page_bytes else 0:,} B of it; {len(inline)} inline scripts "
+        f"({inline_source_bytes:,} B) moved to files ({inline_bytes:,} B)"
+    )
+    return manifest
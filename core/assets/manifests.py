@@ -0,0 +1,20 @@
+import json
+
+_cache = {}
+
+
+def load(path):
+    """Return the JSON manifest at `path` ({} if missing), re-reading it only when the file changes"""
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached = _cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _cache[path] = (mtime, json.loads(path.read_text()))
+    return cached[1]
+
+
+def write(path, manifest):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2) + '\n')
@@ -0,0 +1,216 @@
+"""
+JWT authentication for the API without per-request database or HMAC work.
+
+CachedJWTAuthentication verifies a token once per worker: the validated
+token is kept in a bounded LRU keyed on the raw token until the token
+expires, so repeated calls with the same token (autosave) skip the
+signature check and claim validation. StatelessJWTAuthentication also
+builds request.user from the token's claims (simplejwt's TokenUser)
+instead of loading the user row; views must compare owners by id
+(owner_id=request.user.pk). REST_FRAMEWORK picks it when JWT_STATELESS
+is set.
+
+Without a user lookup, logging out or deactivating a user no longer takes
+effect by itself, so tokens can be revoked (TokenRevocation): one token by
+its jti, or every token a user was issued until now. Each worker keeps
+the unexpired revocations in memory, checks every request against them
+and loads new ones every JWT_REVOCATION_CHECK_INTERVAL seconds (0
+switches revocation off). Deactivating a user or changing their password
+revokes every token they were issued (revoke_on_credentials_change).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+
+class TokenCache:
+    """LRU of validated tokens by raw token, each kept until the token's `exp`"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, raw_token):
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is not None:
+                token, expires = entry
+                if expires > time.time():
+                    self._entries.move_to_end(raw_token)
+                    self.hits += 1
+                    return token
+                del self._entries[raw_token]
+            self.misses += 1
+            return None
+
+    def set(self, raw_token, token):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[raw_token] = (token, token['exp'])
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RevocationList:
+    """
+    The unexpired TokenRevocation rows, in memory.
+
+    is_revoked() reloads at most every `check_interval` seconds, and only
+    the rows added since the last load: those past the highest pk seen, plus
+    those created within `overlap` of the newest row seen, so a row committed
+    late (or stamped by a skewed clock) with a lower pk isn't missed.
+    Reloading a row again is harmless.
+    """
+
+    overlap = timedelta(minutes=5)
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self.tokens = {}
+        self.users = {}
+        self._last_pk = None
+        self._loaded_until = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.check_interval > 0
+
+    def _add(self, revocation):
+        expires = revocation.expires_at.timestamp()
+        if revocation.jti:
+            self.tokens[revocation.jti] = expires
+        else:
+            # Tokens issued in the same second may predate it
+            revoked_before = int(revocation.created_at.timestamp())
+            previous = self.users.get(str(revocation.user_id), (0, 0))
+            self.users[str(revocation.user_id)] = (max(previous[0], revoked_before), max(previous[1], expires))
+
+    def refresh(self, force=False):
+        from .models import TokenRevocation
+
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        with self._lock:
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            revocations = TokenRevocation.objects.filter(expires_at__gt=datetime.now(timezone.utc))
+            if self._last_pk is not None:
+                revocations = revocations.filter(
+                    Q(pk__gt=self._last_pk) | Q(created_at__gte=self._loaded_until - self.overlap)
+                )
+            for revocation in revocations.order_by('pk'):
+                self._add(revocation)
+                self._last_pk = max(self._last_pk or 0, revocation.pk)
+                self._loaded_until = max(self._loaded_until or revocation.created_at, revocation.created_at)
+            # Expired tokens are rejected anyway; forget what they were revoked by
+            current = time.time()
+            self.tokens = {jti: expires for jti, expires in self.tokens.items() if expires > current}
+            self.users = {user: entry for user, entry in self.users.items() if entry[1] > current}
+
+    def is_revoked(self, token):
+        if not self.enabled:
+            return False
+        self.refresh()
+        if token.get(api_settings.JTI_CLAIM) in self.tokens:
+            return True
+        revoked = self.users.get(str(token.get(api_settings.USER_ID_CLAIM)))
+        return revoked is not None and token.get('iat', 0) <= revoked[0]
+
+    def revoke(self, token=None, user_id=None):
+        """Revoke `token`, or every token issued to `user_id` until now"""
+        from .models import TokenRevocation
+
+        if token is not None:
+            revocation = TokenRevocation.objects.create(
+                user_id=token[api_settings.USER_ID_CLAIM],
+                jti=token[api_settings.JTI_CLAIM],
+                expires_at=datetime.fromtimestamp(token['exp'], timezone.utc),
+            )
+        else:
+            lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+            revocation = TokenRevocation.objects.create(
+                user_id=user_id, expires_at=datetime.now(timezone.utc) + lifetime,
+            )
+        with self._lock:
+            self._add(revocation)
+        return revocation
+
+
+token_cache = TokenCache(max_entries=settings.JWT_CACHE_MAX_ENTRIES)
+revocations = RevocationList(check_interval=settings.JWT_REVOCATION_CHECK_INTERVAL)
+
+
+def check_revoked(token):
+    if revocations.is_revoked(token):
+        raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with validated tokens cached per worker and checked against the revocation list"""
+
+    def get_validated_token(self, raw_token):
+        token = token_cache.get(raw_token)
+        if token is None:
+            token = super().get_validated_token(raw_token)
+            token_cache.set(raw_token, token)
+        check_revoked(token)
+        return token
+
+
+class StatelessJWTAuthentication(CachedJWTAuthentication):
+    """CachedJWTAuthentication with request.user built from the token's claims, without a query"""
+
+    get_user = JWTStatelessUserAuthentication.get_user
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    """simplejwt's refresh, refusing revoked refresh tokens (SIMPLE_JWT['TOKEN_REFRESH_SERIALIZER'])"""
+
+    def validate(self, attrs):
+        check_revoked(self.token_class(attrs['refresh']))
+        return super().validate(attrs)
+
+
+def track_credentials(sender, instance, update_fields=None, **kwargs):
+    """pre_save of the user model: note whether the save deactivates the user or changes the password"""
+    instance._revoke_tokens = False
+    if instance.pk is None or (update_fields is not None and not {'is_active', 'password'} & set(update_fields)):
+        return
+    stored = sender._default_manager.filter(pk=instance.pk).values('is_active', 'password').first()
+    if stored is not None:
+        instance._revoke_tokens = (
+            (stored['is_active'] and not instance.is_active) or stored['password'] != instance.password
+        )
+
+
+def revoke_on_credentials_change(sender, instance, created=False, **kwargs):
+    """post_save of the user model: revoke every token of a user track_credentials() flagged"""
+    if not created and getattr(instance, '_revoke_tokens', False):
+        instance._revoke_tokens = False
+        revocations.revoke(user_id=instance.pk)
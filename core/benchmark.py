@@ -0,0 +1,301 @@
+import http.client
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.conf import settings
+
+from .routes import public_routes
+
+ACCEPT_ENCODING = 'br, gzip'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, sizes, statuses):
+    """Result entry for one page: latency percentiles (ms), throughput and bytes"""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'status': max(set(statuses), key=statuses.count),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'bytes': max(set(sizes), key=sizes.count),
+    }
+
+
+def discover_routes(only=None):
+    """(url, template name) for every public page and wizard step"""
+    routes = [(url, template_name) for url, template_name, context in public_routes()]
+    if only:
+        routes = [(url, template_name) for url, template_name in routes if url in only]
+    return routes
+
+
+def run_client(routes, requests, warmup, stdout):
+    """Drive every route through the Django test client, one request at a time"""
+    from django.test import Client
+
+    client = Client(raise_request_exception=False, HTTP_ACCEPT_ENCODING=ACCEPT_ENCODING)
+    # Broken pages are reported in the results; don't log a traceback per request
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    results = []
+    for url, template_name in routes:
+        for _ in range(warmup):
+            client.get(url)
+        latencies, sizes, statuses = [], [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - request_started)
+            sizes.append(len(response.content))
+            statuses.append(response.status_code)
+        entry = summarize(latencies, time.perf_counter() - started, sizes, statuses)
+        results.append({'mode': 'client', 'concurrency': 1, 'url': url, 'template': template_name, **entry})
+        stdout.write(_format_entry(results[-1]))
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class GunicornServer:
+    """A gunicorn serving this project on a free local port, for the duration of a with block"""
+
+    def __init__(self, workers=2, port=None, extra_args=(), env=None, app='config.wsgi:application'):
+        self.app = app
+        self.workers = workers
+        self.port = port or free_port()
+        self.extra_args = list(extra_args)
+        self.env = env
+        self.process = None
+        self.log = None
+
+    def __enter__(self):
+        command = [
+            sys.executable, '-m', 'gunicorn', self.app,
+            '--bind', f'127.0.0.1:{self.port}',
+            '--workers', str(self.workers),
+            '--log-level', 'warning',
+            *self.extra_args,
+        ]
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env={**os.environ, **(self.env or {})},
+            stdout=subprocess.DEVNULL, stderr=self.log,
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self.log.seek(0)
+                raise RuntimeError(f'gunicorn exited: {self.log.read().decode()[-2000:]}')
+            try:
+                fetch(self.port, '/')
+            except OSError:
+                time.sleep(0.2)
+                continue
+            return self
+        self.__exit__()
+        raise RuntimeError('gunicorn did not start within 60 seconds')
+
+    def __exit__(self, *exc_info):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.log:
+            self.log.close()
+
+
+def fetch(port, url, timeout=60):
+    """GET a URL from the local server on a fresh connection; returns (status, body bytes)"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', url, headers={'Accept-Encoding': ACCEPT_ENCODING})
+        response = connection.getresponse()
+        return response.status, len(response.read())
+    finally:
+        connection.close()
+
+
+def run_gunicorn(routes, requests, warmup, concurrency_levels, workers, stdout):
+    """Drive every route over HTTP against a local gunicorn at each concurrency level"""
+    results = []
+    with GunicornServer(workers=workers) as server:
+        for concurrency in concurrency_levels:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for url, template_name in routes:
+                    list(pool.map(lambda _: fetch(server.port, url), range(warmup * concurrency)))
+
+                    def timed(_):
+                        request_started = time.perf_counter()
+                        status, size = fetch(server.port, url)
+                        return time.perf_counter() - request_started, size, status
+
+                    started = time.perf_counter()
+                    samples = list(pool.map(timed, range(requests)))
+                    elapsed = time.perf_counter() - started
+                    latencies, sizes, statuses = (list(column) for column in zip(*samples))
+                    entry = summarize(latencies, elapsed, sizes, statuses)
+                    results.append({
+                        'mode': 'gunicorn', 'concurrency': concurrency,
+                        'url': url, 'template': template_name, **entry,
+                    })
+                    stdout.write(_format_entry(results[-1]))
+    return results
+
+
+def slow_client(port, url, stop, interval=1.0):
+    """
+    Keep one connection busy the way a slow mobile client does.
+
+    The request headers trickle in one line every `interval` seconds, then
+    the response is read; repeated until `stop` is set.
+    """
+    lines = [
+        f'GET {url} HTTP/1.1\r\n', 'Host: localhost\r\n', 'Accept: text/html\r\n',
+        f'Accept-Encoding: {ACCEPT_ENCODING}\r\n', 'Connection: close\r\n', '\r\n',
+    ]
+    while not stop.is_set():
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=60) as sock:
+                for line in lines:
+                    sock.sendall(line.encode())
+                    if stop.wait(interval):
+                        return
+                while sock.recv(65536):
+                    pass
+        except OSError:
+            if stop.wait(interval):
+                return
+
+
+def run_with_slow_clients(port, url, requests, concurrency, slow_clients, timeout=10):
+    """
+    Fire `requests` GETs at `concurrency` while `slow_clients` connections trickle in.
+
+    Returns a result entry as summarize() does, plus the number of requests
+    that failed or took longer than `timeout` seconds.
+    """
+    stop = threading.Event()
+    trickling = [
+        threading.Thread(target=slow_client, args=(port, url, stop), daemon=True)
+        for _ in range(slow_clients)
+    ]
+    for thread in trickling:
+        thread.start()
+    # Let the slow connections get hold of the server first
+    time.sleep(1.0 if slow_clients else 0)
+
+    def timed(_):
+        request_started = time.perf_counter()
+        try:
+            status, size = fetch(port, url, timeout=timeout)
+        except OSError:
+            return time.perf_counter() - request_started, 0, 0
+        return time.perf_counter() - request_started, size, status
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            samples = list(pool.map(timed, range(requests)))
+            elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+    ok = [(latency, size, status) for latency, size, status in samples if status]
+    latencies, sizes, statuses = (list(column) for column in zip(*ok)) if ok else ([0.0], [0], [0])
+    entry = summarize(latencies, elapsed, sizes, statuses)
+    entry['rps'] = round(len(ok) / elapsed, 1) if elapsed else 0.0
+    entry['errors'] = len(samples) - len(ok)
+    return entry
+
+
+def metadata(**options):
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': revision,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'debug': settings.DEBUG,
+        **options,
+    }
+
+
+def result_key(entry):
+    return entry['mode'], entry['concurrency'], entry['url']
+
+
+def compare(baseline, current, metric='p95_ms', threshold=0.2, min_delta_ms=1.0):
+    """
+    Pages that got slower than `baseline` by more than `threshold` (a fraction).
+
+    Differences below `min_delta_ms` are ignored, so sub-millisecond pages
+    don't flag on timer noise. A page that used to answer 200 and no longer
+    does always counts as a regression.
+    """
+    previous = {result_key(entry): entry for entry in baseline['results']}
+    regressions = []
+    for entry in current['results']:
+        before = previous.get(result_key(entry))
+        if before is None:
+            continue
+        if before['status'] == 200 and entry['status'] != 200:
+            regressions.append((entry, before, f"status {before['status']} -> {entry['status']}"))
+            continue
+        old, new = before[metric], entry[metric]
+        if new - old >= min_delta_ms and old and (new - old) / old > threshold:
+            regressions.append((entry, before, f'{metric} {old:.2f} -> {new:.2f} ms (+{(new - old) / old:.0%})'))
+    return regressions
+
+
+def load(path):
+    return json.loads(Path(path).read_text())
+
+
+def save(path, report):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2) + '\n')
+
+
+def _format_entry(entry):
+    return (
+        f"  {entry['mode']:<8} c={entry['concurrency']:<3} {entry['url']:<40} {entry['status']} "
+        f"p50 {entry['p50_ms']:8.2f}  p95 {entry['p95_ms']:8.2f}  p99 {entry['p99_ms']:8.2f} ms  "
+        f"{entry['rps']:8.1f} req/s  {entry['bytes']:>8,} B"
+    )
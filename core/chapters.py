@@ -0,0 +1,297 @@
+"""
+Chapter text stored as paragraph blocks and saved as deltas.
+
+A chapter is an ordered list of blocks, one per paragraph, each with a key
+the client picks once and keeps (the editor's paragraph id), its text and a
+content hash. An autosave sends only the blocks that changed since the last
+one:
+
+    [{"op": "put", "id": "p41", "text": "..."},                  update p41
+     {"op": "put", "id": "p97", "after": "p41", "text": "..."},  new block after p41
+     {"op": "put", "id": "p12", "after": null, "text": "..."},   new block (or move) at the start
+     {"op": "delete", "id": "p50"}]
+
+A put without `after` updates the block, or appends it when it is new; with
+`after` it also moves the block. Operations apply in order, so `after` can
+name a block put earlier in the same delta. A put may carry the `hash` the
+client computed for its text (block_hash(): the first 16 hex digits of the
+text's SHA-256), which is checked. Comparing block hashes with
+GET /api/chapters/<id>/?manifest tells a client that lost track which
+blocks to resend.
+
+Saving touches only the rows of the blocks in the delta, so its cost
+depends on the size of the edit, not of the chapter. Each delta is kept in
+a revision log; every CHAPTER_SNAPSHOT_INTERVAL versions the log also gets
+a compressed snapshot of the whole chapter, so any logged version can be
+rebuilt from the nearest snapshot. Only the last CHAPTER_SNAPSHOTS_KEPT
+snapshots, and the deltas after the oldest of them, are kept.
+"""
+
+import hashlib
+import json
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from .models import Chapter, ChapterBlock, ChapterRevision
+
+# Closest two neighbouring positions may get before the chapter is renumbered
+MIN_POSITION_GAP = 1e-9
+
+MAX_KEY_LENGTH = 64
+
+
+class DeltaError(ValueError):
+    """A delta that is malformed or doesn't apply to the chapter"""
+
+
+class VersionConflict(Exception):
+    """The chapter isn't at the version the delta was made against"""
+
+    def __init__(self, chapter):
+        super().__init__(f'Chapter {chapter.pk} is at version {chapter.version}')
+        self.chapter = chapter
+
+
+def block_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def encode_snapshot(blocks):
+    """Compressed [[key, text], ...] for ChapterRevision.snapshot"""
+    return zlib.compress(json.dumps(blocks, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+
+
+def decode_snapshot(snapshot):
+    return json.loads(zlib.decompress(bytes(snapshot)))
+
+
+def validate_delta(operations):
+    """Raise DeltaError unless `operations` is a well-formed delta"""
+    if not isinstance(operations, list) or not operations:
+        raise DeltaError('A delta is a non-empty list of operations')
+    if len(operations) > settings.CHAPTER_MAX_OPERATIONS:
+        raise DeltaError(f'At most {settings.CHAPTER_MAX_OPERATIONS} operations per delta')
+    for number, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in ('put', 'delete'):
+            raise DeltaError(f'Operation {number}: op must be put or delete')
+        key = operation.get('id')
+        if not isinstance(key, str) or not 0 < len(key) <= MAX_KEY_LENGTH:
+            raise DeltaError(f'Operation {number}: id must be a string of 1 to {MAX_KEY_LENGTH} characters')
+        if operation['op'] == 'delete':
+            continue
+        text = operation.get('text')
+        if not isinstance(text, str):
+            raise DeltaError(f'Operation {number}: put needs the text')
+        if len(text) > settings.CHAPTER_BLOCK_MAX_CHARS:
+            raise DeltaError(f'Operation {number}: a block holds at most {settings.CHAPTER_BLOCK_MAX_CHARS} characters')
+        if 'hash' in operation and operation['hash'] != block_hash(text):
+            raise DeltaError(f'Operation {number}: hash does not match the text of {key}')
+        after = operation.get('after')
+        if after is not None and (not isinstance(after, str) or after == key):
+            raise DeltaError(f'Operation {number}: after must be the id of another block or null')
+
+
+def create_chapter(draft, title='', position=None):
+    """A new empty chapter at the end of `draft`, with the version 0 snapshot its log starts from"""
+    with transaction.atomic():
+        if position is None:
+            last = draft.chapters.aggregate(last=Max('position'))['last']
+            position = 0 if last is None else last + 1
+        chapter = Chapter.objects.create(draft=draft, title=title, position=position)
+        ChapterRevision.objects.create(chapter=chapter, version=0, snapshot=encode_snapshot([]))
+    return chapter
+
+
+class _Delta:
+    """Applies one delta to the blocks of a chapter, inside apply_delta's transaction"""
+
+    def __init__(self, chapter_id, operations):
+        self.chapter_id = chapter_id
+        self.operations = operations
+        self.blocks = ChapterBlock.objects.filter(chapter_id=chapter_id)
+        self.applied = []
+        self.hashes = {}
+        self.words = 0
+        self._load(self._referenced_keys())
+
+    def _referenced_keys(self):
+        keys = set()
+        for operation in self.operations:
+            keys.add(operation['id'])
+            if operation.get('after') is not None:
+                keys.add(operation['after'])
+        return keys
+
+    def _load(self, keys):
+        # Only the blocks the delta names are read: {key: [pk, position, hash, words]}
+        self.known = {
+            key: [pk, position, text_hash, words]
+            for pk, key, position, text_hash, words in self.blocks.filter(key__in=keys).values_list(
+                'pk', 'key', 'position', 'hash', 'words',
+            )
+        }
+
+    def _renumber(self):
+        """Spread the positions out again once inserts have run out of room between two blocks"""
+        blocks = list(self.blocks.order_by('position').only('pk', 'position'))
+        for index, block in enumerate(blocks):
+            block.position = float(index)
+        ChapterBlock.objects.bulk_update(blocks, ['position'], batch_size=500)
+        self._load(self.known.keys())
+
+    def _position(self, number, key, after):
+        """Position for `key` placed after the block `after` (None: first)"""
+        others = self.blocks.exclude(key=key)
+        if after is None:
+            first = others.aggregate(first=Min('position'))['first']
+            return 0.0 if first is None else first - 1.0
+        if after not in self.known:
+            raise DeltaError(f'Operation {number}: no block {after} to put {key} after')
+        previous = self.known[after][1]
+        following = others.filter(position__gt=previous).aggregate(following=Min('position'))['following']
+        if following is None:
+            return previous + 1.0
+        if following - previous < MIN_POSITION_GAP:
+            self._renumber()
+            return self._position(number, key, after)
+        return (previous + following) / 2
+
+    def _append_position(self):
+        last = self.blocks.aggregate(last=Max('position'))['last']
+        return 0.0 if last is None else last + 1.0
+
+    def apply(self):
+        for number, operation in enumerate(self.operations):
+            key = operation['id']
+            if operation['op'] == 'delete':
+                if key not in self.known:
+                    raise DeltaError(f'Operation {number}: no block {key} to delete')
+                pk, position, text_hash, words = self.known.pop(key)
+                ChapterBlock.objects.filter(pk=pk).delete()
+                self.words -= words
+                self.hashes.pop(key, None)
+                self.applied.append({'op': 'delete', 'id': key})
+                continue
+
+            text = operation['text']
+            text_hash, words = block_hash(text), count_words(text)
+            moving = 'after' in operation
+            logged = {'op': 'put', 'id': key, 'text': text}
+            if moving:
+                logged['after'] = operation['after']
+
+            if key in self.known:
+                pk, position, old_hash, old_words = self.known[key]
+                if old_hash == text_hash and not moving:
+                    continue
+                fields = {'text': text, 'hash': text_hash, 'words': words}
+                if moving:
+                    fields['position'] = position = self._position(number, key, operation['after'])
+                ChapterBlock.objects.filter(pk=pk).update(**fields)
+                self.words += words - old_words
+            else:
+                position = self._position(number, key, operation['after']) if moving else self._append_position()
+                pk = ChapterBlock.objects.create(
+                    chapter_id=self.chapter_id, key=key, position=position, text=text, hash=text_hash, words=words,
+                ).pk
+                self.words += words
+            self.known[key] = [pk, position, text_hash, words]
+            self.hashes[key] = text_hash
+            self.applied.append(logged)
+
+
+def apply_delta(chapter, base_version, operations):
+    """
+    Apply a validated delta made against `base_version` of `chapter`.
+
+    Returns {block key: hash} for the blocks it put. A delta that changes
+    nothing leaves the chapter and its version alone. Raises VersionConflict
+    if the chapter has moved on from `base_version` (the chapter it carries
+    is up to date) and DeltaError if an operation doesn't apply; either way
+    nothing is saved.
+    """
+    with transaction.atomic():
+        # Claims the next version first: concurrent deltas against the same
+        # version can't both get past this point
+        claimed = Chapter.objects.filter(pk=chapter.pk, version=base_version).update(
+            version=F('version') + 1, updated_at=timezone.now(),
+        )
+        if not claimed:
+            raise VersionConflict(Chapter.objects.get(pk=chapter.pk))
+
+        delta = _Delta(chapter.pk, operations)
+        delta.apply()
+        if not delta.applied:
+            transaction.set_rollback(True)
+            return delta.hashes
+
+        version = base_version + 1
+        if delta.words:
+            Chapter.objects.filter(pk=chapter.pk).update(words=F('words') + delta.words)
+        snapshot = None
+        if version % settings.CHAPTER_SNAPSHOT_INTERVAL == 0:
+            snapshot = encode_snapshot([list(block) for block in chapter_blocks(chapter.pk)])
+        ChapterRevision.objects.create(chapter_id=chapter.pk, version=version, delta=delta.applied, snapshot=snapshot)
+        if snapshot is not None:
+            _prune(chapter.pk)
+
+    chapter.version = version
+    chapter.words += delta.words
+    return delta.hashes
+
+
+def _prune(chapter_id):
+    """Drop the log before the oldest snapshot worth keeping"""
+    snapshots = ChapterRevision.objects.filter(chapter_id=chapter_id, snapshot__isnull=False).order_by('-version')
+    oldest_kept = snapshots.values_list('version', flat=True)[settings.CHAPTER_SNAPSHOTS_KEPT - 1:settings.CHAPTER_SNAPSHOTS_KEPT]
+    if oldest_kept:
+        ChapterRevision.objects.filter(chapter_id=chapter_id, version__lt=oldest_kept[0]).delete()
+
+
+def chapter_blocks(chapter_id):
+    """(key, text) of every block, in order"""
+    return ChapterBlock.objects.filter(chapter_id=chapter_id).order_by('position').values_list('key', 'text')
+
+
+def replay(blocks, delta):
+    """[[key, text], ...] after applying a logged delta to `blocks` (left as they were)"""
+    blocks = [list(block) for block in blocks]
+    for operation in delta:
+        index = next((i for i, block in enumerate(blocks) if block[0] == operation['id']), None)
+        if operation['op'] == 'delete':
+            del blocks[index]
+            continue
+        if index is not None and 'after' not in operation:
+            blocks[index][1] = operation['text']
+            continue
+        if index is not None:
+            del blocks[index]
+        if 'after' not in operation:
+            blocks.append([operation['id'], operation['text']])
+        else:
+            after = operation['after']
+            at = 0 if after is None else next(i for i, block in enumerate(blocks) if block[0] == after) + 1
+            blocks.insert(at, [operation['id'], operation['text']])
+    return blocks
+
+
+def chapter_at(chapter, version):
+    """[[key, text], ...] of `chapter` as of `version`, or None if that version is no longer (or not yet) logged"""
+    if version > chapter.version:
+        return None
+    revisions = ChapterRevision.objects.filter(chapter_id=chapter.pk)
+    base = revisions.filter(version__lte=version, snapshot__isnull=False).order_by('-version').first()
+    if base is None:
+        return None
+    blocks = decode_snapshot(base.snapshot)
+    for delta in revisions.filter(version__gt=base.version, version__lte=version).values_list('delta', flat=True):
+        blocks = replay(blocks, delta)
+    return blocks
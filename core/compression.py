@@ -0,0 +1,86 @@
+import gzip
+import re
+import struct
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+# Header of a gzip member with mtime=0, no file name and OS "unknown"
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+# Elements whose content is left byte-for-byte alone, HTML comments (except
+# IE conditional comments), tags (quoted attribute values may contain ">"),
+# and the text in between
+HTML_TOKEN_RE = re.compile(
+    r"""(<(pre|textarea|script|style)\b(?:"[^"]*"|'[^']*'|[^'">])*>.*?</\2\s*>)"""
+    r"""|(<!--(?!\[if).*?-->)"""
+    r"""|(<[a-zA-Z/!](?:"[^"]*"|'[^']*'|[^'">])*>)"""
+    r"""|([^<]+|<)""",
+    re.S | re.I,
+)
+TAG_WHITESPACE_RE = re.compile(r"""("[^"]*"|'[^']*')|\s+""")
+TEXT_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def gzip_compress(data, level=9):
+    # mtime=0 keeps the output byte-for-byte reproducible between builds
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def brotli_compress(data, quality=11):
+    """Return brotli-compressed data, or None when the brotli module is not installed"""
+    if brotli is None:
+        return None
+    return brotli.compress(data, quality=quality, mode=brotli.MODE_TEXT)
+
+
+def deflate_segment(data, level=9, final=False):
+    """
+    Raw deflate blocks for one piece of a gzip body, see gzip_join().
+
+    The segment is compressed on its own and ends byte-aligned, so segments
+    produced independently can be laid end to end; only the last one may be
+    `final`.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_FULL_FLUSH)
+
+
+def gzip_join(segments, data):
+    """Wrap deflate segments whose concatenated input is `data` into one gzip member"""
+    trailer = struct.pack('<II', zlib.crc32(data), len(data) & 0xffffffff)
+    return b''.join([GZIP_HEADER, *segments, trailer])
+
+
+def _collapse_tag(tag):
+    tag = TAG_WHITESPACE_RE.sub(lambda m: m.group(1) or ' ', tag)
+    return tag.replace(' >', '>')
+
+
+def _collapse_text(text):
+    return TEXT_WHITESPACE_RE.sub(lambda m: '\n' if '\n' in m.group(0) else ' ', text)
+
+
+def minify_html(html):
+    """
+    Conservative HTML minifier.
+
+    Runs of whitespace shrink to a single space (or newline) instead of being
+    removed, so inline layout can't change; comments are dropped; <pre>,
+    <textarea>, <script> and <style> are copied unchanged.
+    """
+    out = []
+    for match in HTML_TOKEN_RE.finditer(html):
+        raw, _, comment, tag, text = match.groups()
+        if raw is not None:
+            out.append(raw)
+        elif comment is not None:
+            continue
+        elif tag is not None:
+            out.append(_collapse_tag(tag))
+        else:
+            out.append(_collapse_text(text))
+    return ''.join(out)
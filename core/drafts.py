@@ -0,0 +1,182 @@
+"""
+Wizard draft documents and the JSON Patch (RFC 6902) updates applied to them.
+
+Autosave sends only what changed since the last save, as a list of patch
+operations against the stored document:
+
+    [{"op": "replace", "path": "/new-project/title", "value": "The Warden"},
+     {"op": "add", "path": "/new-project/influences/-", "value": "Le Guin"}]
+
+Operations are applied in order to a copy of the document, and either all
+of them apply or none do.
+"""
+
+import copy
+import json
+
+from django.conf import settings
+
+from .routes import NEW_PROJECT_STEPS
+
+# Top-level keys of a draft document, one per wizard step
+SECTIONS = tuple(NEW_PROJECT_STEPS.values())
+
+OPERATIONS = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+
+
+class PatchError(ValueError):
+    """A patch that is malformed or doesn't apply to the document"""
+
+
+class PatchConflict(PatchError):
+    """A `test` operation failed: the document isn't in the state the client assumed"""
+
+
+def parse_pointer(pointer):
+    """The reference tokens of a JSON Pointer (RFC 6901)"""
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith('/')):
+        raise PatchError(f'Invalid JSON pointer: {pointer!r}')
+    if not pointer:
+        return []
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _index(container, token, pointer, appending=False):
+    if appending and token == '-':
+        return len(container)
+    if not (token.isascii() and token.isdigit()) or (token != '0' and token.startswith('0')):
+        raise PatchError(f'{pointer}: {token!r} is not an array index')
+    index = int(token)
+    if index > len(container) or (index == len(container) and not appending):
+        raise PatchError(f'{pointer}: index {index} is out of range')
+    return index
+
+
+def _parent(document, tokens, pointer):
+    """The container holding the value at `tokens`"""
+    target = document
+    for token in tokens[:-1]:
+        if isinstance(target, dict):
+            if token not in target:
+                raise PatchError(f'{pointer}: {token!r} does not exist')
+            target = target[token]
+        elif isinstance(target, list):
+            target = target[_index(target, token, pointer)]
+        else:
+            raise PatchError(f'{pointer}: {token!r} is not inside an object or array')
+    if not isinstance(target, (dict, list)):
+        raise PatchError(f'{pointer}: parent is not an object or array')
+    return target
+
+
+def json_equal(a, b):
+    """
+    Whether two JSON values are equal as JSON: unlike ==, true is not 1 and 1 is not 1.0
+
+    Objects compare by their members, in any order, and arrays item by item.
+    """
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(json_equal(value, b[key]) for key, value in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(json_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _get(document, pointer):
+    target = document
+    for token in parse_pointer(pointer):
+        if isinstance(target, dict):
+            if token not in target:
+                raise PatchError(f'{pointer}: {token!r} does not exist')
+            target = target[token]
+        elif isinstance(target, list):
+            target = target[_index(target, token, pointer)]
+        else:
+            raise PatchError(f'{pointer}: {token!r} is not inside an object or array')
+    return target
+
+
+def _add(document, pointer, value):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        return value
+    parent = _parent(document, tokens, pointer)
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    else:
+        parent.insert(_index(parent, tokens[-1], pointer, appending=True), value)
+    return document
+
+
+def _remove(document, pointer):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise PatchError('The whole document cannot be removed')
+    parent = _parent(document, tokens, pointer)
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise PatchError(f'{pointer}: {tokens[-1]!r} does not exist')
+        return parent.pop(tokens[-1])
+    return parent.pop(_index(parent, tokens[-1], pointer))
+
+
+def apply_patch(document, operations):
+    """
+    `document` with the patch `operations` applied; `document` itself is left as it was.
+
+    Raises PatchError if an operation is malformed or doesn't apply, and
+    PatchConflict if a `test` operation fails.
+    """
+    if not isinstance(operations, list):
+        raise PatchError('A patch is a list of operations')
+    document = copy.deepcopy(document)
+    for number, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise PatchError(f'Operation {number}: op must be one of {", ".join(OPERATIONS)}')
+        op, path = operation['op'], operation.get('path')
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise PatchError(f'Operation {number}: {op} needs a value')
+        if op in ('move', 'copy') and 'from' not in operation:
+            raise PatchError(f'Operation {number}: {op} needs from')
+
+        if op == 'add':
+            document = _add(document, path, copy.deepcopy(operation['value']))
+        elif op == 'remove':
+            _remove(document, path)
+        elif op == 'replace':
+            if parse_pointer(path):
+                _remove(document, path)
+            document = _add(document, path, copy.deepcopy(operation['value']))
+        elif op == 'move':
+            source = operation['from']
+            source_tokens, path_tokens = parse_pointer(source), parse_pointer(path)
+            if len(path_tokens) > len(source_tokens) and path_tokens[:len(source_tokens)] == source_tokens:
+                raise PatchError(f'Operation {number}: cannot move {source} into itself')
+            document = _add(document, path, _remove(document, source))
+        elif op == 'copy':
+            document = _add(document, path, copy.deepcopy(_get(document, operation['from'])))
+        elif not json_equal(_get(document, path), operation['value']):
+            raise PatchConflict(f'Operation {number}: {path} does not have the tested value')
+    return document
+
+
+def encode(document):
+    """Compact JSON for a draft document, as stored and sent"""
+    return json.dumps(document, separators=(',', ':'), ensure_ascii=False)
+
+
+def validate_document(document):
+    """Raise PatchError unless `document` is a valid draft document"""
+    if not isinstance(document, dict):
+        raise PatchError('A draft is a JSON object')
+    unknown = document.keys() - set(SECTIONS)
+    if unknown:
+        raise PatchError(f"Unknown sections: {', '.join(sorted(unknown))} (expected {', '.join(SECTIONS)})")
+    for section, value in document.items():
+        if not isinstance(value, dict):
+            raise PatchError(f'{section} must be an object')
+    size = len(encode(document).encode('utf-8'))
+    if size > settings.DRAFT_MAX_BYTES:
+        raise PatchError(f'Draft is {size} bytes, the limit is {settings.DRAFT_MAX_BYTES}')
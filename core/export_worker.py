@@ -0,0 +1,18 @@
+"""
+Entry points of the export process pool (core.exports).
+
+Pool processes are spawned and unpickle these before Django is set up, so
+this module mustn't import models at import time.
+"""
+
+
+def setup():
+    import django
+
+    django.setup()
+
+
+def run(job_id):
+    from .exports import run_job
+
+    run_job(job_id)
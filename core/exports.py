@@ -0,0 +1,526 @@
+"""
+Book export: EPUB, Word (DOCX) and Markdown, built one chapter at a time.
+
+export_book() is a generator of output bytes. It reads a chapter's
+paragraphs (core.chapters), renders them, hands the result on and moves to
+the next chapter, so at most one chapter is in memory whatever the length
+of the book. EPUB and DOCX are zip archives; ZipStream writes them front to
+back (local headers before their data, central directory last) so they can
+be sent while they are built.
+
+Each rendered chapter is cached on disk under a hash of what it is made of
+(format, chapter title and the content hashes of its paragraphs), already
+deflated for the archives. Re-exporting after an edit only renders and
+compresses the chapters that changed; the rest are copied from the cache.
+Deflated chapters end on a full flush, so they can be concatenated into
+one zip entry (DOCX keeps the whole text in word/document.xml).
+
+Large books are exported by a job (ExportJob) run in a process pool, which
+writes the file under EXPORT_ROOT/jobs for the client to download once
+the job is done.
+"""
+
+import hashlib
+import html
+import logging
+import multiprocessing
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.text import slugify
+
+from . import export_worker
+from .models import ChapterBlock, ExportJob
+
+logger = logging.getLogger(__name__)
+
+ExportFormat = namedtuple('ExportFormat', ['content_type', 'extension'])
+
+FORMATS = {
+    'epub': ExportFormat('application/epub+zip', 'epub'),
+    'docx': ExportFormat('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'docx'),
+    'md': ExportFormat('text/markdown; charset=utf-8', 'md'),
+}
+
+# Part of every cache key; bump when the output of a renderer changes
+RENDERER_VERSION = 1
+
+# Deflated data for `size` bytes whose CRC-32 is `crc`, or the bytes themselves (stored)
+Piece = namedtuple('Piece', ['crc', 'size', 'data'])
+
+# Ends a deflate stream made of full-flushed pieces
+DEFLATE_END = b'\x03\x00'
+
+
+def deflate(raw):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return Piece(zlib.crc32(raw), len(raw), compressor.compress(raw) + compressor.flush(zlib.Z_FULL_FLUSH))
+
+
+def stored(raw):
+    return Piece(zlib.crc32(raw), len(raw), raw)
+
+
+def crc32_combine(crc1, crc2, length2):
+    """CRC-32 of A + B from the CRC-32s of A and B and the length of B"""
+    zeros = bytes(length2)
+    return zlib.crc32(zeros, crc1) ^ zlib.crc32(zeros) ^ crc2
+
+
+def _dos_time(moment):
+    return (
+        (moment.hour << 11) | (moment.minute << 5) | (moment.second // 2),
+        ((moment.year - 1980) << 9) | (moment.month << 5) | moment.day,
+    )
+
+
+class ZipStream:
+    """
+    A zip archive written front to back; every method returns (or yields) the next bytes of it.
+
+    Entries added whole carry their sizes in the local header. Entries
+    added piece by piece (add_pieces) can't, so they are followed by a data
+    descriptor instead.
+    """
+
+    STORED, DEFLATED = 0, 8
+    DATA_DESCRIPTOR = 0x08
+    UTF8 = 0x800
+
+    def __init__(self):
+        self.offset = 0
+        self.entries = []
+        self.time, self.date = _dos_time(datetime.now())
+
+    def _emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def _local_header(self, name, method, flags, crc, compressed_size, size):
+        return struct.pack(
+            '<IHHHHHIIIHH', 0x04034B50, 20, flags, method, self.time, self.date,
+            crc, compressed_size, size, len(name), 0,
+        ) + name
+
+    def add(self, name, piece, compress=True):
+        """The entry `name` holding `piece` (deflated unless `compress` is false)"""
+        name = name.encode('utf-8')
+        method = self.DEFLATED if compress else self.STORED
+        data = piece.data + DEFLATE_END if compress else piece.data
+        self.entries.append((name, method, self.UTF8, piece.crc, len(data), piece.size, self.offset))
+        return self._emit(self._local_header(name, method, self.UTF8, piece.crc, len(data), piece.size) + data)
+
+    def add_pieces(self, name, pieces):
+        """Yield the entry `name` made of the deflated `pieces`, in order"""
+        name = name.encode('utf-8')
+        flags = self.UTF8 | self.DATA_DESCRIPTOR
+        offset = self.offset
+        yield self._emit(self._local_header(name, self.DEFLATED, flags, 0, 0, 0))
+        crc = size = compressed_size = 0
+        for piece in pieces:
+            crc = crc32_combine(crc, piece.crc, piece.size)
+            size += piece.size
+            compressed_size += len(piece.data)
+            yield self._emit(piece.data)
+        compressed_size += len(DEFLATE_END)
+        yield self._emit(DEFLATE_END + struct.pack('<IIII', 0x08074B50, crc, compressed_size, size))
+        self.entries.append((name, self.DEFLATED, flags, crc, compressed_size, size, offset))
+
+    def close(self):
+        """The central directory"""
+        start = self.offset
+        directory = b''.join(
+            struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014B50, 20, 20, flags, method, self.time, self.date,
+                crc, compressed_size, size, len(name), 0, 0, 0, 0, 0, offset,
+            ) + name
+            for name, method, flags, crc, compressed_size, size, offset in self.entries
+        )
+        end = struct.pack('<IHHHHIIH', 0x06054B50, 0, 0, len(self.entries), len(self.entries), len(directory), start, 0)
+        return self._emit(directory + end)
+
+
+class ExportCache:
+    """Rendered chapters on disk, by content hash; least recently used ones go first past `max_bytes`"""
+
+    HEADER = struct.Struct('<II')
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return self.directory / key[:2] / key
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        crc, size = self.HEADER.unpack_from(data)
+        return Piece(crc, size, data[self.HEADER.size:])
+
+    def put(self, key, piece):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A name of its own: other threads and processes may be writing the same chapter
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'{key}.', suffix='.tmp', delete=False) as temporary:
+            temporary.write(self.HEADER.pack(piece.crc, piece.size) + piece.data)
+        os.replace(temporary.name, path)
+
+    def prune(self):
+        if not self.directory.exists():
+            return
+        files = [(path.stat(), path) for path in self.directory.glob('*/*') if not path.name.endswith('.tmp')]
+        total = sum(stat.st_size for stat, path in files)
+        for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+
+
+def get_export_cache():
+    return ExportCache(settings.EXPORT_ROOT / 'cache', settings.EXPORT_CACHE_MAX_BYTES)
+
+
+def _markdown_paragraph(text):
+    # Keep paragraphs from turning into headings, quotes or lists
+    if text[:1] and text[:1] in '#>-+*':
+        return '\\' + text
+    number, dot, rest = text.partition('.')
+    if dot and number.isdigit():
+        return f'{number}\\.{rest}'
+    return text
+
+
+def markdown_chapter(title, paragraphs, first):
+    parts = [f'## {title}'] + [_markdown_paragraph(text) for text in paragraphs]
+    return ('\n\n'.join(parts) + '\n\n').encode('utf-8')
+
+
+def epub_chapter(title, paragraphs, first):
+    body = ''.join(f'<p>{html.escape(text)}</p>\n' for text in paragraphs)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">\n'
+        f'<head><title>{html.escape(title)}</title></head>\n'
+        f'<body>\n<section epub:type="chapter">\n<h1>{html.escape(title)}</h1>\n{body}</section>\n</body>\n</html>\n'
+    ).encode('utf-8')
+
+
+def _docx_paragraph(text, style=None, page_break=False):
+    properties = ''
+    if style or page_break:
+        properties = '<w:pPr>{}{}</w:pPr>'.format(
+            f'<w:pStyle w:val="{style}"/>' if style else '', '<w:pageBreakBefore/>' if page_break else '',
+        )
+    return f'<w:p>{properties}<w:r><w:t xml:space="preserve">{html.escape(text, quote=False)}</w:t></w:r></w:p>'
+
+
+def docx_chapter(title, paragraphs, first):
+    parts = [_docx_paragraph(title, 'Heading1', page_break=not first)]
+    parts += [_docx_paragraph(text) for text in paragraphs]
+    return ''.join(parts).encode('utf-8')
+
+
+RENDERERS = {'md': markdown_chapter, 'epub': epub_chapter, 'docx': docx_chapter}
+
+
+class Book:
+    """What an export needs to know about a draft before reading any chapter text"""
+
+    def __init__(self, draft):
+        self.draft = draft
+        # Drafts are free-form JSON: the title may be any value
+        self.title = str((draft.data.get('new-project') or {}).get('title') or 'Untitled')
+        self.author = draft.owner.get_full_name() or draft.owner.get_username()
+        self.identifier = f'urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, f"penwise:draft:{draft.pk}")}'
+        self.chapters = [
+            (pk, title or f'Chapter {number}')
+            for number, (pk, title) in enumerate(draft.chapters.values_list('id', 'title'), 1)
+        ]
+
+    @property
+    def filename(self):
+        return slugify(self.title) or 'book'
+
+    def paragraphs(self, chapter_id):
+        blocks = ChapterBlock.objects.filter(chapter_id=chapter_id).order_by('position')
+        return blocks.values_list('text', flat=True).iterator(chunk_size=500)
+
+    def content_key(self, book_format, chapter_id, title, first):
+        """Cache key for a rendered chapter: changes exactly when its output would"""
+        digest = hashlib.sha256(f'{RENDERER_VERSION}:{book_format}:{first}:{title}\0'.encode('utf-8'))
+        blocks = ChapterBlock.objects.filter(chapter_id=chapter_id).order_by('position')
+        for block_hash in blocks.values_list('hash', flat=True).iterator(chunk_size=2000):
+            digest.update(block_hash.encode('ascii'))
+        return digest.hexdigest()
+
+
+def rendered_chapters(book, book_format, cache, progress=None):
+    """Yield a Piece per chapter (deflated for the archives), from the cache when possible"""
+    render = RENDERERS[book_format]
+    pack = stored if book_format == 'md' else deflate
+    for number, (chapter_id, title) in enumerate(book.chapters):
+        key = book.content_key(book_format, chapter_id, title, number == 0)
+        piece = cache.get(key)
+        if piece is None:
+            piece = pack(render(title, book.paragraphs(chapter_id), number == 0))
+            cache.put(key, piece)
+        yield piece
+        if progress:
+            progress(number + 1)
+
+
+def _xml(text):
+    return html.escape(text, quote=True)
+
+
+def export_markdown(book, cache, progress):
+    yield f'# {book.title}\n\n*{book.author}*\n\n'.encode('utf-8')
+    for piece in rendered_chapters(book, 'md', cache, progress):
+        yield piece.data
+
+
+def export_epub(book, cache, progress):
+    archive = ZipStream()
+    # The mimetype entry has to come first, uncompressed
+    yield archive.add('mimetype', stored(b'application/epub+zip'), compress=False)
+    yield archive.add('META-INF/container.xml', deflate(
+        b'<?xml version="1.0" encoding="utf-8"?>\n'
+        b'<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+        b'<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>\n'
+        b'</container>\n'
+    ))
+    for number, piece in enumerate(rendered_chapters(book, 'epub', cache, progress), 1):
+        yield archive.add(f'OEBPS/chapter-{number:03d}.xhtml', piece)
+
+    items = [f'chapter-{number:03d}' for number in range(1, len(book.chapters) + 1)]
+    toc = ''.join(
+        f'<li><a href="{item}.xhtml">{_xml(title)}</a></li>\n'
+        for item, (chapter_id, title) in zip(items, book.chapters)
+    )
+    yield archive.add('OEBPS/nav.xhtml', deflate((
+        '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">\n'
+        f'<head><title>{_xml(book.title)}</title></head>\n'
+        f'<body>\n<nav epub:type="toc" id="toc"><h1>{_xml(book.title)}</h1>\n<ol>\n{toc}</ol></nav>\n</body>\n</html>\n'
+    ).encode('utf-8')))
+    manifest = ''.join(f'<item id="{item}" href="{item}.xhtml" media-type="application/xhtml+xml"/>\n' for item in items)
+    spine = ''.join(f'<itemref idref="{item}"/>\n' for item in items)
+    modified = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    yield archive.add('OEBPS/content.opf', deflate((
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">\n'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+        f'<dc:identifier id="book-id">{book.identifier}</dc:identifier>\n'
+        f'<dc:title>{_xml(book.title)}</dc:title>\n<dc:creator>{_xml(book.author)}</dc:creator>\n'
+        f'<dc:language>en</dc:language>\n<meta property="dcterms:modified">{modified}</meta>\n'
+        '</metadata>\n'
+        f'<manifest>\n<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>\n{manifest}</manifest>\n'
+        f'<spine>\n{spine}</spine>\n</package>\n'
+    ).encode('utf-8')))
+    yield archive.close()
+
+
+DOCX_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+DOCX_RELATIONSHIPS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+DOCX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<w:styles xmlns:w="{DOCX_NAMESPACE}">'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/>'
+    '<w:pPr><w:spacing w:after="160" w:line="360" w:lineRule="auto"/></w:pPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Title"><w:name w:val="Title"/><w:basedOn w:val="Normal"/>'
+    '<w:pPr><w:jc w:val="center"/></w:pPr><w:rPr><w:b/><w:sz w:val="56"/></w:rPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/><w:basedOn w:val="Normal"/>'
+    '<w:pPr><w:keepNext/><w:spacing w:before="480" w:after="240"/><w:outlineLvl w:val="0"/></w:pPr>'
+    '<w:rPr><w:b/><w:sz w:val="36"/></w:rPr></w:style>'
+    '</w:styles>\n'
+).encode('utf-8')
+
+
+def export_docx(book, cache, progress):
+    archive = ZipStream()
+    yield archive.add('[Content_Types].xml', deflate((
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '<Override PartName="/word/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+        '<Override PartName="/docProps/core.xml" ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>'
+        '</Types>\n'
+    ).encode('utf-8')))
+    yield archive.add('_rels/.rels', deflate((
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{DOCX_RELATIONSHIPS}/officeDocument" Target="word/document.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" '
+        'Target="docProps/core.xml"/>'
+        '</Relationships>\n'
+    ).encode('utf-8')))
+    yield archive.add('docProps/core.xml', deflate((
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        f'<dc:title>{_xml(book.title)}</dc:title><dc:creator>{_xml(book.author)}</dc:creator>'
+        '</cp:coreProperties>\n'
+    ).encode('utf-8')))
+    yield archive.add('word/_rels/document.xml.rels', deflate((
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{DOCX_RELATIONSHIPS}/styles" Target="styles.xml"/>'
+        '</Relationships>\n'
+    ).encode('utf-8')))
+    yield archive.add('word/styles.xml', deflate(DOCX_STYLES))
+
+    def document():
+        yield deflate((
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<w:document xmlns:w="{DOCX_NAMESPACE}"><w:body>' + _docx_paragraph(book.title, 'Title')
+        ).encode('utf-8'))
+        yield from rendered_chapters(book, 'docx', cache, progress)
+        yield deflate(b'<w:sectPr/></w:body></w:document>\n')
+
+    yield from archive.add_pieces('word/document.xml', document())
+    yield archive.close()
+
+
+EXPORTERS = {'md': export_markdown, 'epub': export_epub, 'docx': export_docx}
+
+
+def export_book(book, book_format, progress=None):
+    """Yield the bytes of `book` exported as `book_format` (a FORMATS key)"""
+    cache = get_export_cache()
+    yield from EXPORTERS[book_format](book, cache, progress)
+    cache.prune()
+
+
+async def aiter_chunks(chunks):
+    """
+    An async iterator over the sync iterator `chunks`, each chunk produced in a worker thread.
+
+    Under ASGI Django reads a sync streaming body with sync_to_async(list),
+    i.e. the whole export in memory before the first byte goes out; this
+    keeps it to one chunk at a time.
+    """
+    chunks = iter(chunks)
+    done = object()
+    try:
+        while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            await sync_to_async(chunks.close)()
+
+
+def job_path(job):
+    return settings.EXPORT_ROOT / 'jobs' / f'{job.pk}.{FORMATS[job.format].extension}'
+
+
+def run_job(job_id):
+    """Run an ExportJob to completion; runs in the export process pool"""
+    close_old_connections()
+    job = ExportJob.objects.select_related('draft__owner').get(pk=job_id)
+    book = Book(job.draft)
+    ExportJob.objects.filter(pk=job_id).update(status=ExportJob.RUNNING, chapters_total=len(book.chapters))
+
+    def progress(done):
+        ExportJob.objects.filter(pk=job_id).update(chapters_done=done)
+
+    path = job_path(job)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix('.part')
+    started = time.perf_counter()
+    try:
+        with open(partial, 'wb') as output:
+            for chunk in export_book(book, job.format, progress):
+                output.write(chunk)
+        os.replace(partial, path)
+    except Exception as exc:
+        logger.exception('Export job %s failed', job_id)
+        partial.unlink(missing_ok=True)
+        ExportJob.objects.filter(pk=job_id).update(
+            status=ExportJob.FAILED, error=str(exc)[:500], finished_at=datetime.now(timezone.utc),
+        )
+        return
+    ExportJob.objects.filter(pk=job_id).update(
+        status=ExportJob.DONE, size=path.stat().st_size, finished_at=datetime.now(timezone.utc),
+    )
+    logger.info('Export job %s: %s, %d bytes in %.2fs', job_id, job.format, path.stat().st_size, time.perf_counter() - started)
+    prune_jobs()
+
+
+def prune_jobs():
+    """Delete exported files older than EXPORT_RETENTION_SECONDS"""
+    cutoff = time.time() - settings.EXPORT_RETENTION_SECONDS
+    for path in (settings.EXPORT_ROOT / 'jobs').glob('*'):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The export process pool, started on first use (spawned, so it shares no connections with the server)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.EXPORT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=export_worker.setup,
+            )
+        return _pool
+
+
+def _submit(job_id):
+    global _pool
+    try:
+        future = get_pool().submit(export_worker.run, job_id)
+    except BrokenProcessPool:
+        # A pool process died (killed, out of memory); start a new pool
+        with _pool_lock:
+            _pool = None
+        future = get_pool().submit(export_worker.run, job_id)
+
+    def done(future):
+        if future.exception() is not None:
+            logger.error('Export job %s failed: %r', job_id, future.exception())
+            ExportJob.objects.filter(pk=job_id).exclude(status=ExportJob.DONE).update(
+                status=ExportJob.FAILED, error=repr(future.exception())[:500], finished_at=datetime.now(timezone.utc),
+            )
+
+    future.add_done_callback(done)
+
+
+def start_job(draft, book_format):
+    """A new ExportJob for `draft`, queued on the process pool once the transaction commits"""
+    job = ExportJob.objects.create(owner=draft.owner, draft=draft, format=book_format)
+    transaction.on_commit(lambda: _submit(job.pk))
+    return job
@@ -0,0 +1,135 @@
+import itertools
+import logging
+import threading
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .routes import DASHBOARD_PAGES, NEW_PROJECT_STEPS
+from .template_files import TemplateWatcher
+from .template_graph import get_template_graph
+
+logger = logging.getLogger(__name__)
+
+# Includes served by {% cached_include %}: for each, the context variables its
+# output depends on and the values they take across the site, so every
+# variant can be rendered ahead of time. A fragment must not use anything
+# else from the context (request, user, csrf_token, ...).
+FRAGMENTS = {
+    'includes/navbar.html': {},
+    'includes/mobile_menu.html': {},
+    'includes/footer.html': {},
+    'includes/dashboard_header.html': {},
+    'includes/dashboard_sidebar.html': {
+        'active_page': sorted(set(DASHBOARD_PAGES.values()) | {''}),
+    },
+    'includes/new_project_progress.html': {
+        'current_step': list(NEW_PROJECT_STEPS),
+        'total_steps': [len(NEW_PROJECT_STEPS)],
+    },
+}
+
+
+class FragmentCache:
+    """
+    Rendered variants of the FRAGMENTS includes, keyed on their variables.
+
+    precompute() renders every known variant (warm-up does this before
+    gunicorn forks, so workers share them). Any other combination is
+    rendered on first use and kept, up to `max_variants` per fragment;
+    past that it is rendered every time and counted as an overflow, so a
+    variable with unexpected values can't grow the cache without bound.
+    Fragments affected by a template edit are dropped and re-rendered on
+    their next use.
+    """
+
+    def __init__(self, fragments, max_variants=64, check_interval=1.0):
+        self.fragments = fragments
+        self.max_variants = max_variants
+        self.hits = dict.fromkeys(fragments, 0)
+        self.misses = dict.fromkeys(fragments, 0)
+        self.overflows = dict.fromkeys(fragments, 0)
+        self._variants = {name: {} for name in fragments}
+        self._lock = threading.Lock()
+        self._watcher = TemplateWatcher(check_interval)
+
+    def __len__(self):
+        return sum(len(variants) for variants in self._variants.values())
+
+    def clear(self):
+        with self._lock:
+            for variants in self._variants.values():
+                variants.clear()
+
+    def invalidate(self, changed):
+        """Drop the fragments rendered from any of the `changed` templates"""
+        affected = get_template_graph().affected(changed)
+        with self._lock:
+            for name in affected & self._variants.keys():
+                self._variants[name].clear()
+
+    def _render(self, name, key):
+        return mark_safe(render_to_string(name, dict(zip(self.fragments[name], key))))
+
+    def render(self, name, values):
+        """The fragment `name` for the variable `values` ({name: value}), from the cache when possible"""
+        changed = self._watcher.changes()
+        if changed:
+            self.invalidate(changed)
+
+        key = tuple(values.get(variable) for variable in self.fragments[name])
+        variants = self._variants[name]
+        try:
+            html = variants.get(key)
+        except TypeError:
+            # An unhashable value; correct, just not cacheable
+            self.misses[name] += 1
+            return self._render(name, key)
+        if html is not None:
+            self.hits[name] += 1
+            return html
+
+        self.misses[name] += 1
+        html = self._render(name, key)
+        with self._lock:
+            if len(variants) < self.max_variants:
+                variants[key] = html
+            else:
+                if not self.overflows[name]:
+                    logger.warning(
+                        '%s has more than %d variants; rendering the rest uncached', name, self.max_variants,
+                    )
+                self.overflows[name] += 1
+        return html
+
+    def precompute(self):
+        """Render every variant listed in FRAGMENTS; returns how many were rendered"""
+        rendered = 0
+        for name, variables in self.fragments.items():
+            for key in itertools.product(*variables.values()):
+                html = self._render(name, key)
+                with self._lock:
+                    if len(self._variants[name]) < self.max_variants:
+                        self._variants[name][key] = html
+                rendered += 1
+        return rendered
+
+    def snapshot(self):
+        """{fragment: {'hits', 'misses', 'overflows', 'variants'}}"""
+        return {
+            name: {
+                'hits': self.hits[name],
+                'misses': self.misses[name],
+                'overflows': self.overflows[name],
+                'variants': len(self._variants[name]),
+            }
+            for name in self.fragments
+        }
+
+
+fragment_cache = FragmentCache(
+    FRAGMENTS,
+    max_variants=settings.FRAGMENT_CACHE_MAX_VARIANTS,
+    check_interval=settings.TEMPLATE_CHECK_INTERVAL,
+)
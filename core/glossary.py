@@ -0,0 +1,170 @@
+import json
+import math
+import re
+import unicodedata
+from collections import namedtuple
+from pathlib import Path
+
+DATA_PATH = Path(__file__).resolve().parent / 'data' / 'glossary.json'
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# How much a query word counts for, by the field of the term it was found in
+FIELD_WEIGHTS = {'term': 4.0, 'definition': 1.0, 'example': 0.5}
+
+# A query word that is only the start of an indexed word ("meta" for
+# "metaphor") counts for this fraction of a whole-word match
+PREFIX_FACTOR = 0.5
+
+# Added when the whole query is the start of (or all of) a term's name
+TITLE_PREFIX_BONUS = 10.0
+TITLE_EXACT_BONUS = 20.0
+
+Term = namedtuple('Term', ['id', 'term', 'slug', 'letter', 'definition', 'example'])
+
+
+def normalize(text):
+    """Lowercase `text` and strip accents, so "Bildungsroman" and "bildungsróman" index alike"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+class PrefixTrie:
+    """
+    Word prefix -> postings, for matching words as they are being typed.
+
+    Every node keeps the merged postings ({term id: weight}, best weight
+    per term) of all the words below it, so a lookup costs one step per
+    character of the prefix and nothing per matching word.
+    """
+
+    def __init__(self):
+        self._root = ({}, {})
+
+    def insert(self, word, postings):
+        children, merged = self._root
+        for char in word:
+            node = children.get(char)
+            if node is None:
+                node = children[char] = ({}, {})
+            children, merged = node
+            for term_id, weight in postings.items():
+                if weight > merged.get(term_id, 0.0):
+                    merged[term_id] = weight
+
+    def get(self, prefix):
+        """Postings of every word starting with `prefix` (empty if none does)"""
+        node = self._root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return {}
+        return node[1]
+
+
+class Glossary:
+    """
+    The literary glossary, indexed for search.
+
+    Built once from core/data/glossary.json: an inverted index of whole words
+    (word -> {term id: weight}, weighted by the fields the word appears in)
+    and a PrefixTrie over the same words. Queries match when every word in
+    them matches, whole or as a prefix; a word that matches few terms counts
+    for more than one that matches many.
+    """
+
+    def __init__(self, entries):
+        self.terms = []
+        self.letters = {}
+        for entry in sorted(entries, key=lambda entry: normalize(entry['term'])):
+            name = entry['term']
+            term = Term(
+                id=len(self.terms),
+                term=name,
+                slug='-'.join(tokenize(name)),
+                letter=normalize(name)[:1].upper(),
+                definition=entry['definition'],
+                example=entry.get('example', ''),
+            )
+            self.terms.append(term)
+            self.letters.setdefault(term.letter, []).append(term)
+        # Names as space-joined words, to compare against the query's words
+        self._titles = [' '.join(tokenize(term.term)) for term in self.terms]
+
+        self.index = {}
+        for term in self.terms:
+            for field, weight in FIELD_WEIGHTS.items():
+                for word in set(tokenize(getattr(term, field))):
+                    postings = self.index.setdefault(word, {})
+                    postings[term.id] = postings.get(term.id, 0.0) + weight
+
+        self.trie = PrefixTrie()
+        for word, postings in self.index.items():
+            self.trie.insert(word, postings)
+
+    @classmethod
+    def load(cls, path=DATA_PATH):
+        return cls(json.loads(Path(path).read_text(encoding='utf-8')))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def group(self, letter):
+        """Terms under one letter of the A–Z, in order (empty for an unknown letter)"""
+        return self.letters.get(letter.upper(), [])
+
+    def _idf(self, postings):
+        return math.log(1 + len(self.terms) / len(postings))
+
+    def search(self, query, offset=0, limit=20):
+        """
+        Terms matching `query`, best first.
+
+        Returns (total number of matches, the terms from `offset` to
+        `offset + limit`). An empty query matches every term, A–Z.
+        """
+        words = tokenize(query)
+        if not words:
+            return len(self.terms), self.terms[offset:offset + limit]
+
+        scores = None
+        for word in dict.fromkeys(words):
+            prefixed = self.trie.get(word)
+            if not prefixed:
+                return 0, []
+            exact = self.index.get(word, {})
+            exact_idf = self._idf(exact) if exact else 0.0
+            prefix_idf = self._idf(prefixed) * PREFIX_FACTOR
+            previous = scores
+            scores = {}
+            for term_id in prefixed if previous is None else previous.keys() & prefixed.keys():
+                score = max(exact.get(term_id, 0.0) * exact_idf, prefixed[term_id] * prefix_idf)
+                scores[term_id] = score + (previous[term_id] if previous else 0.0)
+            if not scores:
+                return 0, []
+
+        phrase = ' '.join(words)
+        for term_id in scores:
+            title = self._titles[term_id]
+            if title == phrase:
+                scores[term_id] += TITLE_EXACT_BONUS
+            elif title.startswith(phrase):
+                scores[term_id] += TITLE_PREFIX_BONUS
+
+        ranked = sorted(scores, key=lambda term_id: (-scores[term_id], term_id))
+        return len(ranked), [self.terms[term_id] for term_id in ranked[offset:offset + limit]]
+
+
+_glossary = None
+
+
+def get_glossary():
+    """Return the Glossary, building it on first use"""
+    global _glossary
+    if _glossary is None:
+        _glossary = Glossary.load()
+    return _glossary
@@ -0,0 +1,131 @@
+"""
+Logging that keeps I/O off the request thread.
+
+BackgroundHandler is what settings.LOGGING's console handler uses: emit()
+only puts the record on a bounded queue, and a listener thread formats it
+and writes it to the stream. A slow or blocked stdout then stalls that
+thread rather than the workers. When the queue is full, records below
+ERROR are dropped (and counted); errors wait for room, so they are always
+written.
+
+JsonFormatter writes each record as one compact JSON object, with the
+`fields` of access log records (core.middleware.AccessLogMiddleware) as
+keys of their own.
+"""
+
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import weakref
+from datetime import datetime, timezone
+from logging.handlers import QueueListener
+
+_handlers = weakref.WeakSet()
+_handlers_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and the record's `fields`"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+class BackgroundHandler(logging.Handler):
+    """
+    A StreamHandler whose formatting and writing happen on a listener thread.
+
+    The queue holds at most `max_size` records. The listener is restarted,
+    with a queue of its own, in processes forked after it started (gunicorn
+    workers of a preloaded app).
+    """
+
+    def __init__(self, stream=None, max_size=10000, level=logging.NOTSET):
+        super().__init__(level)
+        self.max_size = max_size
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.queue = None
+        self.listener = None
+        self._start()
+        with _handlers_lock:
+            _handlers.add(self)
+
+    def _start(self):
+        self.queue = queue.Queue(self.max_size)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Arguments may change once the caller moves on: merge them now
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def emit(self, record):
+        try:
+            record = self.prepare(record)
+            if record.levelno >= logging.ERROR:
+                self.queue.put(record)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        """Wait until the listener has written every queued record"""
+        if self.listener is not None:
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        with _handlers_lock:
+            _handlers.discard(self)
+        self.target.close()
+        super().close()
+
+
+def dropped_records():
+    """Records BackgroundHandlers in this process dropped because their queue was full"""
+    with _handlers_lock:
+        return sum(handler.dropped for handler in _handlers)
+
+
+def _restart_listeners():
+    # The listener threads did not survive the fork, and their queues may
+    # hold records the parent will still write
+    for handler in list(_handlers):
+        if handler.listener is not None:
+            handler._start()
+
+
+os.register_at_fork(after_in_child=_restart_listeners)
@@ -0,0 +1,102 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+MODES = ('client', 'gunicorn')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every public page and wizard step, optionally failing on regressions against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=MODES + ('all',), default='all',
+            help='client: Django test client in-process; gunicorn: HTTP against a local gunicorn (default: both)',
+        )
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per page and level (default: 50)')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per page first (default: 3)')
+        parser.add_argument(
+            '--concurrency', default='1,4,16',
+            help='Comma-separated concurrency levels for the gunicorn mode (default: 1,4,16)',
+        )
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (default: 2)')
+        parser.add_argument('--url', action='append', dest='urls', help='Only benchmark this URL (repeatable)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument(
+            '--load', metavar='RESULTS',
+            help='Compare an existing results file instead of running the benchmark',
+        )
+        parser.add_argument('--compare', metavar='BASELINE', help='Fail if a page regressed against this results file')
+        parser.add_argument(
+            '--metric', default='p95_ms', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'],
+            help='Latency figure to compare (default: p95_ms)',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Allowed slowdown as a fraction of the baseline (default: 0.2, i.e. 20%%)',
+        )
+        parser.add_argument(
+            '--min-delta', type=float, default=1.0,
+            help='Ignore slowdowns smaller than this many milliseconds (default: 1.0)',
+        )
+
+    def handle(self, *args, **options):
+        if options['load']:
+            report = benchmark.load(options['load'])
+        else:
+            report = self.run(options)
+            if options['output']:
+                benchmark.save(options['output'], report)
+                self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            self.check_regressions(benchmark.load(options['compare']), report, options)
+
+    def run(self, options):
+        try:
+            concurrency = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError(f"Invalid --concurrency: {options['concurrency']}")
+        routes = benchmark.discover_routes(options['urls'])
+        if not routes:
+            raise CommandError('No routes to benchmark')
+        modes = MODES if options['mode'] == 'all' else (options['mode'],)
+
+        results = []
+        if 'client' in modes:
+            self.stdout.write(f'Test client: {len(routes)} pages x {options["requests"]} requests')
+            results += benchmark.run_client(routes, options['requests'], options['warmup'], self.stdout)
+        if 'gunicorn' in modes:
+            self.stdout.write(
+                f'gunicorn ({options["workers"]} workers): {len(routes)} pages x {options["requests"]} '
+                f'requests at concurrency {", ".join(map(str, concurrency))}'
+            )
+            try:
+                results += benchmark.run_gunicorn(
+                    routes, options['requests'], options['warmup'], concurrency, options['workers'], self.stdout,
+                )
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+
+        meta = benchmark.metadata(
+            requests=options['requests'], warmup=options['warmup'],
+            concurrency=concurrency, workers=options['workers'],
+        )
+        return {'meta': meta, 'results': results}
+
+    def check_regressions(self, baseline, report, options):
+        regressions = benchmark.compare(
+            baseline, report, metric=options['metric'],
+            threshold=options['threshold'], min_delta_ms=options['min_delta'],
+        )
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(
+                f"No page regressed by more than {options['threshold']:.0%} "
+                f"(baseline {baseline['meta'].get('revision')}, {options['metric']})"
+            ))
+            return
+        for entry, before, reason in regressions:
+            self.stdout.write(self.style.ERROR(
+                f"  {entry['mode']} c={entry['concurrency']} {entry['url']}: {reason}"
+            ))
+        raise CommandError(f'{len(regressions)} page(s) regressed against {options["compare"]}')
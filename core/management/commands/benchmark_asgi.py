@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+# (name, application, gunicorn worker class) for each serving path compared
+SERVERS = [
+    ('wsgi-sync', 'config.wsgi:application', 'sync'),
+    ('asgi-uvicorn', 'config.asgi:application', 'uvicorn_worker.UvicornWorker'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare the sync WSGI and async ASGI (uvicorn) serving paths under high concurrency with slow clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/pricing/', help='Page to request (default: /pricing/)')
+        parser.add_argument('--requests', type=int, default=300, help='Measured requests per run (default: 300)')
+        parser.add_argument('--concurrency', type=int, default=64, help='Concurrent fast clients (default: 64)')
+        parser.add_argument(
+            '--slow-clients', default='0,64',
+            help='Comma-separated numbers of slow clients trickling requests in alongside (default: 0,64)',
+        )
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers for both servers (default: 2)')
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds before a fast request counts as failed')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            slow_levels = [int(level) for level in options['slow_clients'].split(',')]
+        except ValueError:
+            raise CommandError(f"Invalid --slow-clients: {options['slow_clients']}")
+
+        results = []
+        for name, app, worker_class in SERVERS:
+            server = benchmark.GunicornServer(
+                workers=options['workers'], app=app, env={'GUNICORN_WORKER_CLASS': worker_class},
+            )
+            try:
+                with server:
+                    for slow in slow_levels:
+                        entry = benchmark.run_with_slow_clients(
+                            server.port, options['url'], options['requests'],
+                            options['concurrency'], slow, timeout=options['timeout'],
+                        )
+                        results.append({
+                            'server': name, 'url': options['url'], 'concurrency': options['concurrency'],
+                            'slow_clients': slow, **entry,
+                        })
+                        self.stdout.write(
+                            f"  {name:<13} slow={slow:<4} p50 {entry['p50_ms']:8.2f}  p95 {entry['p95_ms']:8.2f}  "
+                            f"p99 {entry['p99_ms']:8.2f} ms  {entry['rps']:8.1f} req/s  {entry['errors']} failed"
+                        )
+            except RuntimeError as exc:
+                raise CommandError(f'{name}: {exc}')
+
+        if options['output']:
+            meta = benchmark.metadata(
+                requests=options['requests'], concurrency=options['concurrency'],
+                workers=options['workers'], timeout=options['timeout'],
+            )
+            benchmark.save(options['output'], {'meta': meta, 'results': results})
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,184 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from core import benchmark
+
+# Words the simulated manuscript is made of
+VOCABULARY = (
+    'the a of and to in was she he it that her his with as had for on at by they but from not all were '
+    'night river house letter window voice silence morning city road memory door shadow stone garden '
+    'remembered whispered walked turned waited looked carried opened answered watched followed forgot '
+    'quiet distant broken golden narrow heavy bright cold familiar strange endless patient hidden'
+).split()
+
+
+def paragraph(rng):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(40, 120)))
+
+
+def manuscript(words, rng):
+    """[(key, text), ...] paragraphs adding up to about `words` words"""
+    blocks, total = [], 0
+    while total < words:
+        text = paragraph(rng)
+        blocks.append((f'p{len(blocks)}', text))
+        total += len(text.split())
+    return blocks
+
+
+def typing(text, rng):
+    """`text` after a few words were typed into it"""
+    words = text.split()
+    at = rng.randrange(len(words) + 1)
+    return ' '.join(words[:at] + [rng.choice(VOCABULARY) for _ in range(rng.randint(1, 8))] + words[at:])
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate autosaves while editing manuscripts of increasing length, saving chapter '
+        'deltas (core.chapters) vs the whole text each time, in a throwaway database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--words', default='10000,50000,100000',
+            help='Comma-separated manuscript lengths in words (default: 10000,50000,100000)',
+        )
+        parser.add_argument('--saves', type=int, default=200, help='Autosaves measured per length and mode (default: 200)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the text and the edits (default: 1)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(words) for words in options['words'].split(',')]
+        except ValueError:
+            raise CommandError(f"Invalid --words: {options['words']}")
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # The whole-text baseline stores the manuscript in a draft document
+            with override_settings(DRAFT_MAX_BYTES=2 ** 31):
+                results = [entry for words in sizes for entry in self.run(words, options['saves'], options['seed'])]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            report = {'meta': benchmark.metadata(saves=options['saves'], seed=options['seed']), 'results': results}
+            benchmark.save(options['output'], report)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def client(self, username):
+        from django.contrib.auth.models import User
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        user = User.objects.create_user(username)
+        return Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def run(self, words, saves, seed):
+        rng = random.Random(seed)
+        blocks = manuscript(words, rng)
+        words = sum(len(text.split()) for key, text in blocks)
+        self.stdout.write(f'{words} words in {len(blocks)} paragraphs')
+        results = [
+            self.run_delta(list(blocks), saves, random.Random(seed)),
+            self.run_full(list(blocks), saves, random.Random(seed)),
+        ]
+        for entry in results:
+            entry['words'] = words
+            self.stdout.write(
+                f"  {entry['mode']:<6} p50 {entry['p50_ms']:8.2f}  p95 {entry['p95_ms']:8.2f}  p99 {entry['p99_ms']:8.2f} ms  "
+                f"{entry['request_bytes']:>9} bytes/save  {entry['stored_bytes']:>10} bytes stored"
+            )
+        return results
+
+    def run_delta(self, blocks, saves, rng):
+        """Autosaves sending only the blocks that changed"""
+        from core.models import ChapterRevision
+
+        client = self.client(f'delta-{len(blocks)}')
+        draft = client.post('/api/drafts/', {}, content_type='application/json').json()['id']
+        response = client.post(f'/api/drafts/{draft}/chapters/', {'title': 'Benchmark'}, content_type='application/json')
+        url, etag = response['Location'], response['ETag']
+
+        batch = settings.CHAPTER_MAX_OPERATIONS
+        for start in range(0, len(blocks), batch):
+            operations = [{'op': 'put', 'id': key, 'text': text} for key, text in blocks[start:start + batch]]
+            response = client.patch(url, json.dumps(operations), content_type='application/json', HTTP_IF_MATCH=etag)
+            etag = response['ETag']
+
+        latencies, sizes = [], []
+        next_key = len(blocks)
+        for save in range(saves):
+            index = rng.randrange(len(blocks))
+            key, text = blocks[index]
+            blocks[index] = (key, typing(text, rng))
+            operations = [{'op': 'put', 'id': key, 'text': blocks[index][1]}]
+            if save % 10 == 9:
+                # A new paragraph now and then
+                new = (f'p{next_key}', paragraph(rng))
+                next_key += 1
+                operations.append({'op': 'put', 'id': new[0], 'after': key, 'text': new[1]})
+                blocks.insert(index + 1, new)
+            elif save % 25 == 24:
+                removed = blocks.pop(rng.randrange(len(blocks)))
+                operations.append({'op': 'delete', 'id': removed[0]})
+            body = json.dumps(operations)
+            started = time.perf_counter()
+            response = client.patch(url, body, content_type='application/json', HTTP_IF_MATCH=etag)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f'Delta save failed with {response.status_code}: {response.content[:200]}')
+            etag = response['ETag']
+            sizes.append(len(body))
+
+        chapter = client.get(url).json()
+        if [block['text'] for block in chapter['blocks']] != [text for key, text in blocks]:
+            raise CommandError('The saved chapter does not match the edited manuscript')
+        stored = sum(
+            len(json.dumps(delta)) + len(snapshot or b'')
+            for delta, snapshot in ChapterRevision.objects.filter(chapter_id=chapter['id']).values_list('delta', 'snapshot')
+        ) + sum(len(text.encode('utf-8')) for key, text in blocks)
+        return self.summarize('delta', latencies, sizes, stored)
+
+    def run_full(self, blocks, saves, rng):
+        """Autosaves replacing the whole chapter text in the draft document"""
+        client = self.client(f'full-{len(blocks)}')
+        response = client.post('/api/drafts/', {}, content_type='application/json')
+        url, etag = response['Location'], response['ETag']
+
+        latencies, sizes = [], []
+        for save in range(saves):
+            index = rng.randrange(len(blocks))
+            key, text = blocks[index]
+            blocks[index] = (key, typing(text, rng))
+            body = json.dumps([{
+                'op': 'add', 'path': '/chapter-view',
+                'value': {'text': '\n\n'.join(text for key, text in blocks)},
+            }])
+            started = time.perf_counter()
+            response = client.patch(url, body, content_type='application/json-patch+json', HTTP_IF_MATCH=etag)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 204:
+                raise CommandError(f'Full save failed with {response.status_code}: {response.content[:200]}')
+            etag = response['ETag']
+            sizes.append(len(body))
+        return self.summarize('full', latencies, sizes, len(body))
+
+    def summarize(self, mode, latencies, sizes, stored):
+        latencies = sorted(latencies)
+        return {
+            'mode': mode,
+            'saves': len(latencies),
+            'p50_ms': round(benchmark.percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(benchmark.percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(benchmark.percentile(latencies, 0.99) * 1000, 3),
+            'request_bytes': round(sum(sizes) / len(sizes)),
+            'stored_bytes': stored,
+        }
@@ -0,0 +1,168 @@
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+# Prints a fresh access token for the benchmark user, creating it if needed,
+# and what opening (and closing) a connection costs with the profile
+SETUP_SCRIPT = '''
+import time
+from django.contrib.auth.models import User
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+user, created = User.objects.get_or_create(username='benchmark')
+if created:
+    user.set_unusable_password()
+    user.save()
+print('TOKEN', AccessToken.for_user(user))
+connection.close()
+started = time.perf_counter()
+for _ in range(100):
+    connection.ensure_connection()
+    connection.close()
+print('CONNECT', (time.perf_counter() - started) / 100)
+'''
+
+# (name, environment) of each database profile compared
+SQLITE_PROFILES = [
+    ('per-request', {'DATABASE_CONN_MAX_AGE': '0', 'SQLITE_TUNED': 'False'}),
+    ('persistent', {'DATABASE_CONN_MAX_AGE': '600', 'SQLITE_TUNED': 'False'}),
+    ('tuned', {'DATABASE_CONN_MAX_AGE': '600', 'SQLITE_TUNED': 'True'}),
+]
+POSTGRES_PROFILES = [
+    ('per-request', {'DATABASE_CONN_MAX_AGE': '0', 'DATABASE_POOL': 'False'}),
+    ('persistent', {'DATABASE_CONN_MAX_AGE': '600', 'DATABASE_POOL': 'False'}),
+]
+POSTGRES_POOL_PROFILE = ('pool', {'DATABASE_POOL': 'True'})
+
+
+def call(port, method, url, token, body=None, timeout=60):
+    """One API request on a fresh HTTP connection; returns (status, body bytes)"""
+    headers = {'Authorization': f'Bearer {token}'}
+    if body is not None:
+        headers['Content-Type'] = 'application/json'
+        body = json.dumps(body)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request(method, url, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare API latency under concurrency with a new database connection per request, '
+        'persistent connections and the tuned SQLite profile (or a PostgreSQL pool), against a local gunicorn'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database-url',
+            help='Benchmark this PostgreSQL database (migrated and given a benchmark user) instead of throwaway SQLite files',
+        )
+        parser.add_argument('--pool', action='store_true', help='Also benchmark DATABASE_POOL (needs psycopg[pool])')
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per kind and level (default: 500)')
+        parser.add_argument(
+            '--concurrency', default='1,8,32',
+            help='Comma-separated concurrency levels (default: 1,8,32)',
+        )
+        parser.add_argument('--workers', type=int, default=4, help='gunicorn workers (default: 4)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            concurrency = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError(f"Invalid --concurrency: {options['concurrency']}")
+        if options['database_url']:
+            profiles = POSTGRES_PROFILES + ([POSTGRES_POOL_PROFILE] if options['pool'] else [])
+        else:
+            profiles = SQLITE_PROFILES
+
+        results = []
+        with tempfile.TemporaryDirectory(prefix='penwise-db-') as directory:
+            for name, profile in profiles:
+                # A file of its own per SQLite profile: WAL mode sticks to the file
+                database_url = options['database_url'] or f'sqlite:///{Path(directory) / name}.sqlite3'
+                env = {**profile, 'DATABASE_URL': database_url, 'ACCESS_LOG': 'False', 'LOG_QUEUE': 'False'}
+                token, connect = self.prepare(env)
+                self.stdout.write(f'  {name:<12} opening a connection takes {connect * 1000:.3f} ms')
+                results.append({'profile': name, 'kind': 'connect', 'mean_ms': round(connect * 1000, 3)})
+                try:
+                    with benchmark.GunicornServer(workers=options['workers'], env=env) as server:
+                        for entry in self.run(server.port, token, concurrency, options['requests']):
+                            results.append({'profile': name, **entry})
+                            self.stdout.write(
+                                f"  {name:<12} {entry['kind']:<6} c={entry['concurrency']:<3} "
+                                f"p50 {entry['p50_ms']:8.2f}  p95 {entry['p95_ms']:8.2f}  p99 {entry['p99_ms']:8.2f} ms  "
+                                f"{entry['rps']:8.1f} req/s  {entry['errors']} failed"
+                            )
+                except RuntimeError as exc:
+                    raise CommandError(f'{name}: {exc}')
+
+        if options['output']:
+            meta = benchmark.metadata(
+                requests=options['requests'], concurrency=concurrency, workers=options['workers'],
+                database='postgresql' if options['database_url'] else 'sqlite',
+            )
+            benchmark.save(options['output'], {'meta': meta, 'results': results})
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def manage(self, env, *args):
+        return subprocess.run(
+            [sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env={**os.environ, **env},
+            capture_output=True, text=True,
+        )
+
+    def prepare(self, env):
+        """Migrate the database; returns an access token for the benchmark user and the connection setup time"""
+        for args in (('migrate', '--noinput'), ('shell', '-c', SETUP_SCRIPT)):
+            process = self.manage(env, *args)
+            if process.returncode:
+                raise CommandError(f"manage.py {args[0]} failed: {process.stderr[-2000:]}")
+        output = dict(line.split(' ', 1) for line in process.stdout.splitlines() if line.startswith(('TOKEN ', 'CONNECT ')))
+        return output['TOKEN'], float(output['CONNECT'])
+
+    def run(self, port, token, concurrency_levels, requests):
+        """Reads (GET a draft) and writes (POST a draft) at each concurrency level"""
+        status, body = call(port, 'POST', '/api/drafts/', token, {})
+        if status != 201:
+            raise CommandError(f'Creating a draft failed with {status}: {body[:200]}')
+        draft = json.loads(body)['id']
+        kinds = [
+            ('read', lambda: call(port, 'GET', f'/api/drafts/{draft}/', token)),
+            ('write', lambda: call(port, 'POST', '/api/drafts/', token, {'data': {'new-project': {'title': 'Benchmark'}}})),
+        ]
+        for concurrency in concurrency_levels:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for kind, request in kinds:
+                    def timed(_):
+                        request_started = time.perf_counter()
+                        try:
+                            status, body = request()
+                        except OSError:
+                            return time.perf_counter() - request_started, 0, 0
+                        return time.perf_counter() - request_started, len(body), status
+
+                    list(pool.map(timed, range(concurrency * 2)))
+                    started = time.perf_counter()
+                    samples = list(pool.map(timed, range(requests)))
+                    elapsed = time.perf_counter() - started
+                    ok = [sample for sample in samples if sample[2] in (200, 201)]
+                    latencies, sizes, statuses = (list(column) for column in zip(*ok)) if ok else ([0.0], [0], [0])
+                    entry = benchmark.summarize(latencies, elapsed, sizes, statuses)
+                    entry['rps'] = round(len(ok) / elapsed, 1) if elapsed else 0.0
+                    entry['errors'] = len(samples) - len(ok)
+                    yield {'kind': kind, 'concurrency': concurrency, **entry}
@@ -0,0 +1,112 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from core import benchmark
+from core.log import BackgroundHandler, JsonFormatter
+
+ACCESS_LOGGER = 'penwise.access'
+
+
+class SlowStream:
+    """Stands in for a stdout pipe that takes `delay` seconds to accept each write"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.lines += text.count('\n')
+
+    def flush(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare request latency with the access log off, written on the request thread, '
+        'queued to a background thread, and queued with 2xx sampling, against a slow stdout'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', dest='urls', help='Page to request (repeatable, default: /pricing/)')
+        parser.add_argument('--requests', type=int, default=500, help='Measured requests per page and setup (default: 500)')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per page first (default: 20)')
+        parser.add_argument(
+            '--write-delay', type=float, default=1.0,
+            help='Milliseconds the simulated stdout takes per log line (default: 1.0)',
+        )
+        parser.add_argument(
+            '--sample-rate', type=float, default=settings.ACCESS_LOG_SAMPLE_RATE,
+            help=f'2xx sample rate of the sampled setup (default: ACCESS_LOG_SAMPLE_RATE, {settings.ACCESS_LOG_SAMPLE_RATE})',
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        setups = [
+            ('off', None, 1.0),
+            ('sync', logging.StreamHandler, 1.0),
+            ('queued', BackgroundHandler, 1.0),
+            ('sampled', BackgroundHandler, options['sample_rate']),
+        ]
+        logger = logging.getLogger(ACCESS_LOGGER)
+        handlers, propagate = logger.handlers[:], logger.propagate
+        # Broken pages are reported in the results; don't log a traceback per request
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        results = []
+        try:
+            logger.propagate = False
+            for name, handler_class, sample_rate in setups:
+                for url in options['urls'] or ['/pricing/']:
+                    entry = self.run(logger, url, handler_class, sample_rate, options)
+                    results.append({'logging': name, 'url': url, 'sample_rate': sample_rate, **entry})
+                    self.stdout.write(
+                        f"  {name:<8} {url:<30} p50 {entry['p50_ms']:8.3f}  p95 {entry['p95_ms']:8.3f}  "
+                        f"p99 {entry['p99_ms']:8.3f} ms  {entry['rps']:8.1f} req/s  "
+                        f"{entry['lines']:>5} lines  {entry['dropped']} dropped"
+                    )
+        finally:
+            logger.handlers, logger.propagate = handlers, propagate
+
+        if options['output']:
+            meta = benchmark.metadata(
+                requests=options['requests'], warmup=options['warmup'], write_delay_ms=options['write_delay'],
+            )
+            benchmark.save(options['output'], {'meta': meta, 'results': results})
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def run(self, logger, url, handler_class, sample_rate, options):
+        stream = SlowStream(options['write_delay'] / 1000)
+        handler = handler_class(stream) if handler_class else None
+        logger.handlers = []
+        if handler is not None:
+            handler.setFormatter(JsonFormatter())
+            logger.addHandler(handler)
+        try:
+            # A new client builds the middleware chain with these settings
+            with override_settings(ACCESS_LOG=handler is not None, ACCESS_LOG_SAMPLE_RATE=sample_rate):
+                client = Client(raise_request_exception=False, HTTP_ACCEPT_ENCODING=benchmark.ACCEPT_ENCODING)
+                for _ in range(options['warmup']):
+                    client.get(url)
+                latencies, sizes, statuses = [], [], []
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    request_started = time.perf_counter()
+                    response = client.get(url)
+                    latencies.append(time.perf_counter() - request_started)
+                    sizes.append(len(response.content))
+                    statuses.append(response.status_code)
+                elapsed = time.perf_counter() - started
+        finally:
+            if handler is not None:
+                handler.flush()
+                handler.close()
+        entry = benchmark.summarize(latencies, elapsed, sizes, statuses)
+        entry['lines'] = stream.lines
+        entry['dropped'] = getattr(handler, 'dropped', 0)
+        return entry
@@ -0,0 +1,108 @@
+import json
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+# A local stand-in for what the platform hands api.index.handler
+DEFAULT_EVENT = {
+    'httpMethod': 'GET',
+    'path': '/',
+    'queryStringParameters': None,
+    'headers': {
+        'host': 'localhost',
+        'accept': 'text/html',
+        'accept-encoding': 'br, gzip',
+        'x-forwarded-proto': 'https',
+    },
+    'body': None,
+    'isBase64Encoded': False,
+}
+
+# Runs in a fresh interpreter per cold start and reports its timings as JSON
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {base_dir!r})
+import api.index
+imported = time.perf_counter()
+event = json.loads(sys.argv[1])
+response = api.index.handler(event)
+first = time.perf_counter()
+warm = []
+for _ in range({warm}):
+    warm_started = time.perf_counter()
+    api.index.handler(event)
+    warm.append(time.perf_counter() - warm_started)
+print(json.dumps({{
+    'status': response['statusCode'],
+    'import': imported - started,
+    'first': first - imported,
+    'warm': warm,
+}}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure cold-start and warm invocation latency of the serverless handler (api/index.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cold', type=int, default=10, help='Number of cold starts, each in a new process (default: 10)')
+        parser.add_argument('--warm', type=int, default=200, help='Warm invocations after each cold start (default: 200)')
+        parser.add_argument('--path', default='/', help='Path the stand-in event requests (default: /)')
+        parser.add_argument('--event', help='JSON file with the event to send instead of the built-in stand-in')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['event']:
+            with open(options['event']) as f:
+                event = json.load(f)
+        else:
+            event = {**DEFAULT_EVENT, 'path': options['path']}
+        script = CHILD.format(base_dir=str(settings.BASE_DIR), warm=options['warm'])
+
+        process_ms, import_ms, first_ms, warm = [], [], [], []
+        for run in range(options['cold']):
+            started = time.perf_counter()
+            child = subprocess.run(
+                [sys.executable, '-c', script, json.dumps(event)],
+                capture_output=True, text=True, cwd=settings.BASE_DIR,
+            )
+            if child.returncode != 0:
+                raise CommandError(f'Cold start {run + 1} failed:\n{child.stderr[-2000:]}')
+            timings = json.loads(child.stdout.strip().splitlines()[-1])
+            # Interpreter start-up plus import plus first request, as the platform sees it
+            process_ms.append((time.perf_counter() - started) * 1000 - sum(timings['warm']) * 1000)
+            import_ms.append(timings['import'] * 1000)
+            first_ms.append(timings['first'] * 1000)
+            warm += timings['warm']
+
+        def stats(values):
+            values = sorted(values)
+            return {
+                'p50_ms': round(benchmark.percentile(values, 0.50), 3),
+                'p95_ms': round(benchmark.percentile(values, 0.95), 3),
+                'p99_ms': round(benchmark.percentile(values, 0.99), 3),
+            }
+
+        report = {
+            'meta': benchmark.metadata(path=event.get('path'), cold=options['cold'], warm=options['warm']),
+            'status': timings['status'],
+            'cold_start_total': stats(process_ms),
+            'cold_start_import': stats(import_ms),
+            'cold_start_first_invocation': stats(first_ms),
+            'warm_invocation': stats([value * 1000 for value in warm]),
+        }
+        for name in ('cold_start_total', 'cold_start_import', 'cold_start_first_invocation', 'warm_invocation'):
+            figures = report[name]
+            self.stdout.write(
+                f"{name.replace('_', ' '):<30} p50 {figures['p50_ms']:9.2f}  "
+                f"p95 {figures['p95_ms']:9.2f}  p99 {figures['p99_ms']:9.2f} ms"
+            )
+        if options['output']:
+            benchmark.save(options['output'], report)
+            self.stdout.write(f"Results written to {options['output']}")
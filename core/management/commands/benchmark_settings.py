@@ -0,0 +1,138 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+
+# Run in a fresh interpreter per settings module: loads the WSGI application
+# as a gunicorn worker does, then serves pages through it directly. Prints
+# one JSON line.
+PROBE_SCRIPT = '''
+import json, resource, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+setup_seconds = time.perf_counter() - started
+modules = len(sys.modules)
+
+def rss():
+    try:
+        with open('/proc/self/status') as status:
+            return next(int(line.split()[1]) * 1024 for line in status if line.startswith('VmRSS:'))
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+from wsgiref.util import setup_testing_defaults
+from core.warmup import warm_up
+warm_up()
+ready_rss = rss()
+
+def get(url):
+    environ = {'PATH_INFO': url, 'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'br, gzip', 'REMOTE_ADDR': '127.0.0.1'}
+    setup_testing_defaults(environ)
+    response = {}
+    def start_response(status, headers, exc_info=None):
+        response.update(status=int(status.split()[0]), headers=dict(headers))
+    b''.join(application(environ, start_response))
+    timings = dict(
+        (name, float(duration[4:])) for name, _, duration in
+        (item.strip().partition(';') for item in response['headers'].get('Server-Timing', '').split(','))
+        if duration.startswith('dur=')
+    )
+    return response['status'], timings
+
+urls, requests = sys.argv[1].split(','), int(sys.argv[2])
+pages = {}
+for url in urls:
+    for _ in range(5):
+        get(url)
+    middleware, total, statuses = [], [], []
+    for _ in range(requests):
+        status, timings = get(url)
+        statuses.append(status)
+        middleware.append(timings.get('middleware', 0.0))
+        total.append(timings.get('total', 0.0))
+    pages[url] = {'status': max(set(statuses), key=statuses.count), 'middleware': middleware, 'total': total}
+print('PROBE', json.dumps({
+    'setup_seconds': setup_seconds, 'modules': modules,
+    'ready_rss': ready_rss, 'rss': rss(), 'pages': pages,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare worker startup time, memory and per-request middleware time of settings modules '
+        '(by default the full config.settings and the public-site config.settings_public)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settings-modules', default='config.settings,config.settings_public',
+            help='Comma-separated settings modules (default: config.settings,config.settings_public)',
+        )
+        parser.add_argument('--url', action='append', dest='urls', help='Page to request (repeatable, default: / and /pricing/)')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per page (default: 200)')
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per settings module (default: 5)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or ['/', '/pricing/']
+        results = []
+        for module in options['settings_modules'].split(','):
+            probes = [self.probe(module, urls, options['requests']) for _ in range(options['runs'])]
+            entry = {
+                'settings': module,
+                'setup_ms': round(statistics.median(probe['setup_seconds'] for probe in probes) * 1000, 1),
+                'modules': probes[0]['modules'],
+                'ready_rss_mb': round(statistics.median(probe['ready_rss'] for probe in probes) / 2 ** 20, 1),
+                'rss_mb': round(statistics.median(probe['rss'] for probe in probes) / 2 ** 20, 1),
+                'pages': [],
+            }
+            self.stdout.write(
+                f"{module}: setup {entry['setup_ms']:.1f} ms, {entry['modules']} modules, "
+                f"RSS {entry['ready_rss_mb']:.1f} MB after warm-up, {entry['rss_mb']:.1f} MB after the requests"
+            )
+            for url in urls:
+                middleware = sorted(value for probe in probes for value in probe['pages'][url]['middleware'])
+                total = sorted(value for probe in probes for value in probe['pages'][url]['total'])
+                page = {
+                    'url': url,
+                    'status': probes[0]['pages'][url]['status'],
+                    'middleware_p50_ms': round(benchmark.percentile(middleware, 0.50), 3),
+                    'middleware_p95_ms': round(benchmark.percentile(middleware, 0.95), 3),
+                    'total_p50_ms': round(benchmark.percentile(total, 0.50), 3),
+                    'total_p95_ms': round(benchmark.percentile(total, 0.95), 3),
+                }
+                entry['pages'].append(page)
+                self.stdout.write(
+                    f"  {url:<30} {page['status']}  middleware p50 {page['middleware_p50_ms']:.3f} "
+                    f"p95 {page['middleware_p95_ms']:.3f} ms  total p50 {page['total_p50_ms']:.3f} "
+                    f"p95 {page['total_p95_ms']:.3f} ms"
+                )
+            results.append(entry)
+
+        if options['output']:
+            meta = benchmark.metadata(urls=urls, requests=options['requests'], runs=options['runs'])
+            benchmark.save(options['output'], {'meta': meta, 'results': results})
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def probe(self, module, urls, requests):
+        process = subprocess.run(
+            [sys.executable, '-c', PROBE_SCRIPT, ','.join(urls), str(requests)],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={
+                **os.environ, 'DJANGO_SETTINGS_MODULE': module, 'ACCESS_LOG': 'False',
+                # The probe reads the phases from the Server-Timing header
+                'SERVER_TIMING_ALLOWED_IPS': '127.0.0.1',
+            },
+        )
+        for line in process.stdout.splitlines():
+            if line.startswith('PROBE '):
+                return json.loads(line[len('PROBE '):])
+        raise CommandError(f'{module}: the probe failed: {process.stderr[-2000:]}')
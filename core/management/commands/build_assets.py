@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import assets
+
+
+class Command(BaseCommand):
+    help = 'Run the asset pipeline into ASSET_BUILD_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'steps', nargs='*',
+            help=f"Steps to run, any of: {', '.join(assets.STEPS)} (default: all of them)",
+        )
+        parser.add_argument('--jobs', type=int, help='Number of worker processes (default: one per CPU)')
+        parser.add_argument('--force', action='store_true', help='Rebuild outputs even if their sources are unchanged')
+
+    def handle(self, *args, **options):
+        unknown = set(options['steps']) - set(assets.STEPS)
+        if unknown:
+            raise CommandError(f"Unknown step(s): {', '.join(sorted(unknown))}")
+        assets.build(self.stdout, steps=options['steps'] or None, jobs=options['jobs'], force=options['force'])
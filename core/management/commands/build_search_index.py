@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = 'Extract the text of every content page into the site search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=str(settings.SEARCH_INDEX_PATH),
+            help='Index file to write (default: SEARCH_INDEX_PATH)',
+        )
+        parser.add_argument('--force', action='store_true', help='Re-extract every page, changed or not')
+
+    def handle(self, *args, **options):
+        search.build(self.stdout, path=options['output'], force=options['force'])
@@ -0,0 +1,19 @@
+from django.contrib.staticfiles.management.commands.collectstatic import Command as CollectStaticCommand
+
+from core import assets
+
+
+class Command(CollectStaticCommand):
+    """collectstatic that runs the asset pipeline first, so generated files get collected too"""
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--skip-build', action='store_true',
+            help='Collect without running the asset pipeline first',
+        )
+
+    def handle(self, **options):
+        if not options['skip_build']:
+            assets.build(self.stdout)
+        return super().handle(**options)
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+
+from core.assets import critical, css, dimensions, images, js
+from core.assets.dimensions import add_image_hints
+from core.compression import brotli_compress, gzip_compress, minify_html
+from core.routes import public_routes
+from core.template_graph import get_template_graph
+
+# The manifest's name when it was still written inside the output directory
+LEGACY_MANIFEST_NAME = 'prerender-manifest.json'
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def manifest_path(root):
+    """
+    Where the manifest of the pages under `root` goes: next to it, not inside.
+
+    With SERVE_PRERENDERED the root is served as it is, and the manifest
+    (every page's fingerprint and render time) isn't meant for visitors.
+    """
+    return root.with_name(f'{root.name}.manifest.json')
+
+
+def output_path(root, url):
+    """Map a URL path to the index.html a static file server would look up for it"""
+    return Path(root, url.strip('/'), 'index.html')
+
+
+def assets_fingerprint():
+    """Hash of the asset manifests, which decide the stylesheet, critical CSS, scripts and image markup of every page"""
+    digest = hashlib.sha256()
+    for module in (images, dimensions, css, critical, js):
+        try:
+            digest.update(module.manifest_path().read_bytes())
+        except FileNotFoundError:
+            pass
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def route_fingerprint(graph, assets, template_name, context):
+    """Changes whenever the route's output could: its templates, its context, the assets or the minify setting"""
+    key = f'{graph.fingerprint(template_name)}\0{assets}\0{sorted(context.items())!r}\0{settings.HTML_MINIFY}'
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def render_route(root, url, template_name, context):
+    """Render one route to disk, with .gz/.br siblings. Runs inside a pool worker."""
+    started = time.perf_counter()
+    # Static copies are shared by every visitor, so no CSRF token is rendered
+    html = add_image_hints(render_to_string(template_name, {**context, 'csrf_token': 'NOTPROVIDED'}))
+    if settings.HTML_MINIFY:
+        html = minify_html(html)
+    content = html.encode(settings.DEFAULT_CHARSET)
+    render_ms = (time.perf_counter() - started) * 1000
+
+    path = output_path(root, url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    entry = {
+        'template': template_name,
+        'file': path.relative_to(root).as_posix(),
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'bytes': len(content),
+        'render_ms': round(render_ms, 2),
+    }
+    gz = gzip_compress(content)
+    Path(f'{path}.gz').write_bytes(gz)
+    entry['gzip_bytes'] = len(gz)
+    br = brotli_compress(content)
+    if br is not None:
+        Path(f'{path}.br').write_bytes(br)
+        entry['br_bytes'] = len(br)
+    return url, entry
+
+
+class Command(BaseCommand):
+    help = 'Render every public page and wizard step to static HTML (with .gz/.br siblings)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=str(settings.PRERENDER_ROOT),
+            help='Directory to write the rendered pages to (default: PRERENDER_ROOT)',
+        )
+        parser.add_argument(
+            '--jobs', type=int, default=os.cpu_count() or 1,
+            help='Number of render processes (default: one per CPU)',
+        )
+        parser.add_argument(
+            '--clean', action='store_true',
+            help='Remove the output directory before rendering',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Render every page, even those whose templates are unchanged since the last run',
+        )
+
+    def handle(self, *args, **options):
+        root = Path(options['output']).resolve()
+        if options['clean'] and root.exists():
+            shutil.rmtree(root)
+            manifest_path(root).unlink(missing_ok=True)
+        root.mkdir(parents=True, exist_ok=True)
+        (root / LEGACY_MANIFEST_NAME).unlink(missing_ok=True)
+
+        try:
+            previous = json.loads(manifest_path(root).read_text())
+        except (FileNotFoundError, ValueError):
+            previous = {}
+
+        # Pages whose templates (and everything they extend or include) are
+        # unchanged since the last run are kept as they are
+        graph = get_template_graph(rebuild=True)
+        assets = assets_fingerprint()
+        routes = []
+        manifest = {}
+        for url, template_name, context in public_routes():
+            fingerprint = route_fingerprint(graph, assets, template_name, context)
+            entry = previous.get(url)
+            if (
+                not options['force'] and entry and entry.get('fingerprint') == fingerprint
+                and (root / entry['file']).exists()
+            ):
+                manifest[url] = entry
+            else:
+                routes.append((url, template_name, context, fingerprint))
+        unchanged = len(manifest)
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=max(options['jobs'], 1), initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(render_route, root, url, template_name, context): (url, fingerprint)
+                for url, template_name, context, fingerprint in routes
+            }
+            failures = {}
+            for future in as_completed(futures):
+                url, fingerprint = futures[future]
+                try:
+                    url, entry = future.result()
+                except Exception as exc:
+                    failures[url] = exc
+                    self.stderr.write(f'  {url:<45} FAILED: {exc!r}')
+                    continue
+                manifest[url] = {**entry, 'fingerprint': fingerprint}
+                self.stdout.write(
+                    f"  {url:<45} {entry['render_ms']:>8.2f} ms {entry['bytes']:>9,} B"
+                    f" -> gz {entry['gzip_bytes']:>8,} B"
+                    + (f" br {entry['br_bytes']:>8,} B" if 'br_bytes' in entry else '')
+                )
+        elapsed = time.perf_counter() - started
+
+        manifest = dict(sorted(manifest.items()))
+        manifest_path(root).write_text(json.dumps(manifest, indent=2) + '\n')
+
+        if manifest:
+            render_total = sum(entry['render_ms'] for entry in manifest.values())
+            slowest_url = max(manifest, key=lambda url: manifest[url]['render_ms'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Prerendered {len(manifest)} pages into {root} in {elapsed:.2f}s '
+                f'({len(manifest) - unchanged} rendered, {unchanged} unchanged; '
+                f'{render_total:.0f} ms of rendering, slowest {slowest_url} '
+                f"at {manifest[slowest_url]['render_ms']:.2f} ms)"
+            ))
+        if failures:
+            raise CommandError(f"{len(failures)} page(s) failed to render: {', '.join(sorted(failures))}")
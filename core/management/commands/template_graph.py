@@ -0,0 +1,84 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.routes import public_routes
+from core.template_files import template_dirs
+from core.template_graph import ANY, get_template_graph
+
+
+def template_name(value):
+    """A template name for a name or a file path under one of the template dirs"""
+    path = Path(value).resolve()
+    for root in template_dirs():
+        try:
+            return path.relative_to(root.resolve()).as_posix()
+        except ValueError:
+            continue
+    return value
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the template dependency graph (extends/include), or with file arguments '
+        'the pages that have to be re-rendered when those templates change'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='Changed templates, as names or paths')
+        parser.add_argument(
+            '--format', choices=['text', 'json', 'dot'], default='text',
+            help='Output format (dot: Graphviz, graph only; default: text)',
+        )
+
+    def handle(self, *args, **options):
+        graph = get_template_graph()
+        for name, error in sorted(graph.errors.items()):
+            self.stderr.write(f'{name}: could not compile, extends/include found by scanning instead ({error})')
+        if options['files']:
+            self.affected(graph, [template_name(value) for value in options['files']], options['format'])
+        else:
+            self.print_graph(graph, options['format'])
+
+    def print_graph(self, graph, output_format):
+        if output_format == 'json':
+            self.stdout.write(json.dumps({name: graph.edges[name] for name in sorted(graph.edges)}, indent=2))
+        elif output_format == 'dot':
+            self.stdout.write('digraph templates {')
+            for name in sorted(graph.edges):
+                for dependency, kind in sorted(graph.edges[name].items()):
+                    self.stdout.write(f'  "{name}" -> "{dependency}" [label="{kind}"];')
+            self.stdout.write('}')
+        else:
+            for name in sorted(graph.edges):
+                self.stdout.write(name)
+                for dependency, kind in sorted(graph.edges[name].items()):
+                    self.stdout.write(f'  {kind:<8} {"(any template)" if dependency == ANY else dependency}')
+                dependents = sorted(graph.dependents.get(name, ()))
+                if dependents:
+                    self.stdout.write(f'  used by  {", ".join(dependents)}')
+
+    def affected(self, graph, changed, output_format):
+        unknown = [name for name in changed if name not in graph and name not in graph.dependents]
+        if unknown:
+            raise CommandError(f"Not a template: {', '.join(unknown)}")
+
+        affected = graph.affected(changed)
+        pages = [(url, name) for url, name, context in public_routes() if name in affected]
+        partials = sorted(affected - {name for url, name in pages})
+        if output_format == 'json':
+            self.stdout.write(json.dumps({
+                'changed': changed,
+                'pages': [{'url': url, 'template': name} for url, name in pages],
+                'templates': sorted(affected),
+            }, indent=2))
+            return
+        if output_format == 'dot':
+            raise CommandError('--format dot only applies to the whole graph')
+
+        self.stdout.write(f"{len(pages)} page(s) affected by {', '.join(changed)}:")
+        for url, name in pages:
+            self.stdout.write(f'  {url:<45} {name}')
+        if partials:
+            self.stdout.write(f"Other affected templates: {', '.join(partials)}")
@@ -0,0 +1,249 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+
+# Latency histogram bucket bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+METRICS = {
+    'penwise_request_duration_seconds': (
+        'histogram', 'Request latency from the first middleware in to the response out',
+    ),
+    'penwise_request_phase_seconds': (
+        'summary', 'Time spent in each phase of a request (resolve, render, compress, middleware)',
+    ),
+    'penwise_response_bytes': ('summary', 'Response body size as sent, after compression'),
+    'penwise_page_cache_hits_total': ('counter', 'Rendered page cache hits'),
+    'penwise_page_cache_misses_total': ('counter', 'Rendered page cache misses'),
+    'penwise_fragment_cache_hits_total': ('counter', 'Fragment cache hits, by fragment'),
+    'penwise_fragment_cache_misses_total': ('counter', 'Fragment cache misses (renders), by fragment'),
+    'penwise_fragment_cache_overflows_total': (
+        'counter', 'Fragment renders not cached because the fragment reached FRAGMENT_CACHE_MAX_VARIANTS',
+    ),
+    'penwise_token_cache_hits_total': ('counter', 'API requests whose JWT was already verified (core.authentication)'),
+    'penwise_token_cache_misses_total': ('counter', 'API requests whose JWT had to be verified'),
+    'penwise_log_records_dropped_total': ('counter', 'Log records dropped because the logging queue was full'),
+    'penwise_html_bytes_total': (
+        'counter', 'HTML bytes through HtmlCompressionMiddleware, by stage (original, minified, sent)',
+    ),
+}
+
+
+@contextmanager
+def phase(request, name):
+    """
+    Time a block of work as one phase of the current request.
+
+    Phases end up in the Server-Timing header and in the phase summary. A
+    request that didn't come through ServerTimingMiddleware is left alone.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(request, 'server_timing', None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+class Registry:
+    """
+    This worker's metrics, periodically written to a file of its own.
+
+    Recording only touches in-process dicts under an uncontended lock. A
+    background thread replaces <directory>/<pid>.json with the worker's
+    totals every `flush_interval` seconds when anything changed; collect() merges the files of all workers (including
+    ones that have since exited, so counters never go backwards while the
+    server runs). Without a directory (a single process, e.g. runserver)
+    collect() reports this process only.
+    """
+
+    def __init__(self, directory, flush_interval=1.0):
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self._histograms = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._flusher_pid = None
+
+    def observe(self, name, labels, value):
+        """Add a value to a histogram"""
+        key = (name, labels)
+        index = bisect_left(BUCKETS, value)
+        self._start_flusher()
+        with self._lock:
+            self._dirty = True
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def add(self, name, labels, value):
+        """Add a value to a summary (sum and count only)"""
+        key = (name, labels)
+        self._start_flusher()
+        with self._lock:
+            self._dirty = True
+            entry = self._summaries.get(key)
+            if entry is None:
+                entry = self._summaries[key] = [0.0, 0]
+            entry[0] += value
+            entry[1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            histograms = [
+                [name, list(labels), counts[:], total]
+                for (name, labels), (counts, total) in self._histograms.items()
+            ]
+            summaries = [
+                [name, list(labels), total, count]
+                for (name, labels), (total, count) in self._summaries.items()
+            ]
+        return {'histograms': histograms, 'summaries': summaries, 'counters': collect_counters()}
+
+    def _start_flusher(self):
+        # Threads don't survive fork(), so every worker starts its own
+        if self.directory is None or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def flush(self):
+        if self.directory is None:
+            return
+        self._dirty = False
+        path = self.directory / f'{os.getpid()}.json'
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.snapshot()))
+            os.replace(tmp, path)
+        except OSError:
+            # Metrics must never take a request down with them
+            pass
+
+    def collect(self):
+        """Merge the latest numbers of every worker into one snapshot"""
+        if self.directory is None:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush()
+            snapshots = []
+            for path in sorted(self.directory.glob('*.json')):
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+
+        histograms, summaries, counters = {}, {}, {}
+        for data in snapshots:
+            for name, labels, counts, total in data['histograms']:
+                entry = histograms.setdefault((name, tuple(map(tuple, labels))), [[0] * len(counts), 0.0])
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+            for name, labels, total, count in data['summaries']:
+                entry = summaries.setdefault((name, tuple(map(tuple, labels))), [0.0, 0])
+                entry[0] += total
+                entry[1] += count
+            for name, labels, value in data['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+        return histograms, summaries, counters
+
+
+def collect_counters():
+    """Counters kept by other components, as (name, labels, value)"""
+    from .fragments import fragment_cache
+    from .log import dropped_records
+    from .middleware import compression_stats
+    from .page_cache import page_cache
+
+    html = compression_stats.snapshot()
+    fragments = [
+        [f'penwise_fragment_cache_{counter}_total', [['fragment', name]], stats[counter]]
+        for name, stats in fragment_cache.snapshot().items()
+        for counter in ('hits', 'misses', 'overflows')
+    ]
+    return fragments + [
+        ['penwise_page_cache_hits_total', [], page_cache.hits],
+        ['penwise_page_cache_misses_total', [], page_cache.misses],
+        ['penwise_log_records_dropped_total', [], dropped_records()],
+        ['penwise_html_bytes_total', [['stage', 'original']], html['original_bytes']],
+        ['penwise_html_bytes_total', [['stage', 'minified']], html['minified_bytes']],
+        ['penwise_html_bytes_total', [['stage', 'sent']], html['sent_bytes']],
+    ] + _token_counters()
+
+
+def _token_counters():
+    # Public-site workers (config.settings_public) don't load the API
+    if not apps.is_installed('rest_framework_simplejwt'):
+        return []
+    from .authentication import token_cache
+
+    return [
+        ['penwise_token_cache_hits_total', [], token_cache.hits],
+        ['penwise_token_cache_misses_total', [], token_cache.misses],
+    ]
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_prometheus(histograms, summaries, counters):
+    """Prometheus text exposition format (0.0.4) for merged metrics"""
+    by_name = {}
+    for (name, labels), value in histograms.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), value in summaries.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, series in sorted(by_name.items()):
+        kind, help_text = METRICS.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(series):
+            if kind == 'histogram':
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_label_text(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_label_text(labels)} {total}')
+                lines.append(f'{name}_count{_label_text(labels)} {cumulative}')
+            elif kind == 'summary':
+                total, count = value
+                lines.append(f'{name}_sum{_label_text(labels)} {total}')
+                lines.append(f'{name}_count{_label_text(labels)} {count}')
+            else:
+                lines.append(f'{name}{_label_text(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry(settings.METRICS_DIR, flush_interval=settings.METRICS_FLUSH_INTERVAL)
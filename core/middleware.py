@@ -0,0 +1,453 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .compression import (
+    brotli, brotli_compress, deflate_segment, gzip_compress, gzip_join, minify_html,
+)
+from .metrics import phase, registry
+from .page_cache import CSRF_PLACEHOLDER
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger('penwise.access')
+
+# Bodies smaller than this aren't worth the Content-Encoding header
+MIN_COMPRESS_BYTES = 200
+
+# Page cache bodies are compressed once, so they get the slowest settings.
+# Every other body (admin, API, uncached pages) is compressed per request
+# with these instead.
+PER_REQUEST_GZIP_LEVEL = 6
+PER_REQUEST_BROTLI_QUALITY = 5
+
+# A summary line is logged every this many compressed responses
+STATS_LOG_EVERY = 1000
+
+# Appended to the ETag of a compressed body: each encoding is its own
+# representation, with a strong validator of its own
+ETAG_SUFFIXES = {'br': '-br', 'gzip': '-gz'}
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs natively in sync and async chains alike.
+
+    Django's MiddlewareMixin calls process_request()/process_response()
+    through sync_to_async under ASGI, a thread hop each. Subclasses here
+    promise their hooks never block on I/O or hold the CPU for long, so both
+    are simply called inline; those that may override __acall__.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        return self.process_response(request, await self.get_response(request))
+
+    def process_request(self, request):
+        pass
+
+    def process_response(self, request, response):
+        return response
+
+
+def accepted_encoding(header):
+    """The best encoding the client accepts: 'br', 'gzip' or None"""
+    accepted = set()
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if 'br' in accepted and brotli is not None:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+class BodyCache:
+    """Bounded LRU of derived bodies (minified, compressed) keyed by content hash"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get_or_create(self, key, create):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = create()
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+
+class CompressionStats:
+    """Running byte totals for the HTML this worker has served"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.original_bytes = 0
+        self.minified_bytes = 0
+        self.sent_bytes = 0
+        self.encodings = {'br': 0, 'gzip': 0, 'identity': 0}
+
+    def record(self, original, minified, sent, encoding):
+        with self._lock:
+            self.responses += 1
+            self.original_bytes += original
+            self.minified_bytes += minified
+            self.sent_bytes += sent
+            self.encodings[encoding or 'identity'] += 1
+            return self.responses
+
+    def snapshot(self):
+        with self._lock:
+            original = self.original_bytes or 1
+            return {
+                'responses': self.responses,
+                'original_bytes': self.original_bytes,
+                'minified_bytes': self.minified_bytes,
+                'sent_bytes': self.sent_bytes,
+                'minify_ratio': self.minified_bytes / original,
+                'ratio': self.sent_bytes / original,
+                'encodings': dict(self.encodings),
+            }
+
+
+compression_stats = CompressionStats()
+
+
+class HtmlCompressionMiddleware(HybridMiddleware):
+    """
+    Minify HTML responses and compress them with brotli or gzip.
+
+    Pages from the page cache are minified and compressed at the highest
+    settings once per worker, cached by content hash. Pages from the page
+    cache that carry a per-request CSRF token have their gzip body assembled
+    from cached segments around the token (the token is never compressed
+    together with the page, which also keeps BREACH-style guessing out of
+    reach), and their brotli body compressed per request with faster
+    settings. Any other HTML response (admin, API, uncached pages) is
+    compressed with those faster settings and not cached.
+
+    Under ASGI only bodies already in the cache are served from the event
+    loop; anything that has to be minified or compressed is done in a
+    worker thread.
+
+    A compressed body gets the ETag of the page with the encoding appended
+    ("<hash>-br", "<hash>-gz"). The suffix is taken off If-None-Match on the
+    way in, so the page cache still answers with 304 when the page hasn't
+    changed, and put back on that 304's ETag.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.minify = settings.HTML_MINIFY
+        self.cache = BodyCache(settings.HTML_COMPRESSION_CACHE_ENTRIES)
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        response = await self.get_response(request)
+        if not self._applies(response) or self._cached(request, response):
+            return self.process_response(request, response)
+        return await sync_to_async(self.process_response, thread_sensitive=False)(request, response)
+
+    def _applies(self, response):
+        return not (
+            response.streaming
+            or response.status_code != 200
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith('text/html')
+        )
+
+    def _cached(self, request, response):
+        """Whether process_response() finds the body it would send already in the cache"""
+        if not getattr(response, 'page_cached', False) or getattr(response, 'template_content', None) is not None:
+            return False
+        digest = hashlib.blake2b(response.content, digest_size=16).digest()
+        encoding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding:
+            return (digest, encoding) in self.cache
+        return not self.minify or (digest, 'html') in self.cache
+
+    def process_request(self, request):
+        suffix = ETAG_SUFFIXES.get(accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if suffix and if_none_match and f'{suffix}"' in if_none_match:
+            request.META['HTTP_IF_NONE_MATCH'] = if_none_match.replace(f'{suffix}"', '"')
+            request.etag_suffix = suffix
+
+    def process_response(self, request, response):
+        suffix = getattr(request, 'etag_suffix', None)
+        if response.status_code == 304 and suffix and response.has_header('ETag'):
+            response['ETag'] = self._etag(response['ETag'], suffix)
+        if not self._applies(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        original = len(response.content)
+        encoding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        template = getattr(response, 'template_content', None)
+        with phase(request, 'compress'):
+            if template is not None:
+                body, compressed = self._process_template(template, response.csrf_token.encode(), encoding)
+            elif getattr(response, 'page_cached', False):
+                body, compressed = self._process(response.content, encoding)
+            else:
+                body, compressed = self._process_once(response.content, encoding)
+
+        if len(body) < MIN_COMPRESS_BYTES or (compressed and len(compressed) >= len(body)):
+            encoding, compressed = None, None
+        if body == response.content and not compressed:
+            self._record(request, original, len(body), len(body), None)
+            return response
+
+        response.content = compressed or body
+        response['Content-Length'] = str(len(response.content))
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if encoding and response.has_header('ETag'):
+            response['ETag'] = self._etag(response['ETag'], ETAG_SUFFIXES[encoding])
+        self._record(request, original, len(body), len(response.content), encoding)
+        return response
+
+    @staticmethod
+    def _etag(etag, suffix):
+        # A weak ETag stays weak: W/"<hash>-br"
+        return f'{etag[:-1]}{suffix}"' if etag.endswith('"') else etag
+
+    def _minified(self, digest, content):
+        if not self.minify:
+            return content
+        return self.cache.get_or_create(
+            (digest, 'html'),
+            lambda: minify_html(content.decode(settings.DEFAULT_CHARSET)).encode(settings.DEFAULT_CHARSET),
+        )
+
+    def _process(self, content, encoding):
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        body = self._minified(digest, content)
+        if encoding == 'br':
+            return body, self.cache.get_or_create((digest, 'br'), lambda: brotli_compress(body))
+        if encoding == 'gzip':
+            return body, self.cache.get_or_create((digest, 'gzip'), lambda: gzip_compress(body))
+        return body, None
+
+    def _process_once(self, content, encoding):
+        if self.minify:
+            content = minify_html(content.decode(settings.DEFAULT_CHARSET)).encode(settings.DEFAULT_CHARSET)
+        if encoding == 'br':
+            return content, brotli_compress(content, quality=PER_REQUEST_BROTLI_QUALITY)
+        if encoding == 'gzip':
+            return content, gzip_compress(content, level=PER_REQUEST_GZIP_LEVEL)
+        return content, None
+
+    def _process_template(self, template, token, encoding):
+        digest = hashlib.blake2b(template, digest_size=16).digest()
+        parts = self._minified(digest, template).split(CSRF_PLACEHOLDER.encode())
+        body = token.join(parts)
+        if encoding == 'br':
+            return body, brotli_compress(body, quality=PER_REQUEST_BROTLI_QUALITY)
+        if encoding == 'gzip':
+            segments = self.cache.get_or_create(
+                (digest, 'gzip-segments'),
+                lambda: [
+                    deflate_segment(part, final=index == len(parts) - 1)
+                    for index, part in enumerate(parts)
+                ],
+            )
+            token_segment = deflate_segment(token, level=PER_REQUEST_GZIP_LEVEL)
+            interleaved = [segments[0]]
+            for segment in segments[1:]:
+                interleaved += [token_segment, segment]
+            return body, gzip_join(interleaved, body)
+        return body, None
+
+    def _record(self, request, original, minified, sent, encoding):
+        count = compression_stats.record(original, minified, sent, encoding)
+        logger.debug(
+            '%s %s: %d B -> %d B minified -> %d B %s (%.1f%%)',
+            request.method, request.path, original, minified, sent,
+            encoding or 'identity', 100 * sent / (original or 1),
+        )
+        if count % STATS_LOG_EVERY == 0:
+            stats = compression_stats.snapshot()
+            logger.info(
+                'HTML compression: %d responses, %d B -> %d B sent (%.1f%%, minified %.1f%%), '
+                'body cache %d hits / %d misses',
+                stats['responses'], stats['original_bytes'], stats['sent_bytes'],
+                100 * stats['ratio'], 100 * stats['minify_ratio'], self.cache.hits, self.cache.misses,
+            )
+
+
+class ServerTimingMiddleware(HybridMiddleware):
+    """
+    Time every request, report the phases in a Server-Timing header and
+    record them in core.metrics for the /metrics endpoint.
+
+    Views and middleware add phases with core.metrics.phase(); whatever time
+    isn't covered by a phase is reported as "middleware" (the rest of the
+    middleware stack, URL resolving and view glue). Goes first in
+    MIDDLEWARE so the total covers everything else. The header gives away
+    how the server spends its time, so it is only sent with DEBUG on or to
+    SERVER_TIMING_ALLOWED_IPS; the metrics are recorded for every request.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.allowed_ips = frozenset(settings.SERVER_TIMING_ALLOWED_IPS)
+
+    def process_request(self, request):
+        request.server_timing = {}
+        request.server_timing_started = time.perf_counter()
+
+    def process_response(self, request, response):
+        timings = getattr(request, 'server_timing', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - request.server_timing_started
+        timings['middleware'] = max(total - sum(timings.values()), 0.0)
+
+        match = request.resolver_match
+        route = '/' + match.route if match else 'unmatched'
+        labels = (('route', route), ('template', getattr(request, 'metrics_template', '')))
+        registry.observe('penwise_request_duration_seconds', labels, total)
+        for name, seconds in timings.items():
+            registry.add('penwise_request_phase_seconds', (('phase', name), ('route', route)), seconds)
+        if not response.streaming:
+            registry.add('penwise_response_bytes', labels, len(response.content))
+
+        if not settings.DEBUG and request.META.get('REMOTE_ADDR') not in self.allowed_ips:
+            return response
+        response['Server-Timing'] = ', '.join(
+            [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items()]
+            + [f'total;dur={total * 1000:.2f}']
+        )
+        return response
+
+
+class AccessLogMiddleware(HybridMiddleware):
+    """
+    Log one structured line per request to the penwise.access logger.
+
+    2xx responses are only logged at ACCESS_LOG_SAMPLE_RATE (their lines
+    carry the rate, to scale counts back up); everything else always is,
+    4xx as warnings and 5xx as errors. Turned off by ACCESS_LOG=False.
+    """
+
+    def __init__(self, get_response):
+        if not settings.ACCESS_LOG:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.sample_rate = settings.ACCESS_LOG_SAMPLE_RATE
+
+    def process_request(self, request):
+        request.access_log_started = time.perf_counter()
+
+    def process_response(self, request, response):
+        status = response.status_code
+        if status >= 500:
+            level = logging.ERROR
+        elif status >= 400:
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        sampled = 200 <= status < 300 and self.sample_rate < 1
+        if (sampled and random.random() >= self.sample_rate) or not access_logger.isEnabledFor(level):
+            return response
+
+        match = request.resolver_match
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'route': '/' + match.route if match else None,
+            'status': status,
+            'duration_ms': round((time.perf_counter() - request.access_log_started) * 1000, 2),
+            'bytes': int(response.get('Content-Length', 0)) if response.streaming else len(response.content),
+            'remote': request.META.get('REMOTE_ADDR'),
+        }
+        if sampled:
+            fields['sample_rate'] = self.sample_rate
+        access_logger.log(level, '%s %s %d', request.method, request.path, status, extra={'fields': fields})
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, usable in an async middleware chain as well.
+
+    WhiteNoiseMiddleware is sync-only, which under ASGI would push every
+    request (pages included) through a thread. Looking a file up is a dict
+    access, so the async path does it inline and only awaits the rest of
+    the chain.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -1,3 +1,132 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class ProjectDraft(models.Model):
+    """
+    What a writer has entered in the new-project wizard so far.
+
+    `data` holds one object per wizard step, keyed by the step's slug in
+    core.routes.NEW_PROJECT_STEPS ({'new-project': {...}, 'review-idea': {...}}).
+    Every saved change increments `version`, which is what the API's ETags
+    are made of.
+    """
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='drafts')
+    data = models.JSONField(default=dict)
+    version = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+        indexes = [models.Index(fields=['owner', '-updated_at'])]
+
+    def __str__(self):
+        return f'Draft {self.pk} v{self.version} ({self.owner})'
+
+    @property
+    def etag(self):
+        return f'"{self.pk}.{self.version}"'
+
+
+class Chapter(models.Model):
+    """
+    A chapter of a draft, stored as paragraph-level blocks (see core.chapters).
+
+    `version` counts saved deltas; `words` is kept up to date per delta so
+    listing chapters never reads their text.
+    """
+
+    draft = models.ForeignKey(ProjectDraft, on_delete=models.CASCADE, related_name='chapters')
+    position = models.PositiveIntegerField(default=0)
+    title = models.CharField(max_length=200, blank=True)
+    version = models.PositiveIntegerField(default=0)
+    words = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return self.title or f'Chapter {self.pk}'
+
+    @property
+    def etag(self):
+        return f'"c{self.pk}.{self.version}"'
+
+
+class ChapterBlock(models.Model):
+    """
+    One paragraph of a chapter.
+
+    `key` is chosen by the client and stable across edits; blocks are
+    ordered by `position`, so inserting one between two others only writes
+    the new row. `hash` identifies the text (core.chapters.block_hash).
+    """
+
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='blocks')
+    key = models.CharField(max_length=64)
+    position = models.FloatField()
+    text = models.TextField(blank=True)
+    hash = models.CharField(max_length=16)
+    words = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['chapter', 'key'], name='unique_chapter_block_key')]
+        indexes = [models.Index(fields=['chapter', 'position'])]
+
+
+class ChapterRevision(models.Model):
+    """
+    The delta that took a chapter to `version`, and every so often a
+    compressed snapshot of the whole chapter after it (core.chapters).
+    """
+
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name='revisions')
+    version = models.PositiveIntegerField()
+    delta = models.JSONField(default=list)
+    snapshot = models.BinaryField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['version']
+        constraints = [models.UniqueConstraint(fields=['chapter', 'version'], name='unique_chapter_revision')]
+
+
+class ExportJob(models.Model):
+    """A book export run in the background (core.exports), polled by the client until it is done"""
+
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='export_jobs')
+    draft = models.ForeignKey(ProjectDraft, on_delete=models.CASCADE, related_name='export_jobs')
+    format = models.CharField(max_length=8)
+    status = models.CharField(max_length=8, choices=STATUSES, default=QUEUED)
+    chapters_done = models.PositiveIntegerField(default=0)
+    chapters_total = models.PositiveIntegerField(default=0)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Export {self.pk} ({self.format}, {self.status})'
+
+
+class TokenRevocation(models.Model):
+    """
+    A revoked JWT (by `jti`), or with no jti every token issued to `user`
+    up to `created_at`. Kept until `expires_at`, when the tokens it covers
+    have expired anyway (core.authentication).
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='token_revocations')
+    jti = models.CharField(max_length=64, blank=True)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'Revocation of {self.jti or "all tokens"} ({self.user_id})'
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .assets.dimensions import add_image_hints
+from .metrics import phase
+from .template_files import TemplateWatcher
+from .template_graph import get_template_graph
+
+# Rendered in place of {% csrf_token %} so cached bytes never hold a real
+# token; every hit swaps in a token for the requesting client.
+CSRF_PLACEHOLDER = 'penwise-csrf-placeholder-0f3c9a'
+
+CachedPage = namedtuple('CachedPage', ['content', 'etag', 'has_csrf'])
+
+
+def _freeze(value):
+    """Turn a context value into something hashable for use in a cache key"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _etag(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part)
+    return f'"{digest.hexdigest()}"'
+
+
+class PageCache:
+    """
+    Bounded LRU of rendered pages keyed on (template, context).
+
+    Only context-free pages belong here: everything that varies per request
+    must be part of the context passed in. The CSRF token is the one exception
+    and is handled by substitution. When templates change on disk, only the
+    pages built from them (per core.template_graph) are dropped.
+    """
+
+    def __init__(self, max_entries=256, check_interval=1.0):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._watcher = TemplateWatcher(check_interval)
+        # In-flight async renders, so concurrent misses for a page render it once
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, changed):
+        """Drop the pages rendered from any of the `changed` templates, directly or through extends/include"""
+        affected = get_template_graph().affected(changed)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in affected]:
+                del self._entries[key]
+
+    def check_templates(self):
+        """Drop the pages affected by template edits since the last check (a tree scan when due)"""
+        changed = self._watcher.changes()
+        if changed:
+            self.invalidate(changed)
+
+    def get(self, key):
+        with self._lock:
+            page = self._entries.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def set(self, key, page):
+        with self._lock:
+            self._entries[key] = page
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _cacheable(self, request):
+        return self.max_entries > 0 and request.method in ('GET', 'HEAD')
+
+    def _render_page(self, key, request, template_name, context):
+        # TemplateDoesNotExist propagates exactly as it would from render()
+        content = add_image_hints(render_to_string(
+            template_name, {**context, 'csrf_token': CSRF_PLACEHOLDER}, request
+        )).encode(settings.DEFAULT_CHARSET)
+        page = CachedPage(content, _etag(content), CSRF_PLACEHOLDER.encode() in content)
+        self.set(key, page)
+        return page
+
+    def render(self, request, template_name, context):
+        """Drop-in replacement for django.shortcuts.render() backed by the cache"""
+        request.metrics_template = template_name
+        with phase(request, 'render'):
+            if not self._cacheable(request):
+                return HttpResponse(add_image_hints(render_to_string(template_name, context, request)))
+
+            self.check_templates()
+            key = (template_name, _freeze(context))
+            page = self.get(key)
+            if page is None:
+                page = self._render_page(key, request, template_name, context)
+            return self._respond(request, page)
+
+    async def arender(self, request, template_name, context):
+        """
+        render() for async views.
+
+        Hits are answered without leaving the event loop. A miss renders in
+        a worker thread (context processors may touch the database), and
+        concurrent misses for the same page wait for that one render. The
+        periodic template scan runs in a worker thread too.
+        """
+        request.metrics_template = template_name
+        with phase(request, 'render'):
+            if not self._cacheable(request):
+                content = await sync_to_async(render_to_string)(template_name, context, request)
+                return HttpResponse(add_image_hints(content))
+
+            if self._watcher.due():
+                await sync_to_async(self.check_templates)()
+            key = (template_name, _freeze(context))
+            page = self.get(key)
+            if page is None:
+                pending_key = (asyncio.get_running_loop(), key)
+                pending = self._pending.get(pending_key)
+                if pending is None:
+                    pending = asyncio.ensure_future(
+                        sync_to_async(self._render_page)(key, request, template_name, context)
+                    )
+                    self._pending[pending_key] = pending
+                    pending.add_done_callback(lambda _: self._pending.pop(pending_key, None))
+                # A client going away must not cancel a render others wait for
+                page = await asyncio.shield(pending)
+            return self._respond(request, page)
+
+    def _respond(self, request, page):
+        content, etag = page.content, page.etag
+        if page.has_csrf:
+            token = get_token(request)
+            # The client's copy stays valid for as long as its CSRF cookie does
+            etag = _etag(etag.encode(), request.META.get('CSRF_COOKIE', '').encode())
+
+        response = HttpResponse(content_type=f'text/html; charset={settings.DEFAULT_CHARSET}')
+        response['ETag'] = etag
+        # Tells HtmlCompressionMiddleware the body repeats, so its work is worth caching
+        response.page_cached = True
+        if page.has_csrf:
+            patch_vary_headers(response, ('Cookie',))
+        conditional = get_conditional_response(request, etag=etag, response=response)
+        if conditional is not response:
+            return conditional
+
+        if page.has_csrf:
+            # Kept so HtmlCompressionMiddleware can reuse work across clients
+            response.template_content = content
+            response.csrf_token = token
+            content = content.replace(CSRF_PLACEHOLDER.encode(), token.encode())
+        response.content = content
+        return response
+
+page_cache = PageCache(
+    max_entries=settings.PAGE_CACHE_MAX_ENTRIES,
+    check_interval=settings.TEMPLATE_CHECK_INTERVAL,
+)
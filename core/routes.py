@@ -0,0 +1,125 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .template_files import TemplateWatcher, page_templates
+
+# Mapping of step numbers to template names
+NEW_PROJECT_STEPS = {
+    1: 'new-project',
+    2: 'review-idea',
+    3: 'narrative-development',
+    4: 'detailed-plan',
+    5: 'chapter-view',
+    6: 'export',  # You may need to create this template
+}
+
+STEP_NAMES = {
+    1: 'Idea',
+    2: 'Review Idea',
+    3: 'Story Draft',
+    4: 'Detailed Plan',
+    5: 'Create Chapter',
+    6: 'Export',
+}
+
+# Dashboard pages highlight their entry in the sidebar via active_page
+DASHBOARD_PAGES = {
+    'dashboard': 'dashboard',
+    'project-list': 'project-list',
+    'new-project': 'new-project',
+    'your-plan': 'your-plan',
+    'ambassador-affiliate': 'ambassador-affiliate',
+    'settings': 'settings',
+}
+
+Route = namedtuple('Route', ['template_name', 'active_page'])
+
+
+def step_context(step):
+    """Template context for a new project wizard step"""
+    return {
+        'active_page': 'new-project',
+        'current_step': step,
+        'total_steps': len(NEW_PROJECT_STEPS),
+        'step_names': STEP_NAMES,
+    }
+
+
+def page_context(page_key):
+    """Template context for a page served by render_page"""
+    return {
+        'active_page': DASHBOARD_PAGES.get(page_key, '')
+    }
+
+
+class RouteIndex:
+    """
+    Immutable slug -> Route lookup for render_page, built from one scan of the templates.
+
+    Each page template `foo_bar.html` answers to `foo_bar` and `foo_bar.html`.
+    A slug with hyphens that is not a page itself is retried with the hyphens
+    replaced by underscores, so `/foo-bar/` also reaches `foo_bar.html`.
+    """
+
+    def __init__(self, template_names):
+        routes = {}
+        for template_name in template_names:
+            slug = template_name[:-len('.html')]
+            route = Route(template_name, page_context(slug)['active_page'])
+            routes[slug] = route
+            routes[template_name] = route
+        self._routes = MappingProxyType(routes)
+
+    def __len__(self):
+        return len(self._routes) // 2
+
+    def __iter__(self):
+        """Yield (slug, Route) for every page, without the .html aliases"""
+        for slug, route in self._routes.items():
+            if not slug.endswith('.html'):
+                yield slug, route
+
+    def resolve(self, page_name):
+        """Return the Route for a requested slug, or None if no page serves it"""
+        route = self._routes.get(page_name)
+        if route is None and '-' in page_name:
+            route = self._routes.get(page_name.replace('-', '_'))
+        return route
+
+
+_route_index = None
+_watcher = None
+
+
+def get_route_index():
+    """Return the current RouteIndex, rebuilding it when the template tree changes"""
+    global _route_index, _watcher
+    if _watcher is None:
+        _watcher = TemplateWatcher(settings.TEMPLATE_CHECK_INTERVAL)
+    if _route_index is None or _watcher.changed():
+        _route_index = RouteIndex(page_templates())
+    return _route_index
+
+
+async def aget_route_index():
+    """get_route_index() for async views: when the tree is due a scan, it is scanned in a worker thread"""
+    if _route_index is None or _watcher.due():
+        return await sync_to_async(get_route_index)()
+    return _route_index
+
+
+def public_routes():
+    """
+    Every URL served by render_page and new_project_step.
+
+    Yields (url path, template name, context) triples, the same template and
+    context the views would render for that URL.
+    """
+    for slug, route in get_route_index():
+        path = '/' if slug == 'index' else f'/{slug}/'
+        yield path, route.template_name, {'active_page': route.active_page}
+    for step, slug in NEW_PROJECT_STEPS.items():
+        yield f'/new-projects/{step}/', f'{slug}.html', step_context(step)
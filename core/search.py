@@ -0,0 +1,392 @@
+"""
+Site-wide search over the public content pages.
+
+`manage.py build_search_index` renders every page routed by render_page,
+extracts its text and writes a compact binary index to SEARCH_INDEX_PATH.
+Workers memory-map that file read-only, so every gunicorn process shares the
+one copy in the OS page cache instead of each holding the index in its own
+heap. /search ranks pages with BM25 and cuts a snippet around the first
+match.
+
+File layout (little-endian):
+
+    header    magic, version, document count, word count, average document
+              length and the offsets of the sections below
+    documents one DOC entry per page: url, title and text as (offset,
+              length) into the strings section, plus the length in words
+    words     one WORD entry per distinct word, sorted: the word as
+              (offset, length) into the strings section, how many pages
+              contain it, and where its postings start
+    postings  one POSTING entry per (word, page): page number, how often the
+              word occurs there and the byte offset of its first occurrence
+              in the page text
+    strings   UTF-8 bytes referenced from the sections above
+"""
+
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import namedtuple
+from html.parser import HTMLParser
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.template.loader import render_to_string
+
+from .glossary import tokenize
+from .routes import get_route_index
+from .template_graph import get_template_graph
+
+MAGIC = b'PWSI'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIfIIII')
+DOC = struct.Struct('<7I')
+WORD = struct.Struct('<4I')
+POSTING = struct.Struct('<3I')
+
+# Extracted documents, keyed by template, for incremental rebuilds
+DOCUMENTS_NAME = 'documents.json'
+
+# Bumped whenever extraction changes, so cached documents are re-extracted
+EXTRACTOR_VERSION = 1
+
+# Pages built on these layouts are app screens behind a login, not content
+EXCLUDED_LAYOUTS = {'dashboard_base.html'}
+
+# Markup that isn't page content: site chrome and non-text elements
+SKIPPED_TAGS = {'nav', 'footer', 'header', 'script', 'style', 'noscript', 'template', 'svg', 'button', 'form'}
+SKIPPED_IDS = {'mobileMenu', 'mobileMenuOverlay'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# A Tailwind class that shows an element hidden by default at some breakpoint
+RESPONSIVE_DISPLAY_RE = re.compile(r'^[\w-]+:(?:block|inline|inline-block|flex|inline-flex|grid|table)$')
+
+# Characters of context on either side of the first match in a snippet
+SNIPPET_RADIUS = 80
+
+Document = namedtuple('Document', ['url', 'title', 'text'])
+Hit = namedtuple('Hit', ['url', 'title', 'snippet', 'score'])
+
+
+class TextExtractor(HTMLParser):
+    """The title and visible body text of a rendered page, without the navigation and footer"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ''
+        self.parts = []
+        self._skipping = []
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'title':
+            self._in_title = True
+        elif self._skipping or tag in SKIPPED_TAGS or self._hidden(dict(attrs)):
+            if tag not in VOID_TAGS:
+                self._skipping.append(tag)
+
+    @staticmethod
+    def _hidden(attrs):
+        """Whether an element is never shown: the mobile menu, or hidden (e.g. a "no results" message)"""
+        if 'hidden' in attrs or attrs.get('id') in SKIPPED_IDS:
+            return True
+        classes = (attrs.get('class') or '').split()
+        return 'hidden' in classes and not any(RESPONSIVE_DISPLAY_RE.match(name) for name in classes)
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        elif self._skipping and tag in self._skipping:
+            # Pop back to the matching start tag, forgiving unclosed children
+            while self._skipping.pop() != tag:
+                pass
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skipping:
+            self.parts.append(data)
+
+    def text(self):
+        return ' '.join(' '.join(self.parts).split())
+
+
+def extract(html):
+    """(title, text) of a rendered page"""
+    parser = TextExtractor()
+    parser.feed(html)
+    parser.close()
+    # "Literary Glossary | Penwise" -> "Literary Glossary"
+    title = ' '.join(parser.title.split()).rsplit(' | ', 1)[0]
+    return title, parser.text()
+
+
+def searchable_pages(graph):
+    """(url, template name) for every page served by render_page, app screens excepted"""
+    for slug, route in get_route_index():
+        if graph.requires(route.template_name) & EXCLUDED_LAYOUTS:
+            continue
+        yield ('/' if slug == 'index' else f'/{slug}/'), route.template_name
+
+
+def write_index(path, documents):
+    """Write `documents` (a list of Document) to `path` in the binary index format"""
+    strings = bytearray()
+
+    def add_string(value):
+        data = value.encode('utf-8')
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    postings = {}
+    doc_entries = []
+    total_length = 0
+    for doc_id, document in enumerate(documents):
+        url = add_string(document.url)
+        title = add_string(document.title)
+        text_offset, text_length = add_string(document.text)
+        words = 0
+        # Titles count as part of the page, so "glossary" finds the glossary
+        for word in tokenize(document.title):
+            words += 1
+            postings.setdefault(word, {}).setdefault(doc_id, [0, None])[0] += 1
+        # Byte offsets are tracked as we go, for the snippet around a first match
+        position = byte_position = 0
+        for match in re.finditer(r'\S+', document.text):
+            byte_position += len(document.text[position:match.start()].encode('utf-8'))
+            position = match.start()
+            for word in tokenize(match.group(0)):
+                words += 1
+                entry = postings.setdefault(word, {}).setdefault(doc_id, [0, None])
+                if entry[1] is None:
+                    entry[1] = byte_position
+                entry[0] += 1
+        total_length += words
+        doc_entries.append((*url, *title, text_offset, text_length, words))
+
+    word_entries = []
+    posting_bytes = bytearray()
+    for word in sorted(postings):
+        offset, length = add_string(word)
+        word_entries.append((offset, length, len(postings[word]), len(posting_bytes) // POSTING.size))
+        for doc_id, (frequency, first) in sorted(postings[word].items()):
+            # A word only found in the title gets a snippet from the start of the page
+            posting_bytes.extend(POSTING.pack(doc_id, frequency, first or 0))
+
+    docs_offset = HEADER.size
+    words_offset = docs_offset + DOC.size * len(doc_entries)
+    postings_offset = words_offset + WORD.size * len(word_entries)
+    strings_offset = postings_offset + len(posting_bytes)
+    average_length = total_length / len(documents) if documents else 0.0
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(
+            MAGIC, VERSION, len(doc_entries), len(word_entries), average_length,
+            docs_offset, words_offset, postings_offset, strings_offset,
+        ))
+        for entry in doc_entries:
+            f.write(DOC.pack(*entry))
+        for entry in word_entries:
+            f.write(WORD.pack(*entry))
+        f.write(posting_bytes)
+        f.write(strings)
+    # Workers that still have the old file mapped keep reading it until they reopen
+    os.replace(tmp, path)
+    return path.stat().st_size
+
+
+def build(stdout, path=None, force=False):
+    """
+    Extract the text of every content page and write the search index.
+
+    Only pages whose template, or a template it extends or includes,
+    changed since the last build are rendered again; the others are taken
+    from documents.json next to the index. Raises CommandError naming the
+    pages that fail to render, leaving the previous index in place.
+    """
+    path = Path(path or settings.SEARCH_INDEX_PATH)
+    cache_path = path.parent / DOCUMENTS_NAME
+    try:
+        previous = json.loads(cache_path.read_text())
+    except (FileNotFoundError, ValueError):
+        previous = {}
+
+    graph = get_template_graph(rebuild=True)
+    cache, failures = {}, []
+    extracted = 0
+    for url, template_name in searchable_pages(graph):
+        key = f'{EXTRACTOR_VERSION}:{graph.fingerprint(template_name)}'
+        entry = previous.get(template_name)
+        if force or not entry or entry['hash'] != key or entry['url'] != url:
+            try:
+                html = render_to_string(template_name, {'active_page': '', 'csrf_token': 'NOTPROVIDED'})
+            except Exception as exc:
+                failures.append(f'{template_name} ({exc})')
+                continue
+            title, text = extract(html)
+            entry = {'hash': key, 'url': url, 'title': title, 'text': text}
+            extracted += 1
+            stdout.write(f'  {template_name}: {len(text.split()):,} words')
+        cache[template_name] = entry
+    if failures:
+        raise CommandError(f"{len(failures)} page(s) failed to render: {', '.join(failures)}")
+
+    documents = [
+        Document(entry['url'], entry['title'], entry['text'])
+        for template_name, entry in sorted(cache.items())
+    ]
+    size = write_index(path, documents)
+    cache_path.write_text(json.dumps(cache, indent=1) + '\n')
+    stdout.write(
+        f'Search index: {len(documents)} pages ({extracted} extracted, '
+        f'{len(documents) - extracted} unchanged), {size:,} B'
+    )
+    return path
+
+
+class SearchIndex:
+    """
+    Read-only view of an index file written by write_index().
+
+    Nothing is loaded up front: words are found by binary search over the
+    mapped word table and postings, titles and text are read straight from
+    the mapping.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic, version, self.doc_count, self.word_count, self.average_length,
+            self._docs_at, self._words_at, self._postings_at, self._strings_at,
+        ) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f'{self.path} is not a search index this version can read')
+
+    def __len__(self):
+        return self.doc_count
+
+    def close(self):
+        self._map.close()
+
+    def _string(self, offset, length):
+        start = self._strings_at + offset
+        return self._map[start:start + length]
+
+    def _document(self, doc_id):
+        return DOC.unpack_from(self._map, self._docs_at + doc_id * DOC.size)
+
+    def _postings(self, word):
+        """[(doc id, frequency, first offset)] for `word`, or [] if no page contains it"""
+        target = word.encode('utf-8')
+        low, high = 0, self.word_count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, count, start = WORD.unpack_from(self._map, self._words_at + middle * WORD.size)
+            candidate = self._string(offset, length)
+            if candidate < target:
+                low = middle + 1
+            elif candidate > target:
+                high = middle
+            else:
+                base = self._postings_at + start * POSTING.size
+                return [POSTING.unpack_from(self._map, base + i * POSTING.size) for i in range(count)]
+        return []
+
+    def snippet(self, doc_id, first):
+        """About SNIPPET_RADIUS characters of a page's text either side of byte offset `first`"""
+        text_offset, text_length = self._document(doc_id)[4:6]
+        # Up to 4 bytes a character; a character cut in half is dropped
+        start = max(0, first - SNIPPET_RADIUS * 4)
+        end = min(text_length, first + SNIPPET_RADIUS * 4)
+        before = self._string(text_offset + start, first - start).decode('utf-8', errors='ignore')
+        after = self._string(text_offset + first, end - first).decode('utf-8', errors='ignore')
+
+        head = before[-SNIPPET_RADIUS:]
+        if start > 0 or len(head) < len(before):
+            # Don't start in the middle of a word
+            head = '… ' + (head.partition(' ')[2] if ' ' in head else head)
+        tail = after[:SNIPPET_RADIUS]
+        if end < text_length or len(tail) < len(after):
+            tail = (tail.rpartition(' ')[0] or tail) + ' …'
+        return (head + tail).strip()
+
+    def search(self, query, offset=0, limit=10):
+        """
+        Pages matching any word of `query`, best BM25 score first.
+
+        Returns (total number of matching pages, Hit list from `offset` to
+        `offset + limit`).
+        """
+        scores = {}
+        first_match = {}
+        for word in dict.fromkeys(tokenize(query)):
+            postings = self._postings(word)
+            if not postings:
+                continue
+            idf = math.log(1 + (self.doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency, first in postings:
+                length = self._document(doc_id)[6]
+                norm = K1 * (1 - B + B * length / (self.average_length or 1))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+                first_match[doc_id] = min(first, first_match.get(doc_id, first))
+
+        ranked = sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+        hits = []
+        for doc_id in ranked[offset:offset + limit]:
+            url_offset, url_length, title_offset, title_length = self._document(doc_id)[:4]
+            hits.append(Hit(
+                url=self._string(url_offset, url_length).decode('utf-8'),
+                title=self._string(title_offset, title_length).decode('utf-8'),
+                snippet=self.snippet(doc_id, first_match[doc_id]),
+                score=round(scores[doc_id], 4),
+            ))
+        return len(ranked), hits
+
+
+_index = None
+_index_mtime = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_search_index():
+    """
+    The SearchIndex at SEARCH_INDEX_PATH, or None if it hasn't been built.
+
+    The file is checked for a rebuild at most every SEARCH_INDEX_CHECK_INTERVAL
+    seconds and reopened when it was replaced.
+    """
+    global _index, _index_mtime, _checked_at
+    interval = settings.SEARCH_INDEX_CHECK_INTERVAL
+    now = time.monotonic()
+    if _index is not None and (interval <= 0 or now - _checked_at < interval):
+        return _index
+    with _lock:
+        _checked_at = now
+        path = Path(settings.SEARCH_INDEX_PATH)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            _index = _index_mtime = None
+            return None
+        if _index is None or mtime != _index_mtime:
+            # The replaced mapping stays valid for requests still using it
+            _index, _index_mtime = SearchIndex(path), mtime
+        return _index
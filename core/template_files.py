@@ -0,0 +1,121 @@
+import os
+import re
+import time
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+EXTENDS_RE = re.compile(r"""{%\s*extends\s+["']([^"']+)["']\s*%}""")
+
+
+def template_dirs():
+    """Return the template directories configured in settings.TEMPLATES"""
+    dirs = []
+    for backend in settings.TEMPLATES:
+        dirs.extend(Path(d) for d in backend.get('DIRS', []))
+    return dirs
+
+
+def iter_template_files():
+    """Yield (template name, absolute path) for every .html file under the template dirs"""
+    for root in template_dirs():
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith('.html'):
+                    path = Path(dirpath) / filename
+                    yield path.relative_to(root).as_posix(), path
+
+
+def page_templates():
+    """
+    Names of the top-level templates that render_page can serve as pages.
+
+    Layouts such as base.html are routable too, but they are only ever
+    meant to be extended, so anything that another template extends is left out.
+    """
+    names = []
+    extended = set()
+    for name, path in iter_template_files():
+        extended.update(EXTENDS_RE.findall(path.read_text(encoding='utf-8')))
+        if '/' not in name:
+            names.append(name)
+    return [name for name in names if name not in extended]
+
+
+def templates_signature():
+    """Fingerprint of the template tree: {template name: (mtime, size)}"""
+    entries = {}
+    for name, path in iter_template_files():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries[name] = (stat.st_mtime_ns, stat.st_size)
+    return entries
+
+
+_scan_lock = threading.Lock()
+_scan = (0.0, None)
+
+
+def shared_signature(max_age):
+    """templates_signature(), reused while it is less than `max_age` seconds old: watchers share one scan"""
+    global _scan
+    with _scan_lock:
+        scanned_at, signature = _scan
+        now = time.monotonic()
+        if signature is None or now - scanned_at >= max_age:
+            _scan = (now, templates_signature())
+        return _scan[1]
+
+
+class TemplateWatcher:
+    """
+    Reports which templates changed since the last check.
+
+    Stat-ing every template on each request would defeat the point of caching,
+    so the tree is only re-scanned once every `interval` seconds, and the
+    watchers of a process (page cache, fragments, routes) share that scan.
+    An interval of 0 or less disables the check entirely (templates are
+    fixed at deploy).
+    When something changed, the template graph (core.template_graph) is
+    brought up to date here, before anyone asks it what the change affects.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._signature = shared_signature(interval) if interval > 0 else None
+        self._checked_at = time.monotonic()
+
+    def due(self):
+        """Whether the next changes() re-scans the tree (async callers run that in a thread)"""
+        return self.interval > 0 and time.monotonic() - self._checked_at >= self.interval
+
+    def changed(self):
+        return bool(self.changes())
+
+    def changes(self):
+        """Names of the templates edited, added or removed since the last check (empty set if none)"""
+        if self.interval <= 0:
+            return set()
+        now = time.monotonic()
+        if now - self._checked_at < self.interval:
+            return set()
+        with self._lock:
+            if now - self._checked_at < self.interval:
+                return set()
+            self._checked_at = now
+            signature = shared_signature(self.interval)
+            changed = {
+                name for name in signature.keys() | self._signature.keys()
+                if signature.get(name) != self._signature.get(name)
+            }
+            self._signature = signature
+            if changed:
+                from .template_graph import get_template_graph
+
+                get_template_graph(signature=signature)
+            return changed
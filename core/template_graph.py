@@ -0,0 +1,204 @@
+"""
+Which templates each template is built from, and so which pages an edit affects.
+
+Every template under the template dirs is compiled (from source, bypassing
+the cached loader, so the graph always matches what is on disk) and its
+node tree is searched for:
+
+    {% extends 'base.html' %}                        extends
+    {% include 'includes/navbar.html' %}             include
+    {% glossary_group 'A' %}                         tag (inclusion tags, and
+    {% cached_include 'includes/footer.html' %}      tags whose node or function
+                                                     declares `template_names`)
+    {% glossary_letters as letters %}                data (tags whose node or
+                                                     function declares `data_files`)
+
+A template that can't be compiled falls back to a regex scan for extends and
+include. An include whose name is only known at render time makes the
+template depend on every template.
+"""
+
+import hashlib
+import re
+import threading
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.template.base import Node
+from django.template.library import InclusionNode
+from django.template.loader_tags import ExtendsNode, IncludeNode
+
+from .template_files import EXTENDS_RE, iter_template_files, templates_signature
+
+INCLUDE_RE = re.compile(r"""{%\s*include\s+["']([^"']+)["']""")
+
+# Stands for "any template" in the dependencies of a dynamic include
+ANY = '*'
+
+
+def _constant(expression):
+    """The template name a FilterExpression stands for, or None if it is only known at render time"""
+    if expression.filters or not isinstance(expression.var, str):
+        return None
+    return expression.var
+
+
+def template_dependencies(source, engine=None):
+    """
+    {template name: kind} of everything a template's source renders.
+
+    Raises TemplateSyntaxError if the source doesn't compile.
+    """
+    engine = engine or engines['django'].engine
+    nodelist = engine.from_string(source).nodelist
+    dependencies = {}
+    for node in nodelist.get_nodes_by_type(ExtendsNode):
+        dependencies[_constant(node.parent_name) or ANY] = 'extends'
+    for node in nodelist.get_nodes_by_type(IncludeNode):
+        dependencies.setdefault(_constant(node.template) or ANY, 'include')
+    for node in nodelist.get_nodes_by_type(InclusionNode):
+        if isinstance(node.filename, str):
+            dependencies.setdefault(node.filename, 'tag')
+    for node in nodelist.get_nodes_by_type(Node):
+        # Tags that render templates themselves say so with template_names,
+        # on the node or, for simple tags, on the tag function
+        names = getattr(node, 'template_names', None) or getattr(getattr(node, 'func', None), 'template_names', ())
+        for name in names:
+            dependencies.setdefault(name, 'tag')
+        # Likewise data_files, for tags that render from a data file
+        paths = getattr(node, 'data_files', None) or getattr(getattr(node, 'func', None), 'data_files', ())
+        for path in paths:
+            dependencies.setdefault(data_name(path), 'data')
+    return dependencies
+
+
+def data_name(path):
+    """How the graph names a data file: its path relative to BASE_DIR"""
+    return Path(path).resolve().relative_to(settings.BASE_DIR).as_posix()
+
+
+def scan_dependencies(source):
+    """template_dependencies() for source that doesn't compile: extends and include only"""
+    dependencies = {name: 'extends' for name in EXTENDS_RE.findall(source)}
+    for name in INCLUDE_RE.findall(source):
+        dependencies.setdefault(name, 'include')
+    return dependencies
+
+
+class TemplateGraph:
+    """
+    Dependency graph of the project templates.
+
+    `edges` maps each template name to {dependency name: kind}; the kind
+    (extends, include, tag or data) is informational. Templates that failed
+    to compile are listed in `errors` with the message. `signature` is the
+    templates_signature() of the tree the graph was built from.
+    """
+
+    def __init__(self, edges, paths=None, errors=None, signature=None):
+        self.edges = edges
+        self.paths = paths or {}
+        self.errors = errors or {}
+        self.signature = signature
+        self.dependents = {}
+        for name, dependencies in edges.items():
+            for dependency in dependencies:
+                self.dependents.setdefault(dependency, set()).add(name)
+
+    @classmethod
+    def build(cls, signature=None):
+        # Taken first: an edit made while building shows up as a change next time
+        signature = signature if signature is not None else templates_signature()
+        engine = engines['django'].engine
+        edges, paths, errors = {}, {}, {}
+        for name, path in iter_template_files():
+            source = path.read_text(encoding='utf-8')
+            paths[name] = path
+            try:
+                edges[name] = template_dependencies(source, engine)
+            except TemplateSyntaxError as exc:
+                errors[name] = str(exc)
+                edges[name] = scan_dependencies(source)
+            for dependency, kind in edges[name].items():
+                if kind == 'data':
+                    paths[dependency] = Path(settings.BASE_DIR) / dependency
+        return cls(edges, paths, errors, signature)
+
+    def __contains__(self, name):
+        return name in self.edges
+
+    def __len__(self):
+        return len(self.edges)
+
+    def requires(self, name):
+        """Every template `name` is rendered from, directly or not (without itself)"""
+        seen = set()
+        queue = deque([name])
+        while queue:
+            for dependency in self.edges.get(queue.popleft(), ()):
+                if dependency == ANY:
+                    return set(self.edges) - {name}
+                if dependency not in seen:
+                    seen.add(dependency)
+                    queue.append(dependency)
+        seen.discard(name)
+        return seen
+
+    def affected(self, changed):
+        """
+        Every template whose output can change when the templates in `changed` do.
+
+        The changed templates themselves are included, as are templates
+        depending on ones that no longer exist (a deleted include).
+        """
+        affected = set(changed)
+        queue = deque(affected)
+        while queue:
+            for dependent in self.dependents.get(queue.popleft(), ()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    queue.append(dependent)
+        if changed:
+            # Dynamic includes can pull in anything
+            affected.update(self.dependents.get(ANY, ()))
+        return affected
+
+    def fingerprint(self, name):
+        """
+        Hash of a template's source and of everything it is rendered from.
+
+        Changes exactly when affected() would report the template, so a
+        stored fingerprint tells whether a page built from it is stale.
+        """
+        digest = hashlib.sha256()
+        for dependency in sorted(self.requires(name) | {name}):
+            path = self.paths.get(dependency)
+            digest.update(dependency.encode() + b'\0')
+            if path is not None:
+                try:
+                    digest.update(path.read_bytes())
+                except FileNotFoundError:
+                    pass
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+
+_graph = None
+_lock = threading.Lock()
+
+
+def get_template_graph(rebuild=False, signature=None):
+    """
+    The TemplateGraph of the template tree, built on first use or when `rebuild` is set.
+
+    With a `signature` (a templates_signature()) it is also rebuilt if it was
+    built from a different tree, so every TemplateWatcher that sees the same
+    edit shares one rebuild.
+    """
+    global _graph
+    with _lock:
+        if _graph is None or rebuild or (signature is not None and signature != _graph.signature):
+            _graph = TemplateGraph.build(signature)
+        return _graph
@@ -0,0 +1,196 @@
+from django import template
+from django.conf import settings
+from django.forms.utils import flatatt
+from django.template.base import TextNode
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from core.assets import critical, css, dimensions, images, js
+
+register = template.Library()
+
+
+def _srcset(variants):
+    return ', '.join(f"{static(variant['path'])} {variant['width']}w" for variant in variants)
+
+
+@register.simple_tag
+def responsive_image(path, alt='', sizes='100vw', **attrs):
+    """
+    Render a static image as <picture> with AVIF/WebP sources from the responsive image manifest.
+
+    Extra keyword arguments become <img> attributes, with underscores turned
+    into hyphens (data_aos='fade-up' -> data-aos="fade-up"). Images missing
+    from the manifest fall back to a plain <img>.
+
+        {% responsive_image 'assets/image/hero/dashbaord.png' alt='Dashboard' sizes='(min-width: 1280px) 1280px, 100vw' class='w-full' %}
+    """
+    entry = images.load_manifest().get(path)
+    img_attrs = {'src': static(path), 'alt': alt}
+    size = entry or dimensions.lookup(path)
+    if size:
+        img_attrs['width'] = size['width']
+        img_attrs['height'] = size['height']
+    img_attrs.update((name.replace('_', '-'), value) for name, value in attrs.items())
+    img = format_html('<img{}>', flatatt(img_attrs))
+    if not entry:
+        return img
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (images.MIME_TYPES[fmt], _srcset(variants), sizes)
+            for fmt, variants in entry['variants'].items() if variants
+        ),
+    )
+    return format_html('<picture>{}{}</picture>', sources, img)
+
+
+@register.simple_tag
+def responsive_background(path, width=None):
+    """
+    CSS image-set() value for a static image, for use as a background-image.
+
+    image-set() can't pick by viewport width, so the value itself offers the
+    widest variant (or the widest up to `width`) in each format. It is
+    followed by a custom property per RESPONSIVE_IMAGE_WIDTHS breakpoint
+    holding the variants for that width, which the compiled stylesheet
+    (images.background_rules) switches between with media queries. Each
+    image-set() lists a 1x variant and, where a wider one exists, a 2x
+    variant of twice the width for high-density screens.
+    Declare a plain url() background first as the fallback for browsers
+    without image-set():
+
+        background-image: url(...);
+        background-image: {% responsive_background 'assets/image/hero/hero2.png' %};
+    """
+    entry = images.load_manifest().get(path)
+    original = (static(path), images.MIME_TYPES.get(path.rsplit('.', 1)[-1].lower(), 'image/png'))
+    formats = [
+        (fmt, variants, [v for v in variants if width is None or v['width'] <= int(width)] or variants[:1])
+        for fmt, variants in (entry['variants'].items() if entry else ())
+        if variants
+    ]
+
+    def covering(variants, target):
+        # The narrowest variant at least `target` wide, else the widest there is
+        return next((v for v in variants if v['width'] >= target), variants[-1])
+
+    def image_set(breakpoint=None):
+        options = []
+        for fmt, variants, allowed in formats:
+            mime = images.MIME_TYPES[fmt]
+            single = covering(allowed, breakpoint) if breakpoint else allowed[-1]
+            options.append(f'url("{static(single["path"])}") 1x type("{mime}")')
+            target = breakpoint or single['width']
+            if width is not None:
+                target = min(target, int(width))
+            double = covering(variants, 2 * target)
+            if double['width'] > single['width']:
+                options.append(f'url("{static(double["path"])}") 2x type("{mime}")')
+        options.append(f'url("{original[0]}") type("{original[1]}")')
+        return 'image-set(' + ', '.join(options) + ')'
+
+    value = image_set()
+    if formats:
+        value += ''.join(
+            f'; {images.BACKGROUND_PROPERTY}-{breakpoint}: {image_set(breakpoint)}'
+            for breakpoint in sorted(settings.RESPONSIVE_IMAGE_WIDTHS)
+        )
+    # Deliberately not marked safe: autoescaping turns the quotes into
+    # &quot;, which is what an inline style attribute needs.
+    return value
+
+
+@register.simple_tag(takes_context=True)
+def site_stylesheet(context):
+    """
+    Stylesheet markup for the page being rendered.
+
+    Pages with extracted critical CSS get it inlined, and the full stylesheet
+    is loaded without blocking first paint; other pages get a plain <link>.
+    Until `manage.py build_assets css` has run, this falls back to the
+    Tailwind CDN runtime plus style.css.
+    """
+    manifest = css.load_manifest()
+    if not manifest:
+        return render_to_string('includes/tailwind_cdn.html')
+    href = static(manifest['stylesheet'])
+    template_name = context.template.name if context.template else None
+    critical_css = critical.load_critical_css(template_name) if template_name else None
+    if critical_css is None:
+        return format_html('<link rel="stylesheet" href="{}" />', href)
+    return format_html(
+        '<style>{}</style>\n'
+        '    <link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'" />\n'
+        '    <noscript><link rel="stylesheet" href="{}" /></noscript>',
+        # "</" can't appear inside <style>; "<\/" means the same thing to CSS
+        mark_safe(critical_css.replace('</', '<\\/')), href, href,
+    )
+
+
+# Rendered by the tag itself, for the template dependency graph (core.template_graph)
+site_stylesheet.template_names = ('includes/tailwind_cdn.html',)
+
+
+@register.simple_tag(takes_context=True)
+def page_scripts(context):
+    """
+    <script defer> tags for the parts of script.js the page being rendered uses.
+
+    `manage.py build_assets js` decides which feature chunks each page
+    needs; pages it didn't render get the whole (minified) script. Until the
+    step has run, this falls back to the unminified script.js.
+    """
+    manifest = js.load_manifest()
+    if not manifest:
+        paths = [js.SOURCE]
+    else:
+        template_name = context.template.name if context.template else None
+        chunks = manifest['pages'].get(template_name)
+        paths = [manifest['chunks'][name] for name in chunks] if chunks is not None else [manifest['script']]
+    return format_html_join('\n    ', '<script defer src="{}"></script>', ((static(path),) for path in paths))
+
+
+class ScriptNode(template.Node):
+    def __init__(self, nodelist, blocking=False):
+        self.nodelist = nodelist
+        self.blocking = blocking
+        # Only blocks of plain text can be served from a file
+        texts = [node.s for node in nodelist if isinstance(node, TextNode)]
+        self.key = js.source_key(''.join(texts)) if len(texts) == len(nodelist) else None
+
+    def render(self, context):
+        path = js.load_manifest().get('inline', {}).get(self.key) if self.key else None
+        if path:
+            tag = '<script src="{}"></script>' if self.blocking else '<script defer src="{}"></script>'
+            return format_html(tag, static(path))
+        return format_html('<script>{}</script>', mark_safe(self.nodelist.render(context)))
+
+
+@register.tag
+def script(parser, token):
+    """
+    An inline script that `manage.py build_assets js` moves into a cacheable file.
+
+    Once built, the block renders as <script defer src="...">, so it runs
+    after the document has been parsed (DOMContentLoaded listeners still
+    fire). Until then, or if the block uses template syntax, it is rendered
+    inline as before.
+
+        {% script %}
+          document.addEventListener('DOMContentLoaded', function() { ... });
+        {% endscript %}
+
+    `{% script blocking %}` renders a plain <script src="...">, which runs
+    where it stands, for code later markup relies on (e.g. the functions
+    of inline onclick handlers, defined in <head>).
+    """
+    bits = token.split_contents()
+    if bits[1:] not in ([], ['blocking']):
+        raise template.TemplateSyntaxError(f"Usage: {{% {bits[0]} [blocking] %}}")
+    nodelist = parser.parse(('endscript',))
+    parser.delete_first_token()
+    return ScriptNode(nodelist, blocking=len(bits) == 2)
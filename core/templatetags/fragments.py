@@ -0,0 +1,49 @@
+from django import template
+from django.template.base import token_kwargs
+
+from core.fragments import FRAGMENTS, fragment_cache
+
+register = template.Library()
+
+
+class CachedIncludeNode(template.Node):
+    def __init__(self, template_name, extra_context):
+        self.template_name = template_name
+        self.extra_context = extra_context
+        # For the template dependency graph (core.template_graph)
+        self.template_names = (template_name,)
+
+    def render(self, context):
+        values = {variable: context.get(variable) for variable in FRAGMENTS[self.template_name]}
+        values.update((name, value.resolve(context)) for name, value in self.extra_context.items())
+        return fragment_cache.render(self.template_name, values)
+
+
+@register.tag
+def cached_include(parser, token):
+    """
+    {% include %} for the fragments listed in core.fragments.FRAGMENTS, served from the fragment cache.
+
+    Keyword arguments set the fragment's variables, like `with` on include;
+    variables not given are taken from the context.
+
+        {% cached_include 'includes/navbar.html' %}
+        {% cached_include 'includes/new_project_progress.html' current_step=1 total_steps=6 %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f'{bits[0]} takes a template name')
+    name = bits[1]
+    if len(name) < 2 or name[0] not in '"\'' or name[-1] != name[0]:
+        raise template.TemplateSyntaxError(f'{bits[0]} needs a quoted template name, got {name}')
+    name = name[1:-1]
+    if name not in FRAGMENTS:
+        raise template.TemplateSyntaxError(f'{name} is not a cached fragment (see core.fragments.FRAGMENTS)')
+    remaining = bits[2:]
+    extra_context = token_kwargs(remaining, parser)
+    if remaining:
+        raise template.TemplateSyntaxError(f'{bits[0]} only takes keyword arguments, got {" ".join(remaining)}')
+    unknown = extra_context.keys() - FRAGMENTS[name].keys()
+    if unknown:
+        raise template.TemplateSyntaxError(f"{name} doesn't vary on {', '.join(sorted(unknown))}")
+    return CachedIncludeNode(name, extra_context)
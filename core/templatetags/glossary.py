@@ -0,0 +1,36 @@
+from django import template
+
+from core.glossary import DATA_PATH, get_glossary
+
+register = template.Library()
+
+
+@register.simple_tag
+def glossary_letters():
+    """The letters of the A–Z that have terms, in order"""
+    return sorted(get_glossary().letters)
+
+
+@register.simple_tag
+def glossary_terms(letter):
+    """The terms under one letter, for {% glossary_terms 'A' as terms %}"""
+    return get_glossary().group(letter)
+
+
+@register.inclusion_tag('includes/glossary_group.html')
+def glossary_group(letter, lazy=False):
+    """
+    One letter of the A–Z glossary: its heading and its terms.
+
+    With lazy=True only the heading is rendered, over an empty list sized
+    for the terms to come; the page script fills it in from the
+    glossary_letter view once the group nears the viewport.
+
+        {% glossary_group 'A' %}
+        {% glossary_group 'B' lazy=True %}
+    """
+    return {'letter': letter, 'terms': get_glossary().group(letter), 'lazy': lazy}
+
+
+# Rendered from the glossary data, for the template dependency graph (core.template_graph)
+glossary_letters.data_files = glossary_terms.data_files = glossary_group.data_files = (DATA_PATH,)
@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import SimpleTestCase, override_settings
+
+from core.assets import images, js
+from core.templatetags.assets import responsive_background
+
+
+class MinifyJsTests(SimpleTestCase):
+    def test_strips_comments_and_indentation(self):
+        source = '''
+            // Greet
+            function greet(name) {
+                /* the name may be empty */
+                return 'Hello, ' + name;
+            }
+        '''
+        self.assertEqual(js.minify_js(source).strip(), "function greet(name){return'Hello, '+name;}")
+
+    def test_strings_are_kept(self):
+        source = '''var a = "  // not a comment ";\nvar b = 'it\\'s  /* kept */';'''
+        self.assertEqual(js.minify_js(source), source.replace(' = ', '=').replace('\n', ''))
+
+    def test_template_literal_with_nested_literals(self):
+        source = 'const row = `<li class="${done ? `item  ${kind}` : "item"}">${ {a: `}`}.a }  // kept</li>`;\nx = 1 // dropped'
+        self.assertEqual(
+            js.minify_js(source),
+            'const row=`<li class="${done ? `item  ${kind}` : "item"}">${ {a: `}`}.a }  // kept</li>`;x=1',
+        )
+
+    def test_regex_literals_are_kept(self):
+        self.assertEqual(js.minify_js("s = s.replace(/\\bhidden  [/]\\b/g, '');"), "s=s.replace(/\\bhidden  [/]\\b/g,'');")
+
+
+class ScriptTagTests(SimpleTestCase):
+    SOURCE = "\n  window.ready = function() {};\n"
+
+    def render(self, tag, manifest):
+        template = Template('{% load assets %}{% ' + tag + ' %}' + self.SOURCE + '{% endscript %}')
+        with mock.patch.object(js, 'load_manifest', return_value=manifest):
+            return template.render(Context())
+
+    def test_inline_until_built(self):
+        self.assertEqual(self.render('script', {}), f'<script>{self.SOURCE}</script>')
+        self.assertEqual(self.render('script blocking', {}), f'<script>{self.SOURCE}</script>')
+
+    def test_built_script_is_deferred(self):
+        manifest = {'inline': {js.source_key(self.SOURCE): 'js/inline/script.0123456789ab.js'}}
+        self.assertEqual(self.render('script', manifest), '<script defer src="/static/js/inline/script.0123456789ab.js"></script>')
+
+    def test_built_blocking_script_is_not_deferred(self):
+        manifest = {'inline': {js.source_key(self.SOURCE): 'js/inline/script.0123456789ab.js'}}
+        self.assertEqual(self.render('script blocking', manifest), '<script src="/static/js/inline/script.0123456789ab.js"></script>')
+
+    def test_unknown_option(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% load assets %}{% script async %}{% endscript %}')
+
+    def test_blocking_blocks_are_collected(self):
+        template = '{% script blocking %}' + self.SOURCE + '{% endscript %}'
+        with mock.patch.object(js, 'iter_template_files', return_value=[('page.html', mock.Mock(**{'read_text.return_value': template}))]):
+            self.assertEqual(js.inline_scripts(), {js.source_key(self.SOURCE): self.SOURCE})
+
+
+@override_settings(RESPONSIVE_IMAGE_WIDTHS=[480, 960, 1920])
+class ResponsiveBackgroundTests(SimpleTestCase):
+    PATH = 'assets/image/hero/hero.png'
+    MANIFEST = {PATH: {'variants': {
+        'avif': [{'width': width, 'path': f'responsive/hero.{width}w.avif'} for width in (480, 960, 1440, 1920)],
+    }}}
+
+    def render(self, width=None):
+        with mock.patch.object(images, 'load_manifest', return_value=self.MANIFEST):
+            declarations = responsive_background(self.PATH, width).split('; ')
+        return declarations[0], dict(declaration.split(': ', 1) for declaration in declarations[1:])
+
+    def test_breakpoints_offer_a_2x_variant(self):
+        value, breakpoints = self.render()
+        self.assertEqual(value, (
+            'image-set(url("/static/responsive/hero.1920w.avif") 1x type("image/avif"), '
+            'url("/static/assets/image/hero/hero.png") type("image/png"))'
+        ))
+        self.assertEqual(breakpoints['--responsive-bg-480'], (
+            'image-set(url("/static/responsive/hero.480w.avif") 1x type("image/avif"), '
+            'url("/static/responsive/hero.960w.avif") 2x type("image/avif"), '
+            'url("/static/assets/image/hero/hero.png") type("image/png"))'
+        ))
+        self.assertIn('hero.960w.avif") 1x', breakpoints['--responsive-bg-960'])
+        self.assertIn('hero.1920w.avif") 2x', breakpoints['--responsive-bg-960'])
+        # Nothing is wider than the widest variant
+        self.assertNotIn('2x', breakpoints['--responsive-bg-1920'])
+
+    def test_width_caps_the_1x_variant(self):
+        value, breakpoints = self.render(width=960)
+        self.assertIn('hero.960w.avif") 1x', value)
+        self.assertIn('hero.1920w.avif") 2x', value)
+        self.assertIn('hero.960w.avif") 1x', breakpoints['--responsive-bg-1920'])
+        self.assertIn('hero.1920w.avif") 2x', breakpoints['--responsive-bg-1920'])
+
+    def test_without_variants(self):
+        with mock.patch.object(images, 'load_manifest', return_value={}):
+            self.assertEqual(
+                responsive_background(self.PATH), 'image-set(url("/static/assets/image/hero/hero.png") type("image/png"))',
+            )
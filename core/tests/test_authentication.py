@@ -0,0 +1,166 @@
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from core.authentication import RevocationList, StatelessJWTAuthentication, TokenCache, revocations, token_cache
+from core.models import TokenRevocation
+
+
+def reset_authentication():
+    """Forget what earlier tests cached or revoked; the test database reuses user ids"""
+    token_cache.clear()
+    revocations.tokens.clear()
+    revocations.users.clear()
+    revocations._last_pk = revocations._loaded_until = None
+
+
+# A fast hasher: the tests log in a lot
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuthenticationTestCase(TestCase):
+    def setUp(self):
+        reset_authentication()
+        self.user = get_user_model().objects.create_user('writer', password='secret-password')
+        self.client = APIClient()
+
+    def obtain_tokens(self, username='writer', password='secret-password'):
+        response = self.client.post('/api/token/', {'username': username, 'password': password}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def authorize(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+
+class DeactivationTests(AuthenticationTestCase):
+    def deactivate_and_request(self):
+        self.authorize(self.obtain_tokens()['access'])
+        self.assertEqual(self.client.get('/api/drafts/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        return self.client.get('/api/drafts/')
+
+    def test_deactivated_user_is_refused(self):
+        self.assertEqual(self.deactivate_and_request().status_code, 401)
+
+    # Views read DEFAULT_AUTHENTICATION_CLASSES when they are defined
+    @mock.patch.object(APIView, 'authentication_classes', [StatelessJWTAuthentication])
+    def test_deactivated_user_is_refused_without_a_user_lookup(self):
+        self.assertEqual(self.deactivate_and_request().status_code, 401)
+
+    def test_password_change_revokes_tokens(self):
+        self.authorize(self.obtain_tokens()['access'])
+        self.user.set_password('another-password')
+        self.user.save()
+        self.assertEqual(self.client.get('/api/drafts/').status_code, 401)
+
+    def test_unrelated_save_keeps_tokens(self):
+        self.authorize(self.obtain_tokens()['access'])
+        self.user.first_name = 'Ada'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/drafts/').status_code, 200)
+
+
+class TokenCacheTests(AuthenticationTestCase):
+    def test_second_request_is_a_cache_hit(self):
+        self.authorize(self.obtain_tokens()['access'])
+        self.client.get('/api/drafts/')
+        hits = token_cache.hits
+        self.assertEqual(self.client.get('/api/drafts/').status_code, 200)
+        self.assertEqual(token_cache.hits, hits + 1)
+
+    def test_revocation_applies_to_a_cached_token(self):
+        self.authorize(self.obtain_tokens()['access'])
+        self.assertEqual(self.client.get('/api/drafts/').status_code, 200)
+        self.assertEqual(self.client.post('/api/token/revoke/', {}, format='json').status_code, 204)
+        self.assertEqual(len(token_cache), 1)
+        self.assertEqual(self.client.get('/api/drafts/').status_code, 401)
+
+    def test_expired_entries_are_dropped(self):
+        cache = TokenCache()
+        cache.set('raw', {'exp': time.time() - 1})
+        self.assertIsNone(cache.get('raw'))
+        self.assertEqual(len(cache), 0)
+
+    def test_cache_is_bounded(self):
+        cache = TokenCache(max_entries=2)
+        for raw in ('a', 'b', 'c'):
+            cache.set(raw, {'exp': time.time() + 60})
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+
+
+class RefreshTests(AuthenticationTestCase):
+    def test_revoked_refresh_token_is_refused(self):
+        tokens = self.obtain_tokens()
+        self.authorize(tokens['access'])
+        response = self.client.post('/api/token/revoke/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.client.credentials()
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_works_until_revoked(self):
+        tokens = self.obtain_tokens()
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+
+
+class RevocationListTests(AuthenticationTestCase):
+    def revoke_row(self, jti, created_at=None):
+        revocation = TokenRevocation.objects.create(
+            user=self.user, jti=jti, expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+        )
+        if created_at is not None:
+            TokenRevocation.objects.filter(pk=revocation.pk).update(created_at=created_at)
+        return revocation
+
+    def test_refresh_loads_rows_added_since_the_last_load(self):
+        revocation_list = RevocationList()
+        self.revoke_row('first')
+        revocation_list.refresh(force=True)
+        self.revoke_row('second')
+        revocation_list.refresh(force=True)
+        self.assertEqual(set(revocation_list.tokens), {'first', 'second'})
+
+    def test_row_stamped_by_a_slower_clock_is_loaded(self):
+        revocation_list = RevocationList()
+        self.revoke_row('first')
+        revocation_list.refresh(force=True)
+        # Committed later, but with a created_at before the newest row seen
+        self.revoke_row('late', created_at=datetime.now(timezone.utc) - timedelta(minutes=2))
+        revocation_list.refresh(force=True)
+        self.assertIn('late', revocation_list.tokens)
+
+    def test_row_with_a_lower_pk_inside_the_overlap_window_is_loaded(self):
+        revocation_list = RevocationList()
+        early = self.revoke_row('early')
+        self.revoke_row('newest')
+        # Loaded as if only the newest row had been committed at the time
+        revocation_list.refresh(force=True)
+        revocation_list.tokens.pop('early')
+        revocation_list.refresh(force=True)
+        self.assertIn(early.jti, revocation_list.tokens)
+
+    def test_row_outside_the_overlap_window_with_a_lower_pk_is_not_reloaded(self):
+        revocation_list = RevocationList()
+        old = self.revoke_row('old', created_at=datetime.now(timezone.utc) - timedelta(hours=1))
+        self.revoke_row('newest')
+        revocation_list.refresh(force=True)
+        revocation_list.tokens.pop(old.jti)
+        revocation_list.refresh(force=True)
+        self.assertNotIn(old.jti, revocation_list.tokens)
+
+    def test_refresh_waits_for_the_check_interval(self):
+        revocation_list = RevocationList(check_interval=60)
+        revocation_list.refresh(force=True)
+        self.revoke_row('pending')
+        revocation_list.refresh()
+        self.assertNotIn('pending', revocation_list.tokens)
+        revocation_list.refresh(force=True)
+        self.assertIn('pending', revocation_list.tokens)
@@ -0,0 +1,147 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core import chapters
+from core.chapters import (
+    DeltaError, VersionConflict, apply_delta, block_hash, chapter_at, chapter_blocks, create_chapter, validate_delta,
+)
+from core.models import Chapter, ChapterBlock, ChapterRevision, ProjectDraft
+
+
+def put(key, text=None, **fields):
+    return {'op': 'put', 'id': key, 'text': text if text is not None else f'Text of {key}.', **fields}
+
+
+def delete(key):
+    return {'op': 'delete', 'id': key}
+
+
+class ChapterTestCase(TestCase):
+    def setUp(self):
+        owner = get_user_model().objects.create_user('writer')
+        self.chapter = create_chapter(ProjectDraft.objects.create(owner=owner), 'Opening')
+
+    def apply(self, *operations):
+        validate_delta(list(operations))
+        return apply_delta(self.chapter, self.chapter.version, list(operations))
+
+    def keys(self):
+        return [key for key, text in chapter_blocks(self.chapter.pk)]
+
+
+class ApplyDeltaTests(ChapterTestCase):
+    def test_put_appends_new_blocks(self):
+        hashes = self.apply(put('a'), put('b'), put('c'))
+        self.assertEqual(self.keys(), ['a', 'b', 'c'])
+        self.assertEqual(hashes, {key: block_hash(f'Text of {key}.') for key in 'abc'})
+        self.assertEqual(self.chapter.version, 1)
+        self.assertEqual(self.chapter.words, 9)
+
+    def test_put_after(self):
+        self.apply(put('a'), put('c'))
+        self.apply(put('b', after='a'), put('start', after=None), put('end', after='c'))
+        self.assertEqual(self.keys(), ['start', 'a', 'b', 'c', 'end'])
+
+    def test_put_after_moves_an_existing_block(self):
+        self.apply(put('a'), put('b'), put('c'))
+        self.apply(put('a', 'Moved.', after='c'))
+        self.assertEqual(list(chapter_blocks(self.chapter.pk)), [('b', 'Text of b.'), ('c', 'Text of c.'), ('a', 'Moved.')])
+
+    def test_put_after_a_block_of_the_same_delta(self):
+        self.apply(put('a'))
+        self.apply(put('c', after='a'), put('b', after='a'), put('d', after='c'))
+        self.assertEqual(self.keys(), ['a', 'b', 'c', 'd'])
+
+    def test_delete(self):
+        self.apply(put('a'), put('b'), put('c'))
+        self.apply(delete('b'))
+        self.assertEqual(self.keys(), ['a', 'c'])
+        self.assertEqual(Chapter.objects.get(pk=self.chapter.pk).words, 6)
+
+    def test_update_keeps_the_position(self):
+        self.apply(put('a'), put('b'))
+        self.apply(put('a', 'Rewritten opening line.'))
+        self.assertEqual(list(chapter_blocks(self.chapter.pk)), [('a', 'Rewritten opening line.'), ('b', 'Text of b.')])
+
+    def test_unchanged_delta_keeps_the_version(self):
+        self.apply(put('a'))
+        self.apply(put('a'))
+        self.assertEqual(Chapter.objects.get(pk=self.chapter.pk).version, 1)
+        self.assertEqual(ChapterRevision.objects.filter(chapter=self.chapter).count(), 2)
+
+    def test_failed_operation_saves_nothing(self):
+        self.apply(put('a'))
+        with self.assertRaises(DeltaError):
+            self.apply(put('b'), delete('missing'))
+        with self.assertRaises(DeltaError):
+            self.apply(put('c', after='missing'))
+        self.assertEqual(self.keys(), ['a'])
+        self.assertEqual(Chapter.objects.get(pk=self.chapter.pk).version, 1)
+
+    def test_renumbers_when_the_gap_runs_out(self):
+        self.apply(put('a'), put('z'))
+        renumber = mock.patch.object(chapters._Delta, '_renumber', autospec=True, side_effect=chapters._Delta._renumber)
+        with renumber as renumbered:
+            # Each block goes between `a` and the one put before it, halving the gap
+            for number in range(40):
+                self.apply(put(f'b{number}', after='a'))
+        self.assertTrue(renumbered.called)
+        self.assertEqual(self.keys(), ['a'] + [f'b{number}' for number in reversed(range(40))] + ['z'])
+        positions = list(ChapterBlock.objects.filter(chapter=self.chapter).order_by('position').values_list('position', flat=True))
+        self.assertTrue(all(b - a >= chapters.MIN_POSITION_GAP for a, b in zip(positions, positions[1:])))
+
+    def test_stale_base_version_conflicts(self):
+        self.apply(put('a'))
+        # A second client that also read version 0
+        stale = Chapter.objects.get(pk=self.chapter.pk)
+        stale.version = 0
+        with self.assertRaises(VersionConflict) as conflict:
+            apply_delta(stale, 0, [put('b')])
+        self.assertEqual(conflict.exception.chapter.version, 1)
+        self.assertEqual(self.keys(), ['a'])
+        self.assertEqual(ChapterRevision.objects.filter(chapter=self.chapter).count(), 2)
+
+
+@override_settings(CHAPTER_SNAPSHOT_INTERVAL=5, CHAPTER_SNAPSHOTS_KEPT=2)
+class RevisionLogTests(ChapterTestCase):
+    def edit(self, times):
+        for number in range(times):
+            version = self.chapter.version + 1
+            # A block at the start, one after it, then the second one deleted again
+            if version % 3 == 1:
+                self.apply(put(f'v{version}', f'Written at version {version}.', after=None))
+            elif version % 3 == 2:
+                self.apply(put(f'v{version}', f'Written at version {version}.', after=f'v{version - 1}'))
+            else:
+                self.apply(delete(f'v{version - 1}'))
+
+    def snapshot_versions(self):
+        revisions = ChapterRevision.objects.filter(chapter=self.chapter, snapshot__isnull=False)
+        return list(revisions.order_by('version').values_list('version', flat=True))
+
+    def test_snapshot_every_interval(self):
+        self.edit(10)
+        blocks = [list(block) for block in chapter_blocks(self.chapter.pk)]
+        self.edit(2)
+        self.assertEqual(self.snapshot_versions(), [5, 10])
+        snapshot = ChapterRevision.objects.get(chapter=self.chapter, version=10).snapshot
+        self.assertEqual(chapters.decode_snapshot(snapshot), blocks)
+
+    def test_prune_keeps_the_last_snapshots(self):
+        self.edit(23)
+        self.assertEqual(self.snapshot_versions(), [15, 20])
+        versions = ChapterRevision.objects.filter(chapter=self.chapter).values_list('version', flat=True)
+        self.assertEqual(sorted(versions), list(range(15, 24)))
+        self.assertIsNone(chapter_at(self.chapter, 14))
+
+    def test_chapter_at_replays_to_the_stored_blocks(self):
+        history = {}
+        for version in range(1, 24):
+            self.edit(1)
+            history[version] = [list(block) for block in chapter_blocks(self.chapter.pk)]
+        for version in range(15, 24):
+            with self.subTest(version=version):
+                self.assertEqual(chapter_at(self.chapter, version), history[version])
+        self.assertIsNone(chapter_at(self.chapter, 24))
@@ -0,0 +1,160 @@
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+
+from core.drafts import PatchConflict, PatchError, apply_patch, json_equal
+from core.models import ProjectDraft
+
+from .test_authentication import AuthenticationTestCase
+
+DOCUMENT = {'new-project': {'title': 'The Warden', 'influences': ['Le Guin', 'Jemisin'], 'chapters': 12}}
+
+
+class ApplyPatchTests(SimpleTestCase):
+    def patch(self, *operations):
+        return apply_patch(DOCUMENT, list(operations))
+
+    def test_add(self):
+        document = self.patch(
+            {'op': 'add', 'path': '/new-project/genre', 'value': 'fantasy'},
+            {'op': 'add', 'path': '/new-project/influences/-', 'value': 'Tolkien'},
+            {'op': 'add', 'path': '/new-project/influences/0', 'value': 'Wolfe'},
+        )
+        self.assertEqual(document['new-project']['genre'], 'fantasy')
+        self.assertEqual(document['new-project']['influences'], ['Wolfe', 'Le Guin', 'Jemisin', 'Tolkien'])
+
+    def test_remove(self):
+        document = self.patch(
+            {'op': 'remove', 'path': '/new-project/chapters'},
+            {'op': 'remove', 'path': '/new-project/influences/0'},
+        )
+        self.assertEqual(document, {'new-project': {'title': 'The Warden', 'influences': ['Jemisin']}})
+
+    def test_replace(self):
+        document = self.patch(
+            {'op': 'replace', 'path': '/new-project/title', 'value': 'The Keeper'},
+            {'op': 'replace', 'path': '/new-project/influences/1', 'value': 'Butler'},
+        )
+        self.assertEqual(document['new-project']['title'], 'The Keeper')
+        self.assertEqual(document['new-project']['influences'], ['Le Guin', 'Butler'])
+
+    def test_replace_of_a_missing_member_fails(self):
+        with self.assertRaises(PatchError):
+            self.patch({'op': 'replace', 'path': '/new-project/genre', 'value': 'fantasy'})
+
+    def test_move(self):
+        document = self.patch({'op': 'move', 'from': '/new-project/influences/1', 'path': '/new-project/influences/0'})
+        self.assertEqual(document['new-project']['influences'], ['Jemisin', 'Le Guin'])
+        document = self.patch({'op': 'move', 'from': '/new-project/title', 'path': '/new-project/working-title'})
+        self.assertNotIn('title', document['new-project'])
+        self.assertEqual(document['new-project']['working-title'], 'The Warden')
+
+    def test_move_into_itself_fails(self):
+        with self.assertRaises(PatchError):
+            self.patch({'op': 'move', 'from': '/new-project', 'path': '/new-project/copy'})
+
+    def test_copy(self):
+        document = self.patch({'op': 'copy', 'from': '/new-project/influences', 'path': '/new-project/favourites'})
+        document['new-project']['favourites'].append('Butler')
+        self.assertEqual(document['new-project']['influences'], ['Le Guin', 'Jemisin'])
+
+    def test_test(self):
+        document = self.patch(
+            {'op': 'test', 'path': '/new-project/title', 'value': 'The Warden'},
+            {'op': 'test', 'path': '/new-project/influences', 'value': ['Le Guin', 'Jemisin']},
+        )
+        self.assertEqual(document, DOCUMENT)
+        with self.assertRaises(PatchConflict):
+            self.patch({'op': 'test', 'path': '/new-project/title', 'value': 'The Keeper'})
+
+    def test_test_compares_types(self):
+        for value in (12.0, True, '12', [12]):
+            with self.subTest(value=value), self.assertRaises(PatchConflict):
+                self.patch({'op': 'test', 'path': '/new-project/chapters', 'value': value})
+        with self.assertRaises(PatchConflict):
+            apply_patch({'new-project': {'done': True}}, [{'op': 'test', 'path': '/new-project/done', 'value': 1}])
+
+    def test_failed_operation_leaves_the_document_alone(self):
+        with self.assertRaises(PatchError):
+            self.patch(
+                {'op': 'remove', 'path': '/new-project/title'},
+                {'op': 'remove', 'path': '/new-project/genre'},
+            )
+        self.assertEqual(DOCUMENT['new-project']['title'], 'The Warden')
+
+    def test_array_indices_are_ascii_digits(self):
+        for index in ('01', '-1', '٣', '2'):
+            with self.subTest(index=index), self.assertRaises(PatchError):
+                self.patch({'op': 'remove', 'path': f'/new-project/influences/{index}'})
+
+    def test_json_equal(self):
+        self.assertTrue(json_equal({'a': [1, 'b', None]}, {'a': [1, 'b', None]}))
+        self.assertFalse(json_equal({'a': 1}, {'a': 1.0}))
+        self.assertFalse(json_equal([0], [False]))
+        self.assertFalse(json_equal({'a': 1}, {'a': 1, 'b': 2}))
+
+
+class DraftApiTests(AuthenticationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authorize(self.obtain_tokens()['access'])
+        self.draft = ProjectDraft.objects.create(owner=self.user, data=DOCUMENT)
+        self.url = f'/api/drafts/{self.draft.pk}/'
+
+    def patch(self, operations, if_match=None):
+        headers = {'If-Match': if_match} if if_match is not None else {}
+        return self.client.patch(self.url, operations, format='json', headers=headers)
+
+    def test_patch(self):
+        response = self.patch([{'op': 'replace', 'path': '/new-project/title', 'value': 'The Keeper'}], self.draft.etag)
+        self.assertEqual(response.status_code, 204)
+        self.draft.refresh_from_db()
+        self.assertEqual(response['ETag'], self.draft.etag)
+        self.assertEqual(self.draft.version, 2)
+        self.assertEqual(self.draft.data['new-project']['title'], 'The Keeper')
+
+    def test_patch_changing_only_the_type_is_saved(self):
+        response = self.patch([{'op': 'replace', 'path': '/new-project/chapters', 'value': 12.0}], self.draft.etag)
+        self.assertEqual(response.status_code, 204)
+        self.draft.refresh_from_db()
+        self.assertEqual(self.draft.version, 2)
+        self.assertIsInstance(self.draft.data['new-project']['chapters'], float)
+
+    def test_failed_test_is_a_conflict(self):
+        response = self.patch([
+            {'op': 'test', 'path': '/new-project/title', 'value': 'The Keeper'},
+            {'op': 'replace', 'path': '/new-project/title', 'value': 'The Warden Returns'},
+        ], self.draft.etag)
+        self.assertEqual(response.status_code, 409)
+        self.draft.refresh_from_db()
+        self.assertEqual(self.draft.version, 1)
+
+    def test_stale_if_match(self):
+        stale = self.draft.etag
+        self.assertEqual(self.patch([{'op': 'add', 'path': '/new-project/genre', 'value': 'fantasy'}], stale).status_code, 204)
+        response = self.patch([{'op': 'add', 'path': '/new-project/genre', 'value': 'horror'}], stale)
+        self.assertEqual(response.status_code, 412)
+        self.draft.refresh_from_db()
+        self.assertEqual(response['ETag'], self.draft.etag)
+        self.assertEqual(self.draft.data['new-project']['genre'], 'fantasy')
+
+    def test_missing_if_match(self):
+        response = self.patch([{'op': 'add', 'path': '/new-project/genre', 'value': 'fantasy'}])
+        self.assertEqual(response.status_code, 428)
+
+    def test_invalid_patch(self):
+        response = self.patch([{'op': 'remove', 'path': '/new-project/genre'}], self.draft.etag)
+        self.assertEqual(response.status_code, 422)
+
+    def test_other_users_draft_is_not_found(self):
+        other = get_user_model().objects.create_user('rival', password='secret-password')
+        self.authorize(self.obtain_tokens('rival')['access'])
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.patch([{'op': 'remove', 'path': '/new-project'}], self.draft.etag).status_code, 404)
+        self.assertEqual(self.client.delete(self.url).status_code, 404)
+        self.assertTrue(ProjectDraft.objects.filter(pk=self.draft.pk).exists())
+        self.assertEqual(self.client.get('/api/drafts/').data['results'], [])
+        self.assertFalse(other.drafts.exists())
+
+    def test_if_none_match(self):
+        response = self.client.get(self.url, headers={'If-None-Match': self.draft.etag})
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,87 @@
+import io
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, override_settings
+
+from core.chapters import apply_delta, create_chapter
+from core.exports import aiter_chunks, get_export_cache
+from core.models import ProjectDraft
+
+from .test_authentication import AuthenticationTestCase
+
+
+class ExportTestCase(AuthenticationTestCase):
+    def setUp(self):
+        super().setUp()
+        export_root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, export_root, ignore_errors=True)
+        settings_override = override_settings(EXPORT_ROOT=export_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.draft = ProjectDraft.objects.create(owner=self.user, data={'new-project': {'title': 'The Long Book'}})
+        for number in range(3):
+            chapter = create_chapter(self.draft, f'Part {number}')
+            apply_delta(chapter, 0, [
+                {'op': 'put', 'id': f'p{index}', 'text': f'Paragraph {index} of part {number}.'} for index in range(20)
+            ])
+        self.access = self.obtain_tokens()['access']
+        self.authorize(self.access)
+
+
+class StreamingExportTests(ExportTestCase):
+    def test_chunks_are_pulled_one_at_a_time(self):
+        produced = []
+
+        def chunks():
+            for number in range(3):
+                produced.append(number)
+                yield bytes([number])
+
+        async def consume():
+            received = []
+            async for chunk in aiter_chunks(chunks()):
+                received.append((chunk, len(produced)))
+            return received
+
+        self.assertEqual(async_to_sync(consume)(), [(b'\x00', 1), (b'\x01', 2), (b'\x02', 3)])
+
+    async def test_asgi_export_streams_asynchronously(self):
+        response = await AsyncClient().get(
+            f'/api/drafts/{self.draft.pk}/export/epub/', headers={'Authorization': f'Bearer {self.access}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertIsNone(zipfile.ZipFile(io.BytesIO(content)).testzip())
+
+
+class ArchiveTests(ExportTestCase):
+    def export(self, book_format):
+        response = self.client.get(f'/api/drafts/{self.draft.pk}/export/{book_format}/')
+        self.assertEqual(response.status_code, 200)
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def assert_archives_valid(self, book_format):
+        fresh = self.export(book_format)
+        self.assertIsNone(fresh.testzip())
+        cache = get_export_cache()
+        self.assertTrue(any(cache.directory.glob('*/*')))
+        self.assertFalse(any(cache.directory.glob('*/*.tmp')))
+
+        cached = self.export(book_format)
+        self.assertIsNone(cached.testzip())
+        self.assertEqual(
+            [(info.filename, fresh.read(info)) for info in fresh.infolist()],
+            [(info.filename, cached.read(info)) for info in cached.infolist()],
+        )
+
+    def test_epub_is_valid_fresh_and_cached(self):
+        self.assert_archives_valid('epub')
+
+    def test_docx_is_valid_fresh_and_cached(self):
+        self.assert_archives_valid('docx')
@@ -0,0 +1,23 @@
+from django.test import SimpleTestCase
+
+from core.glossary import Glossary
+
+
+class GlossaryDataTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.glossary = Glossary.load()
+
+    def test_text_is_not_double_encoded(self):
+        for term in self.glossary.terms:
+            for text in (term.term, term.definition, term.example):
+                with self.subTest(term=term.term):
+                    # UTF-8 read as cp1252 shows up as Ã or â followed by another non-ASCII character
+                    self.assertNotRegex(text, '[Ãâ][^\x00-\x7f]')
+
+    def test_accented_terms_are_found_without_accents(self):
+        for query, name in (('denouement', 'Dénouement'), ('doppelganger', 'Doppelgänger'), ('roman a clef', 'Roman à Clef')):
+            with self.subTest(query=query):
+                total, terms = self.glossary.search(query)
+                self.assertEqual(terms[0].term, name)
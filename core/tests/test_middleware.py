@@ -0,0 +1,38 @@
+import gzip
+
+from django.test import SimpleTestCase, TestCase
+
+from core.middleware import HtmlCompressionMiddleware
+
+
+class CompressedEtagTests(TestCase):
+    def get(self, encoding, **headers):
+        return self.client.get('/', headers={'Accept-Encoding': encoding, **headers})
+
+    def test_each_encoding_has_its_own_strong_etag(self):
+        identity, gzipped, brotli = self.get('identity'), self.get('gzip'), self.get('br')
+        self.assertIsNone(identity.get('Content-Encoding'))
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(brotli['Content-Encoding'], 'br')
+        self.assertEqual(gzipped['ETag'], identity['ETag'][:-1] + '-gz"')
+        self.assertEqual(brotli['ETag'], identity['ETag'][:-1] + '-br"')
+        self.assertFalse(identity['ETag'].startswith('W/'))
+        # Same page, with a differently masked CSRF token
+        self.assertEqual(len(gzip.decompress(gzipped.content)), len(identity.content))
+
+    def test_not_modified_with_the_etag_of_the_encoding(self):
+        etag = self.get('gzip')['ETag']
+        response = self.get('gzip', **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_etag_of_another_encoding_does_not_match(self):
+        response = self.get('br', **{'If-None-Match': self.get('gzip')['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+
+class EtagSuffixTests(SimpleTestCase):
+    def test_suffix(self):
+        self.assertEqual(HtmlCompressionMiddleware._etag('"abc"', '-br'), '"abc-br"')
+        self.assertEqual(HtmlCompressionMiddleware._etag('W/"abc"', '-gz'), 'W/"abc-gz"')
@@ -0,0 +1,34 @@
+import io
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.management.base import CommandError
+from django.template import TemplateSyntaxError
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase
+
+from core import search
+
+
+class BuildTests(SimpleTestCase):
+    def setUp(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = directory / 'site.idx'
+
+    def test_builds_an_index(self):
+        search.build(io.StringIO(), path=self.path)
+        self.assertGreater(len(search.SearchIndex(self.path)), 0)
+
+    def test_page_that_fails_to_render_fails_the_build(self):
+        def render(template_name, context):
+            if template_name == 'about.html':
+                raise TemplateSyntaxError('Invalid block tag')
+            return render_to_string(template_name, context)
+
+        with mock.patch.object(search, 'render_to_string', side_effect=render):
+            with self.assertRaisesMessage(CommandError, 'about.html (Invalid block tag)'):
+                search.build(io.StringIO(), path=self.path)
+        self.assertFalse(self.path.exists())
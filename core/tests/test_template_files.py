@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import template_files
+from core.template_files import TemplateWatcher
+
+
+class TemplateWatcherTests(SimpleTestCase):
+    def setUp(self):
+        template_files._scan = (0.0, None)
+        self.addCleanup(setattr, template_files, '_scan', (0.0, None))
+        self.signature = {'index.html': (1, 100), 'about.html': (1, 200)}
+        patcher = mock.patch.object(template_files, 'templates_signature', side_effect=lambda: dict(self.signature))
+        self.scans = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clock = 1000.0
+        clock_patcher = mock.patch.object(template_files.time, 'monotonic', side_effect=lambda: self.clock)
+        clock_patcher.start()
+        self.addCleanup(clock_patcher.stop)
+
+    def test_disabled(self):
+        watcher = TemplateWatcher(0)
+        self.clock += 60
+        self.assertEqual(watcher.changes(), set())
+        self.scans.assert_not_called()
+
+    @mock.patch('core.template_graph.get_template_graph')
+    def test_reports_changes_once_due(self, get_template_graph):
+        watcher = TemplateWatcher(1.0)
+        self.signature['about.html'] = (2, 210)
+        self.signature['faq.html'] = (2, 50)
+        self.assertEqual(watcher.changes(), set())
+        self.clock += 1
+        self.assertEqual(watcher.changes(), {'about.html', 'faq.html'})
+        get_template_graph.assert_called_once()
+        self.clock += 1
+        self.assertEqual(watcher.changes(), set())
+
+    @mock.patch('core.template_graph.get_template_graph')
+    def test_watchers_share_a_scan(self, get_template_graph):
+        watchers = [TemplateWatcher(1.0) for _ in range(3)]
+        self.assertEqual(self.scans.call_count, 1)
+        self.signature['index.html'] = (2, 120)
+        self.clock += 1
+        self.assertEqual([watcher.changes() for watcher in watchers], [{'index.html'}] * 3)
+        self.assertEqual(self.scans.call_count, 2)
@@ -1,16 +1,15 @@
-from django.shortcuts import render, redirect
+import hmac
+
 from django.template.exceptions import TemplateDoesNotExist
-from django.http import Http404
-
-# Mapping of step numbers to template names
-NEW_PROJECT_STEPS = {
-    1: 'new-project',
-    2: 'review-idea',
-    3: 'narrative-development',
-    4: 'detailed-plan',
-    5: 'chapter-view',
-    6: 'export',  # You may need to create this template
-}
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+
+from .glossary import get_glossary
+from .metrics import phase, registry, render_prometheus
+from .page_cache import page_cache
+from .routes import NEW_PROJECT_STEPS, aget_route_index, get_route_index, step_context
+from .search import get_search_index
+
 
 def new_project_step(request, step):
     """Handle new project creation steps with numbered URLs"""
@@ -19,61 +18,142 @@ def new_project_step(request, step):
     
     template_name = f"{NEW_PROJECT_STEPS[step]}.html"
     
-    context = {
-        'active_page': 'new-project',
-        'current_step': step,
-        'total_steps': len(NEW_PROJECT_STEPS),
-        'step_names': {
-            1: 'Idea',
-            2: 'Review Idea',
-            3: 'Story Draft',
-            4: 'Detailed Plan',
-            5: 'Create Chapter',
-            6: 'Export',
-        }
-    }
+    context = step_context(step)
     
     try:
-        return render(request, template_name, context)
+        return page_cache.render(request, template_name, context)
     except TemplateDoesNotExist:
         raise Http404(f"Template for step {step} not found")
 
 def render_page(request, page_name='index'):
-    # Sanitize page_name to prevent directory traversal? 
-    # Django's template loader is generally safe, but good to be careful.
-    # We will just pass it to render.
-    
-    # Check if the page_name ends with .html, if not append it
-    template_name = page_name if page_name.endswith('.html') else f'{page_name}.html'
-    
-    # Determine active_page for dashboard pages
-    active_page = ''
-    dashboard_pages = {
-        'dashboard': 'dashboard',
-        'project-list': 'project-list',
-        'new-project': 'new-project',
-        'your-plan': 'your-plan',
-        'ambassador-affiliate': 'ambassador-affiliate',
-        'settings': 'settings',
-    }
-    
-    # Remove .html extension if present for comparison
-    page_key = page_name.replace('.html', '')
-    if page_key in dashboard_pages:
-        active_page = dashboard_pages[page_key]
-    
+    # Only names in the route index are ever handed to the template loader,
+    # so unknown slugs (including traversal attempts) are rejected up front.
+    with phase(request, 'resolve'):
+        route = get_route_index().resolve(page_name)
+    if route is None:
+        raise Http404(f"Page {page_name} not found")
+
     context = {
-        'active_page': active_page
+        'active_page': route.active_page
     }
-    
+
+    try:
+        return page_cache.render(request, route.template_name, context)
+    except TemplateDoesNotExist:
+        # Deleted since the index was last rebuilt
+        raise Http404(f"Page {page_name} not found")
+
+
+async def new_project_step_async(request, step):
+    """new_project_step for the ASGI server (ASYNC_VIEWS); cache hits never leave the event loop"""
+    if step not in NEW_PROJECT_STEPS:
+        raise Http404(f"Step {step} not found. Valid steps are 1-{len(NEW_PROJECT_STEPS)}")
+
+    template_name = f"{NEW_PROJECT_STEPS[step]}.html"
+
     try:
-        return render(request, template_name, context)
+        return await page_cache.arender(request, template_name, step_context(step))
     except TemplateDoesNotExist:
-        try: 
-            # Fallback: maybe the user requests /privacy-policy but file is privacy_policy.html?
-            # Start with direct match.
-            if "-" in page_name:
-                 return render(request, f'{page_name.replace("-", "_")}.html', context)
-            raise Http404
-        except TemplateDoesNotExist:
-            raise Http404(f"Page {page_name} not found")
+        raise Http404(f"Template for step {step} not found")
+
+
+async def render_page_async(request, page_name='index'):
+    """render_page for the ASGI server (ASYNC_VIEWS); cache hits never leave the event loop"""
+    with phase(request, 'resolve'):
+        route = (await aget_route_index()).resolve(page_name)
+    if route is None:
+        raise Http404(f"Page {page_name} not found")
+
+    try:
+        return await page_cache.arender(request, route.template_name, {'active_page': route.active_page})
+    except TemplateDoesNotExist:
+        raise Http404(f"Page {page_name} not found")
+
+
+def metrics(request):
+    """Prometheus metrics merged across all gunicorn workers; without a METRICS_TOKEN only with DEBUG on"""
+    if settings.METRICS_TOKEN:
+        authorization = request.headers.get('Authorization', '').encode()
+        if not hmac.compare_digest(authorization, f'Bearer {settings.METRICS_TOKEN}'.encode()):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_prometheus(*registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+# Results per page for glossary_search, by default and at most
+GLOSSARY_PAGE_SIZE = 20
+GLOSSARY_MAX_PAGE_SIZE = 100
+
+# Results per page for site_search, by default and at most
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_PAGE_SIZE = 50
+
+
+def _positive_int(value, default):
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def glossary_search(request):
+    """Ranked, paginated glossary search as JSON: ?q=<words>&page=<n>&per_page=<n>"""
+    query = request.GET.get('q', '')
+    page = _positive_int(request.GET.get('page'), 1)
+    per_page = min(_positive_int(request.GET.get('per_page'), GLOSSARY_PAGE_SIZE), GLOSSARY_MAX_PAGE_SIZE)
+
+    with phase(request, 'search'):
+        total, terms = get_glossary().search(query, offset=(page - 1) * per_page, limit=per_page)
+    response = JsonResponse({
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'has_next': page * per_page < total,
+        'results': [
+            {
+                'term': term.term,
+                'slug': term.slug,
+                'letter': term.letter,
+                'definition': term.definition,
+                'example': term.example,
+            }
+            for term in terms
+        ],
+    })
+    # The glossary only changes with a deploy
+    response['Cache-Control'] = f'public, max-age={settings.GLOSSARY_CACHE_SECONDS}'
+    return response
+
+
+def site_search(request):
+    """BM25-ranked site search with snippets as JSON: ?q=<words>&page=<n>&per_page=<n>"""
+    query = request.GET.get('q', '')
+    page = _positive_int(request.GET.get('page'), 1)
+    per_page = min(_positive_int(request.GET.get('per_page'), SEARCH_PAGE_SIZE), SEARCH_MAX_PAGE_SIZE)
+
+    with phase(request, 'search'):
+        index = get_search_index()
+        if index is None:
+            return JsonResponse({'error': 'The search index has not been built'}, status=503)
+        total, hits = index.search(query, offset=(page - 1) * per_page, limit=per_page)
+    return JsonResponse({
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'has_next': page * per_page < total,
+        'results': [hit._asdict() for hit in hits],
+    })
+
+
+def glossary_letter(request, letter):
+    """The terms of one glossary letter as an HTML fragment, for the lazily loaded groups"""
+    letter = letter.upper()
+    if letter not in get_glossary().letters:
+        raise Http404(f"No glossary terms under {letter}")
+    return page_cache.render(request, 'includes/glossary_terms.html', {'letter': letter})
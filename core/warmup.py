@@ -0,0 +1,77 @@
+import logging
+import time
+
+from django.template import TemplateSyntaxError, engines
+
+from .fragments import fragment_cache
+from .glossary import get_glossary
+from .routes import get_route_index
+from .search import get_search_index
+from .template_files import iter_template_files
+
+logger = logging.getLogger(__name__)
+
+# Filled in by warm_up(); the latest run's timings for this process
+warmup_stats = {}
+
+
+def warm_up():
+    """
+    Compile every project template into the cached loader, build the route
+    and glossary indexes and render every variant of the cached fragments.
+
+    Run once per process before serving traffic (gunicorn.conf.py calls it in
+    the master with preload, or in each worker otherwise) so the first
+    requests after a deploy don't pay for template compilation.
+    """
+    started = time.perf_counter()
+    compiled = failed = 0
+    for name, path in iter_template_files():
+        for engine in engines.all():
+            try:
+                engine.get_template(name)
+            except TemplateSyntaxError as exc:
+                failed += 1
+                logger.warning('Warm-up could not compile %s: %s', name, exc)
+            else:
+                compiled += 1
+    templates_seconds = time.perf_counter() - started
+
+    routes_started = time.perf_counter()
+    routes = len(get_route_index())
+    routes_seconds = time.perf_counter() - routes_started
+
+    glossary_started = time.perf_counter()
+    glossary_terms = len(get_glossary())
+    glossary_seconds = time.perf_counter() - glossary_started
+
+    fragments_started = time.perf_counter()
+    try:
+        fragments = fragment_cache.precompute()
+    except TemplateSyntaxError as exc:
+        fragments = 0
+        logger.warning('Warm-up could not precompute fragments: %s', exc)
+    fragments_seconds = time.perf_counter() - fragments_started
+
+    # Maps the search index, if one was built, before gunicorn forks
+    get_search_index()
+
+    warmup_stats.update({
+        'templates': compiled,
+        'failed': failed,
+        'routes': routes,
+        'templates_seconds': templates_seconds,
+        'routes_seconds': routes_seconds,
+        'glossary_terms': glossary_terms,
+        'glossary_seconds': glossary_seconds,
+        'fragments': fragments,
+        'fragments_seconds': fragments_seconds,
+        'total_seconds': time.perf_counter() - started,
+    })
+    logger.info(
+        'Warm-up compiled %d templates (%d failed) in %.1f ms, indexed %d routes in %.1f ms '
+        'and %d glossary terms in %.1f ms, rendered %d fragment variants in %.1f ms',
+        compiled, failed, templates_seconds * 1000, routes, routes_seconds * 1000,
+        glossary_terms, glossary_seconds * 1000, fragments, fragments_seconds * 1000,
+    )
+    return warmup_stats
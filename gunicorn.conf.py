@@ -0,0 +1,57 @@
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+Templates are compiled before the first request is served: in the master
+before forking when the app is preloaded (workers then share the compiled
+templates copy-on-write), otherwise in each worker right after it boots.
+Workers write their request metrics (core.metrics) to a METRICS_DIR of this
+server's own unless one is configured, and flush them when they exit, so
+/metrics covers exactly this server's lifetime.
+Command line flags such as --bind still take precedence over this file.
+"""
+
+import os
+import shutil
+import tempfile
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# 'sync' for config.wsgi; 'uvicorn_worker.UvicornWorker' for config.asgi
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+# Set before the app is loaded, so settings and every worker pick it up
+_own_metrics_dir = 'METRICS_DIR' not in os.environ
+if _own_metrics_dir:
+    os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='penwise-metrics-')
+
+
+def when_ready(server):
+    if preload_app:
+        _warm_up()
+        # Connections are persistent: none opened here may be shared by the workers
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        _warm_up()
+
+
+def worker_exit(server, worker):
+    from core.metrics import registry
+
+    registry.flush()
+
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def _warm_up():
+    # Timings are logged by core.warmup and kept in core.warmup.warmup_stats
+    from core.warmup import warm_up
+
+    warm_up()
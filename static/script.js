@@ -1,12 +1,12 @@
-// Prevent script from running multiple times
-if (window.penwiseScriptLoaded) {
-	console.warn('script.js already loaded, skipping duplicate execution');
-} else {
-	window.penwiseScriptLoaded = true;
+// Site-wide behaviour, in sections. `manage.py build_assets js` splits this
+// file at its "@feature name: selectors" lines into chunks, and each page
+// loads only the chunks whose selectors match its markup (a feature without
+// selectors goes to every page).
 
 // ===================================
 // MOBILE MENU - Simple and Reliable
 // ===================================
+// @feature mobile-menu: #mobileMenuBtn, #mobileMenu
 // Helper function to find element with retry
 function findElementWithRetry(id, maxRetries = 10, delay = 50) {
 	let element = document.getElementById(id);
@@ -92,6 +92,141 @@ if (typeof window.closeMobileMenu === 'undefined') {
 	window.closeMobileMenu = closeMobileMenu;
 }
 
+// Create mobile menu if it doesn't exist
+function createMobileMenuIfMissing() {
+	let mobileMenu = document.getElementById('mobileMenu');
+	let mobileMenuOverlay = document.getElementById('mobileMenuOverlay');
+	
+	if (!mobileMenu || !mobileMenuOverlay) {
+		// Create overlay
+		if (!mobileMenuOverlay) {
+			mobileMenuOverlay = document.createElement('div');
+			mobileMenuOverlay.id = 'mobileMenuOverlay';
+			mobileMenuOverlay.className = 'fixed inset-0 bg-black/50 z-[55] hidden opacity-0 transition-opacity duration-300 lg:hidden';
+			mobileMenuOverlay.style.cssText = 'display: none; visibility: visible;';
+			document.body.appendChild(mobileMenuOverlay);
+		}
+		
+		// Create menu
+		if (!mobileMenu) {
+			mobileMenu = document.createElement('div');
+			mobileMenu.id = 'mobileMenu';
+			mobileMenu.className = 'fixed top-0 right-0 h-full w-full max-w-sm bg-white z-[60] shadow-2xl transform translate-x-full transition-transform duration-300 lg:hidden';
+			mobileMenu.style.cssText = 'display: block; visibility: visible;';
+			
+			mobileMenu.innerHTML = `
+				<div class="flex flex-col h-full">
+					<div class="flex items-center justify-between p-6 border-b border-gray-200">
+						<a href="/" class="flex items-center gap-2 text-xl font-bold text-black">
+							<span>Penwise</span>
+						</a>
+						<button id="closeMenuBtn" class="w-10 h-10 flex items-center justify-center rounded-lg hover:bg-gray-100 transition-colors duration-200 text-3xl text-gray-700">&times;</button>
+					</div>
+					<nav class="flex-1 overflow-y-auto p-6">
+						<div class="flex flex-col gap-2">
+							<a href="/howitworks" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
+								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
+								How It Works
+							</a>
+							<a href="/pricing" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
+								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
+								Pricing
+							</a>
+							<a href="/why-penwise" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
+								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
+								Why Penwise
+							</a>
+							<a href="/affiliates" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
+								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
+								Affiliates
+							</a>
+							<a href="/faq" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
+								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
+								FAQ
+							</a>
+							<a href="/blog" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
+								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
+								Blog
+							</a>
+						</div>
+					</nav>
+					<div class="p-6 border-t border-gray-200 space-y-3">
+						<a href="/login" class="flex justify-center items-center w-full px-6 py-3.5 font-semibold text-gray-900 border-2 border-gray-900 rounded-full hover:bg-gray-900 hover:text-white transition-all duration-300">Log In</a>
+						<a href="/register" class="flex justify-center items-center w-full px-6 py-3.5 font-semibold bg-gradient-to-r from-gray-900 to-gray-700 text-white rounded-full hover:shadow-lg transition-all duration-300">Get Started</a>
+					</div>
+				</div>
+			`;
+			
+			document.body.appendChild(mobileMenu);
+		}
+	}
+}
+
+// Initialize mobile menu event listeners (backup to inline handlers)
+function initMobileMenuListeners() {
+	// First, create menu if missing
+	createMobileMenuIfMissing();
+	
+	const mobileMenuBtn = document.getElementById('mobileMenuBtn');
+	const closeMenuBtn = document.getElementById('closeMenuBtn');
+	const mobileMenu = document.getElementById('mobileMenu');
+	const mobileMenuOverlay = document.getElementById('mobileMenuOverlay');
+	const mobileNavLinks = document.querySelectorAll('.mobile-nav-link');
+	
+	// Add event listeners if elements exist (backup - inline handlers are primary)
+	if (mobileMenuBtn && !mobileMenuBtn.onclick) {
+		// Remove any existing listeners by cloning
+		const newBtn = mobileMenuBtn.cloneNode(true);
+		mobileMenuBtn.parentNode.replaceChild(newBtn, mobileMenuBtn);
+		newBtn.addEventListener('click', function(e) {
+			e.preventDefault();
+			e.stopPropagation();
+			openMobileMenu();
+		});
+	}
+	
+	if (closeMenuBtn && !closeMenuBtn.onclick) {
+		closeMenuBtn.addEventListener('click', function(e) {
+			e.preventDefault();
+			e.stopPropagation();
+			closeMobileMenu();
+		});
+	}
+	
+	// Close on overlay click
+	if (mobileMenuOverlay && !mobileMenuOverlay.onclick) {
+		mobileMenuOverlay.addEventListener('click', closeMobileMenu);
+	}
+	
+	// Close when clicking nav links
+	mobileNavLinks.forEach(link => {
+		link.addEventListener('click', closeMobileMenu);
+	});
+	
+	// Close on ESC key
+	document.addEventListener('keydown', function(e) {
+		if (e.key === 'Escape') {
+			const menu = document.getElementById('mobileMenu');
+			if (menu && !menu.classList.contains('translate-x-full')) {
+				closeMobileMenu();
+			}
+		}
+	});
+}
+
+// Try to initialize immediately and on DOM ready
+if (document.readyState === 'loading') {
+	document.addEventListener('DOMContentLoaded', function() {
+		setTimeout(initMobileMenuListeners, 100);
+	});
+} else {
+	setTimeout(initMobileMenuListeners, 100);
+}
+
+// ===================================
+// USER AND NOTIFICATION DROPDOWNS
+// ===================================
+// @feature dropdowns: #userProfileDropdown, #notificationDropdown
 // Global function for user dropdown toggle
 function toggleUserDropdown(e) {
 	if (e) {
@@ -121,13 +256,11 @@ function toggleUserDropdown(e) {
 			dropdown.style.display = 'block';
 			dropdown.style.visibility = 'visible';
 			dropdown.style.opacity = '1';
-			console.log('User dropdown shown. Classes:', dropdown.className, 'Display:', dropdown.style.display);
 		} else {
 			// Hide dropdown
 			dropdown.classList.add('hidden');
 			dropdown.style.display = 'none';
 			dropdown.style.visibility = 'hidden';
-			console.log('User dropdown hidden');
 		}
 	} else {
 		console.error('User dropdown menu not found');
@@ -163,13 +296,11 @@ function toggleNotificationDropdown(e) {
 			notificationDropdown.style.display = 'block';
 			notificationDropdown.style.visibility = 'visible';
 			notificationDropdown.style.opacity = '1';
-			console.log('Notification dropdown shown. Classes:', notificationDropdown.className, 'Display:', notificationDropdown.style.display);
 		} else {
 			// Hide dropdown
 			notificationDropdown.classList.add('hidden');
 			notificationDropdown.style.display = 'none';
 			notificationDropdown.style.visibility = 'hidden';
-			console.log('Notification dropdown hidden');
 		}
 	} else {
 		console.error('Notification dropdown menu not found');
@@ -180,36 +311,29 @@ function toggleNotificationDropdown(e) {
 // If already defined, keep the inline version (it loads first and is more reliable)
 if (typeof window.toggleUserDropdown === 'undefined') {
 	window.toggleUserDropdown = toggleUserDropdown;
-} else {
-	// Keep the inline version, don't override
-	console.log('toggleUserDropdown already defined by inline script, keeping it');
 }
 if (typeof window.toggleNotificationDropdown === 'undefined') {
 	window.toggleNotificationDropdown = toggleNotificationDropdown;
-} else {
-	// Keep the inline version, don't override
-	console.log('toggleNotificationDropdown already defined by inline script, keeping it');
 }
 
 // Initialize dropdown functionality when DOM is ready
 function initDropdowns() {
-	// Add event listeners as fallback
+	// Add event listeners as fallback, for buttons without an inline handler
+	// (a second listener would toggle the menu straight back)
 	const userDropdownButton = document.querySelector('#userProfileDropdown button');
 	const notificationDropdownButton = document.querySelector('#notificationDropdown button');
 	
-	if (userDropdownButton) {
+	if (userDropdownButton && !userDropdownButton.onclick) {
 		userDropdownButton.addEventListener('click', function(e) {
 			toggleUserDropdown(e);
 		});
 	}
 	
-	if (notificationDropdownButton) {
+	if (notificationDropdownButton && !notificationDropdownButton.onclick) {
 		notificationDropdownButton.addEventListener('click', function(e) {
 			toggleNotificationDropdown(e);
 		});
 	}
-	
-	console.log('Dropdowns initialized');
 }
 
 // Close dropdowns when clicking outside (with slight delay to allow toggle to complete)
@@ -267,6 +391,10 @@ if (document.readyState === 'loading') {
 	initDropdowns();
 }
 
+// ===================================
+// DASHBOARD SIDEBAR
+// ===================================
+// @feature dashboard-sidebar: #dashboardSidebar
 // Global functions for inline handlers - Dashboard Sidebar
 function openDashboardSidebar() {
 	const sidebar = document.getElementById('dashboardSidebar');
@@ -300,150 +428,147 @@ if (typeof window.closeDashboardSidebar === 'undefined') {
 	window.closeDashboardSidebar = closeDashboardSidebar;
 }
 
-// Create mobile menu if it doesn't exist
-function createMobileMenuIfMissing() {
-	let mobileMenu = document.getElementById('mobileMenu');
-	let mobileMenuOverlay = document.getElementById('mobileMenuOverlay');
+// Dashboard sidebar active menu highlighting
+function highlightActiveDashboardMenu() {
+	const currentPath = window.location.pathname;
+	const menuItems = document.querySelectorAll('#dashboardSidebar nav a');
 	
-	if (!mobileMenu || !mobileMenuOverlay) {
-		// Create overlay
-		if (!mobileMenuOverlay) {
-			mobileMenuOverlay = document.createElement('div');
-			mobileMenuOverlay.id = 'mobileMenuOverlay';
-			mobileMenuOverlay.className = 'fixed inset-0 bg-black/50 z-[55] hidden opacity-0 transition-opacity duration-300 lg:hidden';
-			mobileMenuOverlay.style.cssText = 'display: none; visibility: visible;';
-			document.body.appendChild(mobileMenuOverlay);
-		}
+	menuItems.forEach(item => {
+		const href = item.getAttribute('href');
+		// Remove any existing active classes first
+		item.classList.remove('bg-black', 'text-white', 'bg-white', 'text-black', 'text-gray-700', 'text-gray-800');
 		
-		// Create menu
-		if (!mobileMenu) {
-			mobileMenu = document.createElement('div');
-			mobileMenu.id = 'mobileMenu';
-			mobileMenu.className = 'fixed top-0 right-0 h-full w-full max-w-sm bg-white z-[60] shadow-2xl transform translate-x-full transition-transform duration-300 lg:hidden';
-			mobileMenu.style.cssText = 'display: block; visibility: visible;';
-			
-			mobileMenu.innerHTML = `
-				<div class="flex flex-col h-full">
-					<div class="flex items-center justify-between p-6 border-b border-gray-200">
-						<a href="/" class="flex items-center gap-2 text-xl font-bold text-black">
-							<span>Penwise</span>
-						</a>
-						<button id="closeMenuBtn" class="w-10 h-10 flex items-center justify-center rounded-lg hover:bg-gray-100 transition-colors duration-200 text-3xl text-gray-700">&times;</button>
-					</div>
-					<nav class="flex-1 overflow-y-auto p-6">
-						<div class="flex flex-col gap-2">
-							<a href="/howitworks" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
-								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
-								How It Works
-							</a>
-							<a href="/pricing" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
-								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
-								Pricing
-							</a>
-							<a href="/why-penwise" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
-								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
-								Why Penwise
-							</a>
-							<a href="/affiliates" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
-								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
-								Affiliates
-							</a>
-							<a href="/faq" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
-								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
-								FAQ
-							</a>
-							<a href="/blog" class="mobile-nav-link flex items-center gap-3 p-4 font-medium text-gray-700 hover:text-gray-900 hover:bg-gray-50 rounded-xl transition-all duration-200">
-								<span class="w-1.5 h-1.5 rounded-full bg-gray-400"></span>
-								Blog
-							</a>
-						</div>
-					</nav>
-					<div class="p-6 border-t border-gray-200 space-y-3">
-						<a href="/login" class="flex justify-center items-center w-full px-6 py-3.5 font-semibold text-gray-900 border-2 border-gray-900 rounded-full hover:bg-gray-900 hover:text-white transition-all duration-300">Log In</a>
-						<a href="/register" class="flex justify-center items-center w-full px-6 py-3.5 font-semibold bg-gradient-to-r from-gray-900 to-gray-700 text-white rounded-full hover:shadow-lg transition-all duration-300">Get Started</a>
-					</div>
-				</div>
-			`;
-			
-			document.body.appendChild(mobileMenu);
+		// Check if this link matches current path
+		if (href && (currentPath === href || currentPath.startsWith(href + '/'))) {
+			item.classList.add('bg-white', 'text-black');
+			item.classList.remove('text-gray-800', 'hover:bg-gray-100');
+		} else {
+			// Ensure inactive state
+			item.classList.add('text-gray-800', 'hover:bg-gray-100');
+			item.classList.remove('bg-white', 'text-black');
 		}
-		
-		console.log('Mobile menu created dynamically');
-	}
+	});
 }
 
-// Initialize mobile menu event listeners (backup to inline handlers)
-function initMobileMenuListeners() {
-	// First, create menu if missing
-	createMobileMenuIfMissing();
+// Dashboard mobile menu toggle
+function initDashboardMobileMenu() {
+	const sidebar = document.getElementById('dashboardSidebar');
+	const overlay = document.getElementById('dashboardSidebarOverlay');
+	const menuBtn = document.getElementById('dashboardMobileMenuBtn');
+	const closeBtn = document.getElementById('sidebarClose');
+	const sidebarToggle = document.getElementById('sidebarToggle');
 	
-	const mobileMenuBtn = document.getElementById('mobileMenuBtn');
-	const closeMenuBtn = document.getElementById('closeMenuBtn');
-	const mobileMenu = document.getElementById('mobileMenu');
-	const mobileMenuOverlay = document.getElementById('mobileMenuOverlay');
-	const mobileNavLinks = document.querySelectorAll('.mobile-nav-link');
+	if (!sidebar) {
+		return;
+	}
 	
-	// Debug: Check if elements exist
-	console.log('Mobile menu elements check:', {
-		btn: !!mobileMenuBtn,
-		menu: !!mobileMenu,
-		overlay: !!mobileMenuOverlay,
-		closeBtn: !!closeMenuBtn
-	});
+	function toggleSidebar() {
+		if (sidebar.classList.contains('-translate-x-full')) {
+			openDashboardSidebar();
+		} else {
+			closeDashboardSidebar();
+		}
+	}
 	
-	// Add event listeners if elements exist
-	if (mobileMenuBtn) {
-		// Remove any existing listeners by cloning
-		const newBtn = mobileMenuBtn.cloneNode(true);
-		mobileMenuBtn.parentNode.replaceChild(newBtn, mobileMenuBtn);
-		newBtn.addEventListener('click', function(e) {
+	// Mobile menu button (backup - inline handlers are primary)
+	if (menuBtn && !menuBtn.onclick) {
+		menuBtn.addEventListener('click', function(e) {
 			e.preventDefault();
 			e.stopPropagation();
-			openMobileMenu();
+			openDashboardSidebar();
 		});
 	}
 	
-	if (closeMenuBtn) {
-		closeMenuBtn.addEventListener('click', function(e) {
+	// Close button (backup - inline handlers are primary)
+	if (closeBtn && !closeBtn.onclick) {
+		closeBtn.addEventListener('click', function(e) {
 			e.preventDefault();
 			e.stopPropagation();
-			closeMobileMenu();
+			closeDashboardSidebar();
 		});
 	}
 	
-	// Close on overlay click
-	if (mobileMenuOverlay) {
-		mobileMenuOverlay.addEventListener('click', closeMobileMenu);
+	// Desktop sidebar toggle
+	if (sidebarToggle) {
+		sidebarToggle.addEventListener('click', function(e) {
+			e.preventDefault();
+			e.stopPropagation();
+			// Toggle sidebar on desktop (you can customize this behavior)
+			toggleSidebar();
+		});
 	}
 	
-	// Close when clicking nav links
-	mobileNavLinks.forEach(link => {
-		link.addEventListener('click', closeMobileMenu);
+	// Overlay click to close (backup - inline handlers are primary)
+	if (overlay && !overlay.onclick) {
+		overlay.addEventListener('click', function(e) {
+			e.preventDefault();
+			e.stopPropagation();
+			closeDashboardSidebar();
+		});
+	}
+	
+	// Close sidebar when clicking on nav links (mobile)
+	const navLinks = sidebar.querySelectorAll('nav a');
+	navLinks.forEach(link => {
+		link.addEventListener('click', () => {
+			if (window.innerWidth < 1024) {
+				closeDashboardSidebar();
+			}
+		});
 	});
 	
-	// Close on ESC key
+	// Close sidebar on escape key
 	document.addEventListener('keydown', function(e) {
-		if (e.key === 'Escape') {
-			const menu = document.getElementById('mobileMenu');
-			if (menu && !menu.classList.contains('translate-x-full')) {
-				closeMobileMenu();
-			}
+		if (e.key === 'Escape' && sidebar && !sidebar.classList.contains('-translate-x-full')) {
+			closeDashboardSidebar();
 		}
 	});
 }
 
-// Try to initialize immediately and on DOM ready
+// Initialize dashboard functionality
+function initDashboard() {
+	highlightActiveDashboardMenu();
+	initDashboardMobileMenu();
+}
+
+// Initialize dashboard menu highlighting when DOM is ready
+function waitForDashboardElements() {
+	const sidebar = document.getElementById('dashboardSidebar');
+	if (sidebar) {
+		initDashboard();
+		return true;
+	}
+	return false;
+}
+
+// Try multiple times to ensure elements are loaded
 if (document.readyState === 'loading') {
 	document.addEventListener('DOMContentLoaded', function() {
-		setTimeout(initMobileMenuListeners, 100);
+		if (!waitForDashboardElements()) {
+			// Retry after a short delay
+			setTimeout(function() {
+				if (!waitForDashboardElements()) {
+					setTimeout(waitForDashboardElements, 200);
+				}
+			}, 100);
+		}
 	});
 } else {
-	setTimeout(initMobileMenuListeners, 100);
+	// DOM already loaded
+	if (!waitForDashboardElements()) {
+		// Retry after a short delay
+		setTimeout(function() {
+			if (!waitForDashboardElements()) {
+				setTimeout(waitForDashboardElements, 200);
+			}
+		}, 100);
+	}
 }
 
 // ===================================
 // COUNTER ANIMATION
 // ===================================
+// @feature counters: .counter-value
 document.addEventListener("DOMContentLoaded", function () {
 	function animateCounter(element) {
 		const target = parseInt(element.getAttribute("data-count"));
@@ -488,6 +613,7 @@ document.addEventListener("DOMContentLoaded", function () {
 // ===================================
 // NAVBAR SCROLL EFFECT
 // ===================================
+// @feature navbar-scroll: nav
 document.addEventListener('DOMContentLoaded', function() {
 	const navbar = document.querySelector("nav");
 	if (!navbar) return;
@@ -510,6 +636,7 @@ document.addEventListener('DOMContentLoaded', function() {
 // ===================================
 // INTERSECTION OBSERVER FOR ANIMATIONS
 // ===================================
+// @feature reveal: .stat-item, section#features
 document.addEventListener('DOMContentLoaded', function() {
 	const observerOptions = {
 		threshold: 0.15,
@@ -535,6 +662,7 @@ document.addEventListener('DOMContentLoaded', function() {
 // ===================================
 // SMOOTH SCROLL FOR ANCHOR LINKS
 // ===================================
+// @feature smooth-scroll: a[href^="#"]
 document.addEventListener('DOMContentLoaded', function() {
 	document.querySelectorAll('a[href^="#"]').forEach((anchor) => {
 		anchor.addEventListener("click", function (e) {
@@ -558,6 +686,7 @@ document.addEventListener('DOMContentLoaded', function() {
 // ===================================
 // BUTTON RIPPLE EFFECT
 // ===================================
+// @feature ripple: button
 document.addEventListener('DOMContentLoaded', function() {
 	document.querySelectorAll("button").forEach((button) => {
 		button.addEventListener("click", function (e) {
@@ -592,6 +721,7 @@ document.addEventListener('DOMContentLoaded', function() {
 // ===================================
 // ADD CSS ANIMATIONS
 // ===================================
+// @feature animations: button, .animate-fade-in, .animate-fade-in-up
 const style = document.createElement("style");
 style.textContent = `
 	@keyframes ripple-animation {
@@ -636,6 +766,7 @@ document.head.appendChild(style);
 // ===================================
 // CONSOLE WELCOME MESSAGE
 // ===================================
+// @feature welcome
 console.log(
 	"%c🚀 Penwise - Write Smarter, Faster, and Better",
 	"font-size: 20px; font-weight: bold; color: #000;"
@@ -644,141 +775,3 @@ console.log(
 	"%cBuilt with ❤️ using Tailwind CSS",
 	"font-size: 14px; color: #666;"
 );
-
-// Dashboard sidebar active menu highlighting
-function highlightActiveDashboardMenu() {
-	const currentPath = window.location.pathname;
-	const menuItems = document.querySelectorAll('#dashboardSidebar nav a');
-	
-	menuItems.forEach(item => {
-		const href = item.getAttribute('href');
-		// Remove any existing active classes first
-		item.classList.remove('bg-black', 'text-white', 'bg-white', 'text-black', 'text-gray-700', 'text-gray-800');
-		
-		// Check if this link matches current path
-		if (href && (currentPath === href || currentPath.startsWith(href + '/'))) {
-			item.classList.add('bg-white', 'text-black');
-			item.classList.remove('text-gray-800', 'hover:bg-gray-100');
-		} else {
-			// Ensure inactive state
-			item.classList.add('text-gray-800', 'hover:bg-gray-100');
-			item.classList.remove('bg-white', 'text-black');
-		}
-	});
-}
-
-// Dashboard mobile menu toggle
-function initDashboardMobileMenu() {
-	const sidebar = document.getElementById('dashboardSidebar');
-	const overlay = document.getElementById('dashboardSidebarOverlay');
-	const menuBtn = document.getElementById('dashboardMobileMenuBtn');
-	const closeBtn = document.getElementById('sidebarClose');
-	const sidebarToggle = document.getElementById('sidebarToggle');
-	
-	if (!sidebar) {
-		console.log('Dashboard sidebar not found');
-		return;
-	}
-	
-	function toggleSidebar() {
-		if (sidebar.classList.contains('-translate-x-full')) {
-			openDashboardSidebar();
-		} else {
-			closeDashboardSidebar();
-		}
-	}
-	
-	// Mobile menu button (backup - inline handlers are primary)
-	if (menuBtn && !menuBtn.onclick) {
-		menuBtn.addEventListener('click', function(e) {
-			e.preventDefault();
-			e.stopPropagation();
-			openDashboardSidebar();
-		});
-	}
-	
-	// Close button (backup - inline handlers are primary)
-	if (closeBtn && !closeBtn.onclick) {
-		closeBtn.addEventListener('click', function(e) {
-			e.preventDefault();
-			e.stopPropagation();
-			closeDashboardSidebar();
-		});
-	}
-	
-	// Desktop sidebar toggle
-	if (sidebarToggle) {
-		sidebarToggle.addEventListener('click', function(e) {
-			e.preventDefault();
-			e.stopPropagation();
-			// Toggle sidebar on desktop (you can customize this behavior)
-			toggleSidebar();
-		});
-	}
-	
-	// Overlay click to close (backup - inline handlers are primary)
-	if (overlay && !overlay.onclick) {
-		overlay.addEventListener('click', function(e) {
-			e.preventDefault();
-			e.stopPropagation();
-			closeDashboardSidebar();
-		});
-	}
-	
-	// Close sidebar when clicking on nav links (mobile)
-	const navLinks = sidebar.querySelectorAll('nav a');
-	navLinks.forEach(link => {
-		link.addEventListener('click', () => {
-			if (window.innerWidth < 1024) {
-				closeDashboardSidebar();
-			}
-		});
-	});
-	
-	// Close sidebar on escape key
-	document.addEventListener('keydown', function(e) {
-		if (e.key === 'Escape' && sidebar && !sidebar.classList.contains('-translate-x-full')) {
-			closeSidebar();
-		}
-	});
-}
-
-// Initialize dashboard functionality
-function initDashboard() {
-	highlightActiveDashboardMenu();
-	initDashboardMobileMenu();
-}
-
-// Initialize dashboard menu highlighting when DOM is ready
-function waitForDashboardElements() {
-	const sidebar = document.getElementById('dashboardSidebar');
-	if (sidebar) {
-		initDashboard();
-		return true;
-	}
-	return false;
-}
-
-// Try multiple times to ensure elements are loaded
-if (document.readyState === 'loading') {
-	document.addEventListener('DOMContentLoaded', function() {
-		if (!waitForDashboardElements()) {
-			// Retry after a short delay
-			setTimeout(function() {
-				if (!waitForDashboardElements()) {
-					setTimeout(waitForDashboardElements, 200);
-				}
-			}, 100);
-		}
-	});
-} else {
-	// DOM already loaded
-	if (!waitForDashboardElements()) {
-		// Retry after a short delay
-		setTimeout(function() {
-			if (!waitForDashboardElements()) {
-				setTimeout(waitForDashboardElements, 200);
-			}
-		}, 100);
-	}
-}
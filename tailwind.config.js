@@ -0,0 +1,13 @@
+// Tailwind configuration for `manage.py build_assets css` (core/assets/css.py).
+// Content is not listed here: the build passes the class names it scanned
+// from templates/ and static/*.js with --content.
+module.exports = {
+  content: [],
+  theme: {
+    extend: {
+      fontFamily: {
+        sans: ["Inter", "sans-serif"],
+      },
+    },
+  },
+};